@@ -23,13 +23,48 @@ class DocumentResponse(DocumentBase):
     id: str
     created_at: datetime
     word_count: int
+    content_hash: Optional[str] = None
+    size: Optional[int] = None
+    mime_type: Optional[str] = None
     
     class Config:
         from_attributes = True
 
 
+class DocumentSummary(BaseModel):
+    """
+    Document entry in a listing.
+    Only the requested fields are set; full text is opt-in via ``content``.
+    """
+    id: str
+    title: Optional[str] = None
+    filename: Optional[str] = None
+    created_at: Optional[datetime] = None
+    word_count: Optional[int] = None
+    content_hash: Optional[str] = None
+    size: Optional[int] = None
+    mime_type: Optional[str] = None
+    snippet: Optional[str] = None
+    content: Optional[str] = None
+
+
 class DocumentListResponse(BaseModel):
-    """Model for list of documents."""
-    documents: List[DocumentResponse]
+    """Model for a page of documents."""
+    documents: List[DocumentSummary]
     total: int
+    next_cursor: Optional[str] = None  # Cursor for the next page, None on the last page
+
 
+
+class BulkUploadError(BaseModel):
+    """File that could not be ingested in a bulk upload."""
+    filename: str
+    detail: str
+
+
+class BulkUploadResponse(BaseModel):
+    """Model for the result of a bulk upload."""
+    documents: List[DocumentSummary]
+    total: int
+    failed: List[BulkUploadError] = []
+    indexed: List[str] = []  # Index types updated with the new documents
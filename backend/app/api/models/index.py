@@ -1,8 +1,9 @@
 """
 Pydantic models for index-related operations.
 """
-from pydantic import BaseModel
-from typing import Optional, List, Dict, Any
+from pydantic import BaseModel, Field
+from typing import Optional, List, Dict, Any, Tuple
+from datetime import datetime
 from enum import Enum
 
 
@@ -12,10 +13,47 @@ class IndexType(str, Enum):
     PATRICIA = "patricia"
 
 
+class SearchIndexType(str, Enum):
+    """Indexes a search can use."""
+    SUFFIX = "suffix"
+    PATRICIA = "patricia"
+    AUTO = "auto"  # The query planner picks the cheapest built index
+
+
+class SearchMode(str, Enum):
+    """How the query is matched against the indexed words."""
+    DEFAULT = "default"  # Substring (suffix) or prefix (patricia)
+    FUZZY = "fuzzy"  # Words within an edit distance of the query
+    WILDCARD = "wildcard"  # Whole words matching a pattern: pre*, *fix, pre*fix, p?rro
+    REGEX = "regex"  # Whole words matching a restricted regex: . [a-z] * + ?
+
+
+class SearchResultMode(str, Enum):
+    """What a search returns."""
+    DOCUMENTS = "documents"  # Ranked results
+    COUNT = "count"  # Only the number of matching documents
+    ESTIMATE = "estimate"  # Approximate number of matching documents (HyperLogLog)
+
+
+class IndexBuildMode(str, Enum):
+    """How an index is built."""
+    FULL = "full"  # Discard the index and process every document
+    RECONCILE = "reconcile"  # Only add, remove or re-index documents that changed
+
+
+class PostingFormat(str, Enum):
+    """How an index stores the documents of each word."""
+    SET = "set"  # Sets of document IDs
+    BITMAP = "bitmap"  # Compressed bitmaps of dense document IDs
+
+
 class IndexCreateRequest(BaseModel):
     """Request model for creating an index."""
     index_type: IndexType
     document_ids: Optional[List[str]] = None  # Si es None, indexa todos
+    mode: IndexBuildMode = IndexBuildMode.FULL
+    # Si es None se mantiene el del índice actual; cambiarlo fuerza una construcción completa
+    posting_format: Optional[PostingFormat] = None
 
 
 class IndexStatusResponse(BaseModel):
@@ -25,6 +63,8 @@ class IndexStatusResponse(BaseModel):
     word_count: Optional[int] = None
     document_count: Optional[int] = None
     created_at: Optional[str] = None
+    posting_format: Optional[str] = None
+    last_build: Optional[Dict[str, Any]] = None  # Report of the last create/reconcile run
 
 
 class WordAddRequest(BaseModel):
@@ -39,11 +79,53 @@ class WordDeleteRequest(BaseModel):
     word: str
 
 
+class WordBatchAddition(BaseModel):
+    """A word to add in a batch, to some documents or to all of them."""
+    word: str
+    document_ids: Optional[List[str]] = None  # Si es None, se agrega a todos los documentos
+
+
+class WordBatchRequest(BaseModel):
+    """Request model for adding and deleting many words at once."""
+    add: List[WordBatchAddition] = []
+    delete: List[str] = []
+    index_type: Optional[str] = None  # If None, applies to both indexes if they exist
+
+
+class WordBatchResponse(BaseModel):
+    """Response model for a batch of word operations."""
+    added: int  # Palabras agregadas
+    deleted: int  # Palabras encontradas y eliminadas
+    index_types: List[str]  # Índices modificados
+
+
+class SearchFilters(BaseModel):
+    """Conditions on document metadata that search results must meet (bounds are inclusive)."""
+    created_after: Optional[datetime] = None
+    created_before: Optional[datetime] = None
+    min_word_count: Optional[int] = None
+    max_word_count: Optional[int] = None
+    min_size: Optional[int] = None  # Tamaño del archivo original en bytes
+    max_size: Optional[int] = None
+    title_prefix: Optional[str] = None  # Sin distinguir mayúsculas
+
+
 class SearchRequest(BaseModel):
     """Request model for searching."""
     query: str
-    index_type: IndexType
+    index_type: SearchIndexType
     limit: Optional[int] = 100
+    filters: Optional[SearchFilters] = None
+    mode: SearchMode = SearchMode.DEFAULT
+    max_distance: int = Field(1, ge=1, le=2)  # Distancia de edición máxima en modo fuzzy
+    result_mode: SearchResultMode = SearchResultMode.DOCUMENTS
+    snippets: int = Field(0, ge=0)  # Mejores resultados que incluyen fragmentos del texto (0 = ninguno)
+
+
+class SearchSnippet(BaseModel):
+    """Piece of a document's text around matched words."""
+    text: str
+    highlights: List[Tuple[int, int]]  # (inicio, fin) de cada coincidencia dentro de text
 
 
 class SearchResult(BaseModel):
@@ -52,14 +134,34 @@ class SearchResult(BaseModel):
     document_title: str
     matches: List[str]  # Palabras que coinciden
     relevance_score: Optional[float] = None
+    snippets: Optional[List[SearchSnippet]] = None
+
+
+class SearchPlan(BaseModel):
+    """How the query planner answered a search with index_type 'auto'."""
+    kind: str  # exact, prefix, suffix, infix, scan o fuzzy
+    index_type: str  # Índice elegido
+    fallback: bool  # True si el índice más barato no estaba construido
 
 
 class SearchResponse(BaseModel):
     """Response model for search."""
     query: str
     results: List[SearchResult]
-    total_results: int
-    index_type: str
+    total_results: int  # En modos count y estimate, documentos que coinciden (results queda vacío)
+    estimated: bool = False  # Si total_results es una estimación
+    index_type: str  # Índice usado (el elegido por el planificador con 'auto')
+    plan: Optional[SearchPlan] = None
+
+
+class SearchBatchRequest(BaseModel):
+    """Request model for running many searches at once."""
+    queries: List[SearchRequest]
+
+
+class SearchBatchResponse(BaseModel):
+    """Response model for a batch of searches (one response per query, in order)."""
+    responses: List[SearchResponse]
 
 
 class IndexStructureNode(BaseModel):
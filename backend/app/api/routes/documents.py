@@ -1,84 +1,388 @@
 """
 API routes for document management.
 """
-from fastapi import APIRouter, UploadFile, File, HTTPException
-from typing import List
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse
+from pypika.terms import Function as PypikaFunction
+from tortoise.expressions import Q
+from tortoise.functions import Function
+from tortoise.transactions import in_transaction
+from typing import BinaryIO, Dict, List, Optional, Tuple
+from datetime import datetime
+import asyncio
 import base64
+import json
 import uuid
-from app.api.models.document import DocumentResponse, DocumentListResponse
+from app.api.models.document import (
+    BulkUploadError,
+    BulkUploadResponse,
+    DocumentResponse,
+    DocumentListResponse,
+    DocumentSummary
+)
+from app.core.config import settings
 from app.models import Document
-from app.utils.file_parser import extract_text_from_file
+from app.services import index_service
+from app.utils.archive import is_archive, iter_archive_members
+from app.utils.blob_store import StoredBlob, blob_store, guess_mime_type
+from app.utils.content_cache import cache_key, content_cache
+from app.utils.file_parser import extract_text_async
 
 router = APIRouter()
 
+# Campos que se pueden pedir en el listado -> columna en la tabla documents
+# (None para los que se calculan en la consulta)
+LISTING_FIELDS: Dict[str, Optional[str]] = {
+    "title": "title",
+    "filename": "title",
+    "created_at": "created_at",
+    "word_count": "word_count",
+    "content_hash": "content_hash",
+    "size": "size",
+    "mime_type": "mime_type",
+    "snippet": None,
+    "content": "extracted_text",
+}
+DEFAULT_LISTING_FIELDS = [field for field in LISTING_FIELDS if field != "content"]
+
+
+class _SubstrTerm(PypikaFunction):
+    def __init__(self, term, start, length, alias=None):
+        super().__init__("SUBSTR", term, start, length, alias=alias)
+
+
+class Substr(Function):
+    """SQL ``SUBSTR`` so snippets are cut in the database, not in Python."""
+    database_func = _SubstrTerm
+
+
+def _parse_fields(fields: Optional[str]) -> List[str]:
+    """Validate the ``fields`` projection parameter."""
+    if not fields:
+        return DEFAULT_LISTING_FIELDS
+    selected = [field.strip() for field in fields.split(",") if field.strip() and field.strip() != "id"]
+    unknown = [field for field in selected if field not in LISTING_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    return selected
+
+
+def _encode_cursor(created_at: datetime, document_id: str) -> str:
+    """Encode the (created_at, id) position of the last listed document."""
+    raw = json.dumps([created_at.isoformat(), document_id]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+
+def _decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    """Decode a cursor produced by ``_encode_cursor``."""
+    try:
+        created_at, document_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return datetime.fromisoformat(created_at), str(uuid.UUID(document_id))
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _display_content(doc: Document) -> str:
+    """Return extracted text if available, otherwise try to decode the original blob."""
+    if doc.extracted_text:
+        return doc.extracted_text
+    if doc.content_hash:
+        raw = blob_store.read_bytes(doc.content_hash)
+        if raw is not None:
+            try:
+                return raw.decode('utf-8')
+            except UnicodeDecodeError:
+                pass
+    return "[Binary Content]"
+
+
+def _to_response(doc: Document, content: str) -> DocumentResponse:
+    """Build the API response for a document."""
+    return DocumentResponse(
+        id=str(doc.id),
+        title=doc.title,
+        content=content,
+        filename=doc.title,
+        word_count=doc.word_count,
+        created_at=doc.created_at,
+        content_hash=doc.content_hash,
+        size=doc.size,
+        mime_type=doc.mime_type
+    )
+
+
+def _new_document(
+    title: str,
+    blob: StoredBlob,
+    mime_type: str,
+    extracted_text: str,
+    word_count: int
+) -> Document:
+    """Build an unsaved Document for an uploaded file."""
+    # If extraction failed or returned empty, fallback to a placeholder
+    if not extracted_text.strip():
+        extracted_text = "[No text extracted]"
+        word_count = len(extracted_text.split())
+    
+    return Document(
+        id=uuid.uuid4(),
+        title=title,
+        content_hash=blob.content_hash,
+        size=blob.size,
+        mime_type=mime_type,
+        extracted_text=extracted_text,
+        word_count=word_count
+    )
+
+
+async def _extract_cached(blob: StoredBlob, filename: str) -> Tuple[str, int]:
+    """Extract the text of a stored file, reusing the cached result for known content."""
+    key = cache_key(blob.content_hash, filename)
+    cached = await run_in_threadpool(content_cache.get_text, key)
+    if cached is not None:
+        return cached
+    
+    text, word_count = await extract_text_async(blob_store.path_for(blob.content_hash), filename)
+    # Los fallos (p. ej. timeouts) no se guardan para poder reintentarlos
+    if text.strip():
+        await run_in_threadpool(content_cache.put_text, key, text, word_count)
+    return text, word_count
+
+
+def _store_archive_members(
+    fileobj: BinaryIO,
+    filename: str,
+    staged: List[Tuple[str, StoredBlob, str]]
+) -> None:
+    """Store every file inside an archive in the blob store (runs in a worker thread)."""
+    members = iter_archive_members(
+        fileobj,
+        filename,
+        max_member_size=settings.ARCHIVE_MAX_MEMBER_SIZE,
+        max_total_size=settings.ARCHIVE_MAX_TOTAL_SIZE
+    )
+    for name, member in members:
+        # Se añade en cuanto se guarda, para liberarlo aunque falle otro miembro
+        staged.append((name, blob_store.put_fileobj(member), guess_mime_type(name)))
+        if len(staged) > settings.BULK_MAX_FILES:
+            break
+
+
+async def _discard_blobs(blobs: List[StoredBlob]) -> None:
+    """Release the blobs of a failed upload and delete the ones no document references."""
+    hashes = {blob.content_hash for blob in blobs}
+    # Leídas mientras siguen fijados: si otra subida los guarda después, se conservan
+    generations = {content_hash: blob_store.generation(content_hash) for content_hash in hashes}
+    blob_store.release(blob.content_hash for blob in blobs)
+    
+    pending = list(hashes)
+    referenced = set()
+    for start in range(0, len(pending), settings.BULK_INSERT_BATCH_SIZE):
+        batch = pending[start:start + settings.BULK_INSERT_BATCH_SIZE]
+        referenced.update(
+            await Document.filter(content_hash__in=batch).values_list("content_hash", flat=True)
+        )
+    for content_hash in hashes - referenced:
+        blob_store.delete(content_hash, generations[content_hash])
+
+
 @router.post("/upload", response_model=DocumentResponse)
 async def upload_document(file: UploadFile = File(...)):
     """
     Upload a document to the system.
-    Stores content as Base64 and extracts text for indexing.
+    Streams the original file to the content-addressed blob store and
+    extracts text for indexing.
     """
+    blob: Optional[StoredBlob] = None
+    saved = False
     try:
-        content = await file.read()
-        # Encode original content to Base64
-        content_b64 = base64.b64encode(content).decode('utf-8')
+        filename = file.filename or ""
+        blob = await blob_store.put_upload(file)
         
-        # Extract text from file (PDF, DOCX, TXT)
-        extracted_text = extract_text_from_file(content, file.filename or "")
+        # Extract text from file (PDF, DOCX, TXT) without blocking the event loop
+        extracted_text, word_count = await _extract_cached(blob, filename)
         
-        # If extraction failed or returned empty, fallback to a placeholder
-        if not extracted_text.strip():
-             extracted_text = "[No text extracted]"
+        document = _new_document(
+            file.filename or "Untitled",
+            blob,
+            guess_mime_type(filename, file.content_type),
+            extracted_text,
+            word_count
+        )
+        await document.save()
+        saved = True
+        index_service.track_documents([document])
         
-        word_count = len(extracted_text.split())
+        # Return extracted text for display
+        return _to_response(document, document.extracted_text)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error uploading document: {str(e)}")
+    finally:
+        if blob is not None and saved:
+            blob_store.release([blob.content_hash])
+        elif blob is not None:
+            await _discard_blobs([blob])
+
+
+@router.post("/bulk", response_model=BulkUploadResponse, response_model_exclude_unset=True)
+async def bulk_upload_documents(
+    files: List[UploadFile] = File(...),
+    index: bool = Form(False)
+):
+    """
+    Upload many documents at once, as several files and/or zip/tar archives.
+    
+    Text is extracted in parallel, all documents are inserted in a single
+    transaction and, if ``index`` is true, added to the existing indexes.
+    
+    Args:
+        files: Files to ingest; archives are expanded
+        index: Whether to add the new documents to the existing indexes
         
-        document = await Document.create(
-            id=uuid.uuid4(),
-            title=file.filename or "Untitled",
-            content=content_b64,
-            extracted_text=extracted_text,
-            word_count=word_count
-        )
+    Returns:
+        Created documents and the files that failed
+    """
+    staged: List[Tuple[str, StoredBlob, str]] = []
+    failed: List[BulkUploadError] = []
+    saved = False
+    
+    try:
+        # 1. Guardar los originales en el blob store
+        for file in files:
+            filename = file.filename or "Untitled"
+            first_member = len(staged)
+            try:
+                if is_archive(filename):
+                    await run_in_threadpool(_store_archive_members, file.file, filename, staged)
+                else:
+                    blob = await blob_store.put_upload(file)
+                    staged.append((filename, blob, guess_mime_type(filename, file.content_type)))
+            except Exception as e:
+                # Un archivo que falla (p. ej. por tamaño) no aporta ningún miembro
+                await _discard_blobs([blob for _, blob, _ in staged[first_member:]])
+                del staged[first_member:]
+                failed.append(BulkUploadError(filename=filename, detail=str(e)))
+            if len(staged) > settings.BULK_MAX_FILES:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Too many files in bulk upload (max {settings.BULK_MAX_FILES})"
+                )
+        
+        # 2. Extraer el texto en paralelo (limitado por el pool de extracción)
+        extracted = await asyncio.gather(*(
+            _extract_cached(blob, filename) for filename, blob, _ in staged
+        ))
+        
+        documents = [
+            _new_document(filename, blob, mime_type, text, word_count)
+            for (filename, blob, mime_type), (text, word_count) in zip(staged, extracted)
+        ]
+        
+        # 3. Insertar todos los documentos en una sola transacción
+        async with in_transaction() as connection:
+            await Document.bulk_create(
+                documents,
+                batch_size=settings.BULK_INSERT_BATCH_SIZE,
+                using_db=connection
+            )
+        saved = True
+        index_service.track_documents(documents)
         
-        return DocumentResponse(
-            id=str(document.id),
-            title=document.title,
-            content=extracted_text, # Return extracted text for display
-            filename=file.filename,
-            word_count=document.word_count,
-            created_at=document.created_at
+        # 4. Indexación incremental opcional
+        indexed: List[str] = []
+        if index and documents:
+            indexed = await index_service.index_documents(documents)
+        
+        return BulkUploadResponse(
+            documents=[
+                DocumentSummary(
+                    id=str(doc.id),
+                    title=doc.title,
+                    filename=doc.title,
+                    created_at=doc.created_at,
+                    word_count=doc.word_count,
+                    content_hash=doc.content_hash,
+                    size=doc.size,
+                    mime_type=doc.mime_type
+                )
+                for doc in documents
+            ],
+            total=len(documents),
+            failed=failed,
+            indexed=indexed
         )
+    except HTTPException:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error uploading document: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error in bulk upload: {str(e)}")
+    finally:
+        if saved:
+            blob_store.release(blob.content_hash for _, blob, _ in staged)
+        else:
+            await _discard_blobs([blob for _, blob, _ in staged])
 
 
-@router.get("/", response_model=DocumentListResponse)
-async def list_documents():
+@router.get(
+    "/",
+    response_model=DocumentListResponse,
+    response_model_exclude_unset=True
+)
+async def list_documents(
+    limit: int = Query(settings.DOCUMENTS_PAGE_SIZE, ge=1, le=settings.DOCUMENTS_MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None
+):
     """
-    List all documents in the system.
+    List documents, newest first, one page at a time.
+    
+    Args:
+        limit: Maximum number of documents in the page
+        cursor: ``next_cursor`` of the previous page
+        fields: Comma-separated fields to return (default: metadata and snippet).
+            Use ``content`` to get the full extracted text.
+    
+    Returns:
+        Page of documents and the cursor for the next page
     """
     try:
-        documents = await Document.all().order_by("-created_at")
-        
-        doc_responses = []
-        for doc in documents:
-            # Return extracted text if available, otherwise try to decode content (legacy)
-            display_content = doc.extracted_text
-            if not display_content:
-                try:
-                    display_content = base64.b64decode(doc.content).decode('utf-8')
-                except:
-                    display_content = "[Binary Content]"
-
-            doc_responses.append(DocumentResponse(
-                id=str(doc.id),
-                title=doc.title,
-                content=display_content or "",
-                filename=doc.title, 
-                word_count=doc.word_count,
-                created_at=doc.created_at
-            ))
-            
-        return DocumentListResponse(documents=doc_responses, total=len(doc_responses))
+        selected = _parse_fields(fields)
+        query = Document.all()
+        
+        if cursor:
+            created_at, last_id = _decode_cursor(cursor)
+            query = query.filter(
+                Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=last_id)
+            )
+        
+        columns = {"id", "created_at"} | {
+            LISTING_FIELDS[field] for field in selected if LISTING_FIELDS[field]
+        }
+        if "snippet" in selected:
+            query = query.annotate(
+                snippet=Substr("extracted_text", 1, settings.SNIPPET_LENGTH)
+            )
+            columns.add("snippet")
+        
+        # Se pide una fila extra para saber si existe una página siguiente
+        rows = await query.order_by("-created_at", "-id").limit(limit + 1).values(*columns)
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        
+        doc_summaries = []
+        for row in rows:
+            values = {"id": str(row["id"])}
+            for field in selected:
+                column = LISTING_FIELDS[field] or field
+                values[field] = row[column]
+            doc_summaries.append(DocumentSummary(**values))
+        
+        next_cursor = _encode_cursor(rows[-1]["created_at"], str(rows[-1]["id"])) if has_more else None
+        total = await Document.all().count()
+        
+        return DocumentListResponse(documents=doc_summaries, total=total, next_cursor=next_cursor)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error listing documents: {str(e)}")
 
@@ -92,40 +396,51 @@ async def get_document(document_id: str):
         doc = await Document.get_or_none(id=document_id)
         if not doc:
             raise HTTPException(status_code=404, detail="Document not found")
-            
-        display_content = doc.extracted_text
-        if not display_content:
-            try:
-                display_content = base64.b64decode(doc.content).decode('utf-8')
-            except:
-                display_content = "[Binary Content]"
-
-        return DocumentResponse(
-            id=str(doc.id),
-            title=doc.title,
-            content=display_content or "",
-            filename=doc.title,
-            word_count=doc.word_count,
-            created_at=doc.created_at
-        )
+        
+        return _to_response(doc, _display_content(doc))
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error getting document: {str(e)}")
 
 
+@router.get("/{document_id}/file")
+async def download_document(document_id: str):
+    """
+    Download the original uploaded file of a document.
+    """
+    doc = await Document.get_or_none(id=document_id)
+    if not doc or not doc.content_hash or not blob_store.exists(doc.content_hash):
+        raise HTTPException(status_code=404, detail="Document not found")
+    
+    return FileResponse(
+        blob_store.path_for(doc.content_hash),
+        media_type=doc.mime_type or "application/octet-stream",
+        filename=doc.title
+    )
+
+
 @router.delete("/{document_id}")
 async def delete_document(document_id: str):
     """
     Delete a document from the system.
+    The original blob is removed once no other document references it.
     """
     try:
-        deleted_count = await Document.filter(id=document_id).delete()
-        if not deleted_count:
+        doc = await Document.get_or_none(id=document_id)
+        if not doc:
             raise HTTPException(status_code=404, detail="Document not found")
+        
+        # Leída antes de comprobar las referencias: si el mismo contenido se
+        # sube mientras tanto, el blob se conserva
+        generation = blob_store.generation(doc.content_hash) if doc.content_hash else 0
+        await doc.delete()
+        index_service.forget_document(document_id)
+        if doc.content_hash and not await Document.filter(content_hash=doc.content_hash).exists():
+            blob_store.delete(doc.content_hash, generation)
+        
         return {"message": "Document deleted successfully"}
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error deleting document: {str(e)}")
-
@@ -5,6 +5,8 @@ from fastapi import APIRouter, HTTPException
 from app.api.models.index import (
     WordAddRequest,
     WordDeleteRequest,
+    WordBatchRequest,
+    WordBatchResponse,
     IndexStructureResponse
 )
 from app.services import index_service
@@ -43,6 +45,40 @@ async def add_word(request: WordAddRequest):
         raise HTTPException(status_code=500, detail=f"Error adding word: {str(e)}")
 
 
+@router.post("/words/batch", response_model=WordBatchResponse)
+async def update_words(request: WordBatchRequest):
+    """
+    Add and delete many words in a single pass.
+    
+    Each index is rebuilt and saved once for the whole batch, instead of
+    once per word. Deletions are applied before additions.
+    
+    Args:
+        request: Words to add (with optional document IDs), words to delete, and optional index type
+        
+    Returns:
+        Number of words added and deleted, and the indexes modified
+    """
+    try:
+        report = await index_service.update_words(
+            add=[(item.word, item.document_ids) for item in request.add],
+            delete=request.delete,
+            index_type=request.index_type
+        )
+        
+        if not report["index_types"]:
+            raise HTTPException(
+                status_code=404,
+                detail="Index not found. Please create an index first."
+            )
+        
+        return report
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error updating words: {str(e)}")
+
+
 @router.delete("/words/{word}")
 async def delete_word(word: str, index_type: str = "suffix"):
     """
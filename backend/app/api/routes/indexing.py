@@ -17,6 +17,10 @@ async def create_index(request: IndexCreateRequest, background_tasks: Background
     """
     Create an index (Suffix Tree or PATRICIA Tree) from documents.
     
+    In ``reconcile`` mode only the documents that were added, removed or
+    modified since the index was built are processed; the counts are
+    reported in the index status (``last_build``).
+    
     Args:
         request: Index creation request with type and optional document IDs
         background_tasks: FastAPI background tasks for async processing
@@ -29,12 +33,15 @@ async def create_index(request: IndexCreateRequest, background_tasks: Background
         background_tasks.add_task(
             index_service.create_index,
             index_type=request.index_type.value,
-            document_ids=request.document_ids
+            document_ids=request.document_ids,
+            mode=request.mode.value,
+            posting_format=request.posting_format.value if request.posting_format else None
         )
         
         return {
             "message": f"Index creation started for {request.index_type.value} tree",
             "index_type": request.index_type.value,
+            "mode": request.mode.value,
             "status": "processing"
         }
     except Exception as e:
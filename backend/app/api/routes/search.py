@@ -4,32 +4,82 @@ API routes for searching in indexes.
 from fastapi import APIRouter, HTTPException
 from app.api.models.index import (
     SearchRequest,
-    SearchResponse
+    SearchResponse,
+    SearchBatchRequest,
+    SearchBatchResponse
 )
+from app.core.config import settings
 from app.services import index_service
 
 router = APIRouter()
 
 
+def _search_options(request: SearchRequest) -> dict:
+    """Arguments of ``IndexService.search`` for a search request."""
+    return {
+        "query": request.query,
+        "index_type": request.index_type.value,
+        "limit": request.limit or 100,
+        "filters": request.filters.model_dump(exclude_none=True) if request.filters else None,
+        "mode": request.mode.value,
+        "max_distance": request.max_distance,
+        "result_mode": request.result_mode.value,
+        "snippets": request.snippets
+    }
+
+
 @router.post("/", response_model=SearchResponse)
 async def search(request: SearchRequest):
     """
     Search for a query in the specified index.
     
     Args:
-        request: Search request with query, index type, and optional limit
+        request: Search request with query, index type, optional limit,
+            metadata filters and match mode (in wildcard and regex
+            modes the query is a pattern of whole words)
         
     Returns:
         Search results with matching documents
     """
     try:
-        results = await index_service.search(
-            query=request.query,
-            index_type=request.index_type.value,
-            limit=request.limit or 100
-        )
+        results = await index_service.search(**_search_options(request))
         
         return results
+    except ValueError as e:
+        # Patrón inválido en modo wildcard o regex
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error performing search: {str(e)}")
 
+
+@router.post("/batch", response_model=SearchBatchResponse)
+async def search_batch(request: SearchBatchRequest):
+    """
+    Run many searches in one request.
+    
+    The searches share their work: repeated queries are evaluated once,
+    each index is read from a single snapshot, and the titles of all the
+    results are fetched together.
+    
+    Args:
+        request: Search requests (same fields as a single search)
+        
+    Returns:
+        One search response per query, in the same order
+    """
+    if len(request.queries) > settings.SEARCH_BATCH_MAX_QUERIES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many queries in batch search (max {settings.SEARCH_BATCH_MAX_QUERIES})"
+        )
+    try:
+        responses = await index_service.search_batch(
+            [_search_options(query) for query in request.queries]
+        )
+        
+        return {"responses": responses}
+    except ValueError as e:
+        # Patrón inválido en modo wildcard o regex
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error performing batch search: {str(e)}")
@@ -19,10 +19,49 @@ class Settings(BaseSettings):
     DATA_DIR: str = "data"
     INDICES_DIR: str = "data/indices"
     SAMPLE_DOCUMENTS_DIR: str = "data/sample_documents"
+    BLOBS_DIR: str = "data/blobs"
+    CACHE_DIR: str = "data/cache"
+    
+    # Upload settings
+    UPLOAD_CHUNK_SIZE: int = 1024 * 1024
+    EXTRACTION_WORKERS: int = 2  # Concurrent text extractions
+    EXTRACTION_TIMEOUT: float = 60.0  # Seconds per file before giving up
+    BULK_MAX_FILES: int = 1000  # Files accepted per bulk upload (archive members included)
+    BULK_INSERT_BATCH_SIZE: int = 500
+    ARCHIVE_MAX_MEMBER_SIZE: int = 100 * 1024 * 1024  # Uncompressed bytes per archive member
+    ARCHIVE_MAX_TOTAL_SIZE: int = 1024 * 1024 * 1024  # Uncompressed bytes per archive
+    
+    # Document listing
+    DOCUMENTS_PAGE_SIZE: int = 50
+    DOCUMENTS_MAX_PAGE_SIZE: int = 500
+    SNIPPET_LENGTH: int = 200
+    
+    # Search snippets
+    SEARCH_SNIPPET_LENGTH: int = 160  # Characters per snippet
+    SEARCH_SNIPPETS_PER_RESULT: int = 2
+    SEARCH_MAX_SNIPPET_RESULTS: int = 50  # Top results that can get snippets per query
+    SNIPPET_MAX_OFFSETS_PER_TERM: int = 16  # Occurrences per term whose offsets are cached
+    
+    # Text analysis (changing these invalidates cached term frequencies)
+    ANALYZER_FOLD_ACCENTS: bool = True
+    ANALYZER_STOPWORDS: bool = True  # Drop common Spanish and English words
+    ANALYZER_STEMMING: bool = False  # Light plural stemming
+    ANALYZER_MIN_TERM_LENGTH: int = 1
     
     # Index settings
     INDEX_TYPE_SUFFIX: str = "suffix"
     INDEX_TYPE_PATRICIA: str = "patricia"
+    INDEX_TYPE_AUTO: str = "auto"  # Search only: the query planner picks the index
+    SEGMENT_FLUSH_DOCUMENTS: int = 1000  # Documents in the in-memory segment before it is flushed
+    SEGMENT_MERGE_FACTOR: int = 4  # Segments of the same size tier merged together
+    SPIMI_MAX_POSTINGS: int = 2_000_000  # Postings held in memory during a full build before a run is written to disk
+    INDEX_BUILD_WORKERS: int = 1  # Worker processes that tokenize full builds (1 tokenizes in a thread)
+    SEARCH_SHARDS: int = 0  # Search processes, each owning a hash partition of the documents (0 searches in-process)
+    SEARCH_WORKERS: int = 4  # Threads matching and ranking searches off the event loop
+    SEARCH_BATCH_MAX_QUERIES: int = 1000  # Queries accepted per batch search request
+    POSTING_FORMAT_SET: str = "set"
+    POSTING_FORMAT_BITMAP: str = "bitmap"
+    POSTING_FORMAT: str = "set"  # Posting format of new indexes ("set" or "bitmap"); each index saves its own
     
     # CORS
     BACKEND_CORS_ORIGINS: list = ["http://localhost:3000"]
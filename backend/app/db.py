@@ -1,6 +1,7 @@
 from tortoise import Tortoise, run_async
 from tortoise.contrib.fastapi import register_tortoise
 from fastapi import FastAPI
+from app.migrations import migrate_schema, migrate_legacy_content
 
 TORTOISE_ORM = {
     "connections": {"default": "sqlite://db.sqlite3"},
@@ -16,6 +17,16 @@ def init_db(app: FastAPI):
     register_tortoise(
         app,
         config=TORTOISE_ORM,
-        generate_schemas=True,
+        generate_schemas=False,
         add_exception_handlers=True,
     )
+
+    @app.on_event("startup")
+    async def prepare_schema() -> None:
+        # Las columnas nuevas deben existir antes de generar el esquema,
+        # porque generate_schemas también crea los índices sobre ellas
+        await migrate_schema()
+        await Tortoise.generate_schemas()
+        migrated = await migrate_legacy_content()
+        if migrated:
+            print(f"Migrated {migrated} documents to the blob store")
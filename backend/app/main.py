@@ -6,6 +6,7 @@ from fastapi.middleware.cors import CORSMiddleware
 from app.api.routes import documents, indexing, search, index_management
 from app.core.config import settings
 from app.db import init_db
+from app.services import index_service
 
 app = FastAPI(
     title="Document Indexing System",
@@ -30,6 +31,11 @@ app.add_middleware(
 # Inicializar base de datos
 init_db(app)
 
+@app.on_event("shutdown")
+async def stop_search_shards() -> None:
+    """Stop the search shard processes (only started when SEARCH_SHARDS > 0)."""
+    index_service.shutdown()
+
 # Incluir routers
 app.include_router(documents.router, prefix="/api/documents", tags=["documents"])
 app.include_router(indexing.router, prefix="/api/indexing", tags=["indexing"])
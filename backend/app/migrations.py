@@ -0,0 +1,90 @@
+"""
+Schema and data migrations for existing SQLite databases.
+
+Tortoise's ``generate_schemas`` only creates missing tables, so columns added
+to existing models are applied here before the schema is generated.
+"""
+import base64
+from typing import Dict, List, Optional, Tuple
+
+from tortoise import Tortoise
+
+from app.utils.blob_store import blob_store, guess_mime_type
+
+# Columnas añadidas a tablas existentes:
+# tabla -> [(columna, definición SQL, SQL para rellenar filas existentes o None)]
+ADDED_COLUMNS: Dict[str, List[Tuple[str, str, Optional[str]]]] = {
+    "documents": [
+        ("content_hash", "VARCHAR(64)", None),
+        ("size", "INT NOT NULL DEFAULT 0", None),
+        ("mime_type", "VARCHAR(255)", None),
+        ("updated_at", "TIMESTAMP", "UPDATE documents SET updated_at = created_at"),
+    ],
+}
+
+# Filas migradas por lote al mover contenido Base64 al blob store
+LEGACY_CONTENT_BATCH_SIZE = 50
+
+
+async def _table_columns(conn, table: str) -> List[str]:
+    """Get the column names of a table (empty if the table does not exist)."""
+    rows = await conn.execute_query_dict(f"PRAGMA table_info({table})")
+    return [row["name"] for row in rows]
+
+
+async def migrate_schema() -> None:
+    """Add missing columns to tables created by older versions."""
+    conn = Tortoise.get_connection("default")
+    for table, columns in ADDED_COLUMNS.items():
+        existing = await _table_columns(conn, table)
+        if not existing:
+            # La tabla no existe todavía: generate_schemas la creará completa
+            continue
+        for column, definition, backfill in columns:
+            if column not in existing:
+                await conn.execute_script(
+                    f"ALTER TABLE {table} ADD COLUMN {column} {definition}"
+                )
+                if backfill:
+                    await conn.execute_script(backfill)
+
+
+async def migrate_legacy_content() -> int:
+    """
+    Move Base64 originals stored in ``documents.content`` to the blob store.
+    
+    Returns:
+        Number of migrated documents
+    """
+    conn = Tortoise.get_connection("default")
+    migrated = 0
+    while True:
+        rows = await conn.execute_query_dict(
+            "SELECT id, title, content FROM documents "
+            "WHERE content_hash IS NULL AND content != '' LIMIT ?",
+            [LEGACY_CONTENT_BATCH_SIZE],
+        )
+        if not rows:
+            break
+        for row in rows:
+            try:
+                # validate: sin él se descartan los caracteres que no son Base64
+                # y un texto plano puede decodificarse como basura
+                raw = base64.b64decode(row["content"], validate=True)
+            except Exception:
+                # Contenido que no es Base64: se conserva tal cual como texto
+                raw = row["content"].encode("utf-8")
+            blob = blob_store.put_bytes(raw)
+            try:
+                await conn.execute_query(
+                    "UPDATE documents SET content_hash = ?, size = ?, mime_type = ?, "
+                    "content = '' WHERE id = ?",
+                    [blob.content_hash, blob.size, guess_mime_type(row["title"] or ""), row["id"]],
+                )
+            finally:
+                blob_store.release([blob.content_hash])
+            migrated += 1
+    if migrated:
+        # Recuperar el espacio que ocupaba el Base64
+        await conn.execute_script("VACUUM")
+    return migrated
@@ -3,10 +3,16 @@ from tortoise import fields, models
 class Document(models.Model):
     id = fields.UUIDField(pk=True)
     title = fields.CharField(max_length=255)
-    content = fields.TextField()  # This will store the Base64 string of the original file
+    content = fields.TextField(default="")  # Legacy: Base64 of the original file, migrated to the blob store
+    content_hash = fields.CharField(max_length=64, null=True, index=True)  # SHA-256 of the original file in the blob store
+    size = fields.IntField(default=0)  # Size of the original file in bytes
+    mime_type = fields.CharField(max_length=255, null=True)
     extracted_text = fields.TextField(null=True) # This will store the text extracted from the file
     word_count = fields.IntField()
     created_at = fields.DatetimeField(auto_now_add=True)
+    updated_at = fields.DatetimeField(auto_now=True)  # Used by reconcile re-indexing to detect changes
 
     class Meta:
         table = "documents"
+        # Keyset pagination of the document listing
+        indexes = (("created_at", "id"),)
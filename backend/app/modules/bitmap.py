@@ -0,0 +1,283 @@
+"""
+Compressed bitmaps of dense integer IDs (Roaring-style).
+"""
+from array import array
+from bisect import bisect_left
+from itertools import chain, compress
+from typing import Dict, Iterable, Iterator, List, Set, Union
+
+from app.modules.term_dictionary import TermDictionary
+
+# Un contenedor de arreglo con más valores ocupa más que uno de bits (8 KB)
+ARRAY_MAX = 4096
+
+# Contenedor: arreglo ordenado de los 16 bits bajos (2 bytes por valor),
+# o un int usado como mapa de 65536 bits
+Container = Union["array[int]", int]
+
+
+def _array(values: Iterable[int]) -> "array[int]":
+    """Sparse container with sorted low bits."""
+    return array("H", values)
+
+
+def _to_bits(container: Container) -> int:
+    if isinstance(container, int):
+        return container
+    # Los bits se marcan en bytes: un '|=' por valor sobre el int copiaría 8 KB cada vez
+    buffer = bytearray(8192)
+    for low in container:
+        buffer[low >> 3] |= 1 << (low & 7)
+    return int.from_bytes(buffer, "little")
+
+
+# Traduce los dígitos binarios '0'/'1' a bytes 0/1, para filtrar posiciones con compress
+_BINARY_DIGITS = bytes.maketrans(b"01", b"\x00\x01")
+
+
+def _iter_bits(bits: int) -> Iterator[int]:
+    """Positions of the set bits of an int, in ascending order."""
+    # Dígitos del bit menos significativo al más significativo, sin el prefijo '0b'
+    digits = bin(bits)[:1:-1].encode("ascii").translate(_BINARY_DIGITS)
+    return compress(range(len(digits)), digits)
+
+
+def _bit_count(bits: int) -> int:
+    """Number of set bits of an int (``int.bit_count`` needs Python 3.10)."""
+    return bin(bits).count("1")
+
+
+def _normalize(container: Container) -> Container:
+    """Use the cheaper representation for the number of values in a container."""
+    if isinstance(container, int):
+        if _bit_count(container) <= ARRAY_MAX:
+            return _array(_iter_bits(container))
+        return container
+    if len(container) > ARRAY_MAX:
+        return _to_bits(container)
+    return container
+
+
+class RoaringBitmap:
+    """
+    Set of non-negative integers split in chunks of 65536 values.
+    
+    Each chunk (keyed by the 16 high bits) is stored as a sorted array of
+    its 16-bit low bits while it is sparse, and as a 65536-bit integer once
+    it holds more than ``ARRAY_MAX`` values. Union, intersection and
+    difference work chunk by chunk, with the dense chunks combined by
+    integer bitwise operations. When a union is large, sparse chunks are
+    combined as bits too.
+    """
+    
+    __slots__ = ("_containers",)
+    
+    def __init__(self, values: Iterable[int] = ()):
+        """
+        Initialize a bitmap.
+        
+        Args:
+            values: Initial values
+        """
+        self._containers: Dict[int, Container] = {}
+        chunks: Dict[int, Set[int]] = {}
+        for value in values:
+            chunks.setdefault(value >> 16, set()).add(value & 0xFFFF)
+        for high, lows in chunks.items():
+            self._containers[high] = _normalize(_array(sorted(lows)))
+    
+    def __len__(self) -> int:
+        return sum(
+            _bit_count(container) if isinstance(container, int) else len(container)
+            for container in self._containers.values()
+        )
+    
+    def __bool__(self) -> bool:
+        return bool(self._containers)
+    
+    def __contains__(self, value: int) -> bool:
+        container = self._containers.get(value >> 16)
+        if container is None:
+            return False
+        low = value & 0xFFFF
+        if isinstance(container, int):
+            return bool(container >> low & 1)
+        i = bisect_left(container, low)
+        return i < len(container) and container[i] == low
+    
+    def __iter__(self) -> Iterator[int]:
+        return chain.from_iterable(
+            map((high << 16).__or__, _iter_bits(container) if isinstance(container, int) else container)
+            for high, container in sorted(self._containers.items())
+        )
+    
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, RoaringBitmap):
+            return NotImplemented
+        return self._containers == other._containers
+    
+    def __repr__(self) -> str:
+        return f"RoaringBitmap({len(self)} values, {len(self._containers)} containers)"
+    
+    def add(self, value: int) -> None:
+        """
+        Add a value.
+        
+        Args:
+            value: Non-negative integer
+        """
+        high, low = value >> 16, value & 0xFFFF
+        container = self._containers.get(high)
+        if container is None:
+            self._containers[high] = _array((low,))
+        elif isinstance(container, int):
+            self._containers[high] = container | (1 << low)
+        else:
+            i = bisect_left(container, low)
+            if i == len(container) or container[i] != low:
+                container.insert(i, low)
+                if len(container) > ARRAY_MAX:
+                    self._containers[high] = _to_bits(container)
+    
+    def discard(self, value: int) -> None:
+        """
+        Remove a value if present.
+        
+        Args:
+            value: Non-negative integer
+        """
+        high, low = value >> 16, value & 0xFFFF
+        container = self._containers.get(high)
+        if container is None:
+            return
+        if isinstance(container, int):
+            container = _normalize(container & ~(1 << low))
+        else:
+            i = bisect_left(container, low)
+            if i < len(container) and container[i] == low:
+                container = container[:i] + container[i + 1:]
+        if container:
+            self._containers[high] = container
+        else:
+            del self._containers[high]
+    
+    @classmethod
+    def union(cls, *bitmaps: "RoaringBitmap") -> "RoaringBitmap":
+        """
+        Union of any number of bitmaps, merging each chunk once.
+        
+        Args:
+            bitmaps: Bitmaps to combine
+        
+        Returns:
+            New bitmap
+        """
+        chunks: Dict[int, List[RoaringBitmap]] = {}
+        for bitmap in bitmaps:
+            for high in bitmap._containers:
+                chunks.setdefault(high, []).append(bitmap)
+        result = cls()
+        for high, owners in chunks.items():
+            containers = [owner._containers[high] for owner in owners]
+            if not any(isinstance(c, int) for c in containers) and sum(map(len, containers)) <= ARRAY_MAX:
+                lows: Set[int] = set()
+                for container in containers:
+                    lows.update(container)
+                result._containers[high] = _array(sorted(lows))
+            else:
+                # Los contenedores dispersos se marcan todos en un mismo buffer
+                buffer = bytearray(8192)
+                bits = 0
+                for container in containers:
+                    if isinstance(container, int):
+                        bits |= container
+                    else:
+                        for low in container:
+                            buffer[low >> 3] |= 1 << (low & 7)
+                result._containers[high] = _normalize(bits | int.from_bytes(buffer, "little"))
+        return result
+    
+    def __or__(self, other: "RoaringBitmap") -> "RoaringBitmap":
+        return RoaringBitmap.union(self, other)
+    
+    def __and__(self, other: "RoaringBitmap") -> "RoaringBitmap":
+        result = RoaringBitmap()
+        for high in self._containers.keys() & other._containers.keys():
+            a, b = self._containers[high], other._containers[high]
+            if isinstance(a, int) or isinstance(b, int):
+                container = _normalize(_to_bits(a) & _to_bits(b))
+            else:
+                container = _array(sorted(set(a).intersection(b)))
+            if container:
+                result._containers[high] = container
+        return result
+    
+    def __sub__(self, other: "RoaringBitmap") -> "RoaringBitmap":
+        result = RoaringBitmap()
+        for high, a in self._containers.items():
+            b = other._containers.get(high)
+            if b is None:
+                container = a if isinstance(a, int) else _array(a)
+            elif isinstance(a, int) or isinstance(b, int):
+                container = _normalize(_to_bits(a) & ~_to_bits(b))
+            else:
+                container = _array(sorted(set(a).difference(b)))
+            if container:
+                result._containers[high] = container
+        return result
+
+
+# IDs enteros densos de los documentos, compartidos por todos los índices del proceso
+document_dictionary = TermDictionary()
+
+
+class DocumentBitmap:
+    """
+    Set of document IDs stored as a bitmap of their dense integer IDs.
+    
+    It is the posting list of indexes in 'bitmap' format: it supports the
+    set operations the indexes use on postings (add, discard, membership,
+    iteration, length, difference), decoding to document ID strings only
+    when iterated, while unions of many postings work on ``bitmap``.
+    """
+    
+    __slots__ = ("bitmap",)
+    
+    def __init__(self, document_ids: Iterable[str] = ()):
+        """
+        Initialize a posting list.
+        
+        Args:
+            document_ids: Initial document IDs
+        """
+        intern = document_dictionary.intern
+        self.bitmap = RoaringBitmap(map(intern, document_ids))
+    
+    def __len__(self) -> int:
+        return len(self.bitmap)
+    
+    def __bool__(self) -> bool:
+        return bool(self.bitmap)
+    
+    def __contains__(self, document_id: str) -> bool:
+        dense_id = document_dictionary.get_id(document_id)
+        return dense_id is not None and dense_id in self.bitmap
+    
+    def __iter__(self) -> Iterator[str]:
+        return iter(document_dictionary.terms(self.bitmap))
+    
+    def __sub__(self, other: Iterable[str]) -> Set[str]:
+        return set(self).difference(other)
+    
+    def __repr__(self) -> str:
+        return f"DocumentBitmap({len(self)} documents)"
+    
+    def add(self, document_id: str) -> None:
+        """Add a document."""
+        self.bitmap.add(document_dictionary.intern(document_id))
+    
+    def discard(self, document_id: str) -> None:
+        """Remove a document if present."""
+        dense_id = document_dictionary.get_id(document_id)
+        if dense_id is not None:
+            self.bitmap.discard(dense_id)
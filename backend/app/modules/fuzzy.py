@@ -0,0 +1,53 @@
+"""
+Edit distance helpers for fuzzy term matching.
+"""
+from typing import List, Optional
+
+
+def levenshtein_row(previous: List[int], char: str, query: str) -> List[int]:
+    """
+    Compute the next row of the Levenshtein table.
+    
+    Row ``r`` holds, for each prefix of ``query``, the edit distance to the
+    text read so far; adding one character of text gives the next row.
+    Walking a trie with these rows shares the work between words with a
+    common prefix.
+    
+    Args:
+        previous: Row for the text read so far
+        char: Next character of the text
+        query: Query the text is compared with
+    
+    Returns:
+        Row for the text plus ``char``
+    """
+    row = [previous[0] + 1]
+    for i, query_char in enumerate(query, 1):
+        row.append(min(
+            row[i - 1] + 1,  # inserción
+            previous[i] + 1,  # borrado
+            previous[i - 1] + (query_char != char)  # sustitución
+        ))
+    return row
+
+
+def edit_distance_within(word: str, query: str, max_distance: int) -> Optional[int]:
+    """
+    Edit distance between two strings, if it does not exceed a bound.
+    
+    Args:
+        word: First string
+        query: Second string
+        max_distance: Largest distance of interest
+    
+    Returns:
+        The distance, or None if it is larger than ``max_distance``
+    """
+    if abs(len(word) - len(query)) > max_distance:
+        return None
+    row = list(range(len(query) + 1))
+    for char in word:
+        row = levenshtein_row(row, char, query)
+        if min(row) > max_distance:
+            return None
+    return row[-1] if row[-1] <= max_distance else None
@@ -1,9 +1,60 @@
 """
 Base class for inverted index implementation.
 """
+import sys
 from abc import ABC, abstractmethod
-from typing import Dict, List, Set, Optional
+from collections.abc import Mapping
+from typing import Callable, Dict, Iterable, Iterator, List, Set, Optional, Tuple
 from datetime import datetime
+from app.core.config import settings
+from app.modules.bitmap import DocumentBitmap, RoaringBitmap, document_dictionary
+from app.modules.fuzzy import edit_distance_within
+from app.modules.hyperloglog import HyperLogLog
+from app.modules.term_dictionary import TermDictionary, term_dictionary
+from app.modules.term_pattern import TermPattern
+
+# Documento especial: una posting suya significa "todos los documentos del índice"
+ALL_DOCUMENTS = "*"
+
+# Postings con menos documentos se cuentan exactamente al estimar, sin sketch
+SKETCH_MIN_POSTINGS = 1024
+
+
+class _TermPostingsView(Mapping):
+    """Read-only ``word -> document IDs`` view over postings keyed by term ID."""
+    
+    def __init__(self, index: "InvertedIndex"):
+        self._index = index
+    
+    def __getitem__(self, word: str) -> Set[str]:
+        term_id = self._index.terms.get_id(word)
+        if term_id is None or term_id not in self._index.postings:
+            raise KeyError(word)
+        return self._index._term_documents(term_id)
+    
+    def __iter__(self) -> Iterator[str]:
+        term = self._index.terms.term
+        return (term(term_id) for term_id in self._index.postings)
+    
+    def __len__(self) -> int:
+        return len(self._index.postings)
+
+
+class _DocumentTermsView(Mapping):
+    """Read-only ``document ID -> words`` view over forward lists of term IDs."""
+    
+    def __init__(self, index: "InvertedIndex"):
+        self._index = index
+    
+    def __getitem__(self, document_id: str) -> Set[str]:
+        term = self._index.terms.term
+        return {term(term_id) for term_id in self._index.forward[document_id]}
+    
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._index.forward)
+    
+    def __len__(self) -> int:
+        return len(self._index.forward)
 
 
 class InvertedIndex(ABC):
@@ -11,13 +62,49 @@ class InvertedIndex(ABC):
     Abstract base class for inverted index implementations.
     
     An inverted index maps words to the documents that contain them.
+    Words are stored as IDs of the shared ``TermDictionary``; the
+    ``word_to_documents`` and ``document_to_words`` views expose them
+    as strings.
+    
+    A word added to every document is stored once, as a posting for the
+    ``ALL_DOCUMENTS`` marker, and resolved to the indexed documents at
+    query time, so it stays correct as documents are added or removed.
     """
     
-    def __init__(self):
-        """Initialize the inverted index."""
-        self.word_to_documents: Dict[str, Set[str]] = {}
-        self.document_to_words: Dict[str, Set[str]] = {}
+    def __init__(self, terms: Optional[TermDictionary] = None, posting_format: Optional[str] = None):
+        """
+        Initialize the inverted index.
+        
+        Args:
+            terms: Term dictionary to use (the shared one by default)
+            posting_format: How postings are stored: 'set' (default) or
+                'bitmap', which stores each term's documents as a compressed
+                bitmap of dense IDs (less memory on large corpora, and fast
+                unions for broad prefix/substring queries)
+        """
+        self.terms = terms if terms is not None else term_dictionary
+        self.posting_format = posting_format or settings.POSTING_FORMAT
+        # term ID -> IDs de los documentos que contienen el término
+        # (un DocumentBitmap en formato 'bitmap')
+        self.postings: Dict[int, Set[str]] = {}
+        # ID de documento -> term IDs del documento
+        self.forward: Dict[str, Set[int]] = {}
+        # Huella (hash de contenido/fecha de modificación) de cada documento indexado,
+        # usada para re-indexar solo los documentos que cambiaron
+        self.document_versions: Dict[str, str] = {}
         self.created_at: Optional[datetime] = None
+        # Sketches HyperLogLog de las postings grandes, para estimar conteos
+        self._sketches: Dict[int, HyperLogLog] = {}
+    
+    @property
+    def word_to_documents(self) -> Mapping:
+        """Mapping of word to the set of documents that contain it."""
+        return _TermPostingsView(self)
+    
+    @property
+    def document_to_words(self) -> Mapping:
+        """Mapping of document ID to the set of its words."""
+        return _DocumentTermsView(self)
     
     @abstractmethod
     def add_document(self, document_id: str, words: List[str]) -> None:
@@ -30,30 +117,235 @@ class InvertedIndex(ABC):
         """
         pass
     
-    @abstractmethod
+    def add_documents(self, documents: Dict[str, List[str]]) -> None:
+        """
+        Add several documents to the index.
+        
+        Subclasses with structures that are expensive to update override
+        this to rebuild them once for the whole batch.
+        
+        Args:
+            documents: Mapping of document ID to its list of words/tokens
+        """
+        for document_id, words in documents.items():
+            self.add_document(document_id, words)
+    
     def search(self, query: str) -> List[str]:
         """
         Search for documents containing the query.
         
         Args:
             query: Search query (word or substring)
-            
+        
         Returns:
             List of document IDs that match the query
         """
+        return list(self.resolve_documents(self._match(query)))
+    
+    def _match(self, query: str) -> Set[str]:
+        """
+        Find the postings of the words that match the query.
+        
+        Args:
+            query: Search query (word or substring)
+        
+        Returns:
+            Matching document IDs, possibly including ``ALL_DOCUMENTS``
+        """
+        return self._union_postings(self._match_terms(query))
+    
+    @abstractmethod
+    def _match_terms(self, query: str) -> Set[int]:
+        """
+        Find the words that match the query.
+        
+        Args:
+            query: Search query (word or substring)
+        
+        Returns:
+            Set of term IDs
+        """
         pass
     
+    def search_words(self, words: Iterable[str]) -> List[str]:
+        """
+        Find the documents that contain any of several exact words.
+        
+        Args:
+            words: Normalized words
+        
+        Returns:
+            List of document IDs
+        """
+        return list(self.resolve_documents(self._match_words(words)))
+    
+    def _match_words(self, words: Iterable[str]) -> Set[str]:
+        """Postings of several exact words, without resolving ``ALL_DOCUMENTS``."""
+        get_id = self.terms.get_id
+        return self._union_postings(get_id(word) for word in words)
+    
+    def fuzzy_terms(self, query: str, max_distance: int) -> Set[int]:
+        """
+        Find the words within an edit distance of the query.
+        
+        This compares the query with every word; indexes with a tree
+        override it to prune the words that cannot match.
+        
+        Args:
+            query: Normalized query
+            max_distance: Maximum edit distance (insertions, deletions, substitutions)
+        
+        Returns:
+            Set of term IDs
+        """
+        term = self.terms.term
+        return {
+            term_id for term_id in self.postings
+            if edit_distance_within(term(term_id), query, max_distance) is not None
+        }
+    
+    def pattern_terms(self, pattern: TermPattern) -> Set[int]:
+        """
+        Find the words that match a wildcard or regex pattern.
+        
+        This checks the pattern against every word; indexes with a tree
+        override it to look up candidates by the pattern's literal parts.
+        
+        Args:
+            pattern: Parsed pattern
+        
+        Returns:
+            Set of term IDs
+        """
+        term = self.terms.term
+        return {term_id for term_id in self.postings if pattern.matches(term(term_id))}
+    
+    def _union_postings(self, term_ids: Iterable[Optional[int]]) -> Set[str]:
+        """
+        Union of the postings of several terms.
+        
+        Args:
+            term_ids: Term IDs (None and terms without postings are skipped)
+        
+        Returns:
+            Set of document IDs, possibly including ``ALL_DOCUMENTS``
+        """
+        postings = self.postings
+        if self.posting_format == settings.POSTING_FORMAT_BITMAP:
+            # Las uniones se hacen sobre enteros y los IDs se traducen una sola vez
+            bitmaps = [postings[term_id].bitmap for term_id in term_ids if term_id in postings]
+            return set(document_dictionary.terms(RoaringBitmap.union(*bitmaps)))
+        
+        documents: Set[str] = set()
+        for term_id in term_ids:
+            term_documents = postings.get(term_id)
+            if term_documents:
+                documents.update(term_documents)
+        return documents
+    
+    def estimate_documents(self, term_ids: Iterable[Optional[int]]) -> Tuple[float, bool]:
+        """
+        Estimate the number of documents in the union of several terms' postings.
+        
+        Small postings are counted exactly; terms with at least
+        ``SKETCH_MIN_POSTINGS`` documents are merged as HyperLogLog
+        sketches (cached per term), so broad prefix or substring queries
+        are counted without building the union of their postings.
+        ``ALL_DOCUMENTS`` postings are not resolved (see ``global_term_ids``).
+        
+        Args:
+            term_ids: Term IDs (None and terms without postings are skipped)
+        
+        Returns:
+            Number of documents, and whether it is an estimate (False when
+            no posting is large enough to be sketched)
+        """
+        postings = self.postings
+        documents: Set[str] = set()
+        sketches = []
+        for term_id in term_ids:
+            term_documents = postings.get(term_id)
+            if not term_documents:
+                continue
+            if len(term_documents) < SKETCH_MIN_POSTINGS:
+                documents.update(term_documents)
+                continue
+            sketch = self._sketches.get(term_id)
+            if sketch is None:
+                sketch = self._sketches[term_id] = HyperLogLog(term_documents)
+            sketches.append(sketch)
+        documents.discard(ALL_DOCUMENTS)
+        if not sketches:
+            return float(len(documents)), False
+        if documents:
+            sketches.append(HyperLogLog(documents))
+        return HyperLogLog.union(*sketches).estimate(), True
+    
+    def _new_postings(self, document_ids: Iterable[str] = ()) -> Set[str]:
+        """Create the posting list of a term in this index's format."""
+        if self.posting_format == settings.POSTING_FORMAT_BITMAP:
+            return DocumentBitmap(document_ids)
+        return set(map(sys.intern, document_ids))
+    
+    def _term_documents(self, term_id: int) -> Set[str]:
+        """Documents of a term's postings as a set (empty if the term has none)."""
+        documents = self.postings.get(term_id)
+        if documents is None:
+            return set()
+        return documents if isinstance(documents, set) else set(documents)
+    
+    def resolve_documents(self, documents: Set[str]) -> Set[str]:
+        """
+        Replace the ``ALL_DOCUMENTS`` marker with the indexed documents.
+        
+        Args:
+            documents: Document IDs from the postings
+        
+        Returns:
+            Set of document IDs
+        """
+        if ALL_DOCUMENTS in documents:
+            return self.document_ids()
+        return documents
+    
+    def global_term_ids(self) -> Set[int]:
+        """
+        Get the IDs of the words added to every document.
+        
+        Returns:
+            Set of term IDs
+        """
+        return self.forward.get(ALL_DOCUMENTS, set())
+    
     def get_documents_for_word(self, word: str) -> Set[str]:
         """
         Get all documents containing a specific word.
         
         Args:
             word: Word to search for
-            
+        
         Returns:
             Set of document IDs containing the word
         """
-        return self.word_to_documents.get(word.lower(), set())
+        return self.resolve_documents(self._postings_for_word(word))
+    
+    def _postings_for_word(self, word: str) -> Set[str]:
+        """Documents of a word's postings, without resolving ``ALL_DOCUMENTS``."""
+        term_id = self.terms.get_id(word.lower())
+        if term_id is None:
+            return set()
+        return self._term_documents(term_id)
+    
+    def document_ids(self) -> Set[str]:
+        """
+        Get the IDs of the indexed documents.
+        
+        Returns:
+            Set of document IDs
+        """
+        document_ids = set(self.forward)
+        document_ids.discard(ALL_DOCUMENTS)
+        return document_ids
     
     def get_words_for_document(self, document_id: str) -> Set[str]:
         """
@@ -61,11 +353,27 @@ class InvertedIndex(ABC):
         
         Args:
             document_id: Document identifier
-            
+        
         Returns:
             Set of words in the document
         """
-        return self.document_to_words.get(document_id, set())
+        return set(self.terms.terms(self.get_term_ids_for_document(document_id)))
+    
+    def get_term_ids_for_document(self, document_id: str) -> Set[int]:
+        """
+        Get the term IDs of the words in a specific document.
+        
+        Args:
+            document_id: Document identifier
+        
+        Returns:
+            Set of term IDs (must not be modified)
+        """
+        term_ids = self.forward.get(document_id)
+        if term_ids is None or document_id == ALL_DOCUMENTS:
+            return set()
+        global_term_ids = self.global_term_ids()
+        return term_ids | global_term_ids if global_term_ids else term_ids
     
     def add_word(self, word: str, document_id: str) -> None:
         """
@@ -73,16 +381,108 @@ class InvertedIndex(ABC):
         
         Args:
             word: Word to add
+            document_id: Document identifier, or ``ALL_DOCUMENTS``
+        """
+        self._add_posting(self.terms.intern(word.lower()), document_id)
+    
+    def add_words(self, words: Dict[str, Iterable[str]]) -> None:
+        """
+        Add several words, each to a set of documents.
+        
+        Subclasses update their tree once for the whole batch.
+        
+        Args:
+            words: Mapping of word to the IDs of the documents that get it
+                (``ALL_DOCUMENTS`` adds it to every document)
+        """
+        documents: Dict[str, Set[int]] = {}
+        for word, document_ids in words.items():
+            term_id = self.terms.intern(word.lower())
+            for document_id in document_ids:
+                documents.setdefault(document_id, set()).add(term_id)
+        self.add_term_ids(documents)
+    
+    def add_term_ids(self, documents: Dict[str, Iterable[int]]) -> None:
+        """
+        Add documents whose words are already term IDs (e.g. copied from another index).
+        
+        Args:
+            documents: Mapping of document ID to the term IDs of its words
+        """
+        for document_id, term_ids in documents.items():
+            for term_id in term_ids:
+                self._add_posting(term_id, document_id)
+    
+    def add_postings(self, postings: Iterable[Tuple[int, Iterable[str]]]) -> None:
+        """
+        Add postings term by term, e.g. streamed from a merge of sorted runs.
+        
+        Only one term's documents need to be in memory at a time besides
+        the index itself. Subclasses update their tree once for the stream.
+        
+        Args:
+            postings: Pairs of (term ID, IDs of the documents that contain it)
+        """
+        for term_id, document_ids in postings:
+            for document_id in document_ids:
+                self._add_posting(term_id, document_id)
+    
+    def merge(self, *others: "InvertedIndex", exclude: Optional[Set[str]] = None) -> None:
+        """
+        Add the postings of other indexes to this one, without re-tokenizing.
+        
+        Indexes built with another term dictionary (e.g. in a worker process)
+        have their term IDs translated to this index's dictionary. Subclasses
+        update their tree once for the whole merge.
+        
+        Args:
+            others: Indexes to merge into this one (they are not modified)
+            exclude: Documents to leave out (e.g. deleted ones)
+        """
+        documents: Dict[str, Set[int]] = {}
+        for other in others:
+            if other.terms is self.terms:
+                remap = None
+            else:
+                intern = self.terms.intern
+                term = other.terms.term
+                remap = {term_id: intern(term(term_id)) for term_id in other.postings}
+            for doc_id, term_ids in other.forward.items():
+                if exclude and doc_id in exclude:
+                    continue
+                target = documents.setdefault(doc_id, set())
+                target.update(term_ids if remap is None else (remap[i] for i in term_ids))
+            for doc_id, version in other.document_versions.items():
+                if not exclude or doc_id not in exclude:
+                    self.document_versions[doc_id] = version
+        self.add_term_ids(documents)
+    
+    def _add_posting(self, term_id: int, document_id: str) -> bool:
+        """
+        Record that a document contains a term.
+        
+        Args:
+            term_id: Term ID
             document_id: Document identifier
+        
+        Returns:
+            True if the term was not in the index before
         """
-        word_lower = word.lower()
-        if word_lower not in self.word_to_documents:
-            self.word_to_documents[word_lower] = set()
-        self.word_to_documents[word_lower].add(document_id)
+        # Una sola copia del ID de documento para todas sus postings
+        document_id = sys.intern(document_id)
+        documents = self.postings.get(term_id)
+        is_new_term = documents is None
+        if is_new_term:
+            documents = self.postings[term_id] = self._new_postings()
+        documents.add(document_id)
+        if self._sketches:
+            self._sketches.pop(term_id, None)
         
-        if document_id not in self.document_to_words:
-            self.document_to_words[document_id] = set()
-        self.document_to_words[document_id].add(word_lower)
+        term_ids = self.forward.get(document_id)
+        if term_ids is None:
+            term_ids = self.forward[document_id] = set()
+        term_ids.add(term_id)
+        return is_new_term
     
     def remove_word(self, word: str) -> bool:
         """
@@ -90,24 +490,181 @@ class InvertedIndex(ABC):
         
         Args:
             word: Word to remove
-            
+        
         Returns:
             True if word was found and removed, False otherwise
         """
-        word_lower = word.lower()
-        if word_lower not in self.word_to_documents:
+        term_id = self.terms.get_id(word.lower())
+        if term_id is None or term_id not in self.postings:
             return False
         
         # Remove from all documents
-        document_ids = self.word_to_documents[word_lower].copy()
-        for doc_id in document_ids:
-            if doc_id in self.document_to_words:
-                self.document_to_words[doc_id].discard(word_lower)
+        self._sketches.pop(term_id, None)
+        for doc_id in self.postings.pop(term_id):
+            if doc_id in self.forward:
+                self.forward[doc_id].discard(term_id)
+        return True
+    
+    def remove_words(self, words: Iterable[str]) -> int:
+        """
+        Remove several words from the index.
+        
+        Args:
+            words: Words to remove
         
-        # Remove the word entry
-        del self.word_to_documents[word_lower]
+        Returns:
+            Number of words that were found and removed
+        """
+        return sum(1 for word in words if self.remove_word(word))
+    
+    def remove_document(self, document_id: str) -> bool:
+        """
+        Remove a document and its postings from the index.
+        
+        Words left without documents are removed from the index.
+        
+        Args:
+            document_id: Document identifier
+        
+        Returns:
+            True if the document was indexed, False otherwise
+        """
+        self.document_versions.pop(document_id, None)
+        term_ids = self.forward.pop(document_id, None)
+        if term_ids is None:
+            return False
+        
+        for term_id in term_ids:
+            documents = self.postings.get(term_id)
+            if documents is None:
+                continue
+            documents.discard(document_id)
+            self._sketches.pop(term_id, None)
+            if not documents:
+                del self.postings[term_id]
+                self._on_word_removed(term_id)
         return True
     
+    def remove_documents(self, document_ids: List[str]) -> int:
+        """
+        Remove several documents from the index.
+        
+        Args:
+            document_ids: Document identifiers
+        
+        Returns:
+            Number of documents that were indexed and got removed
+        """
+        return sum(1 for document_id in document_ids if self.remove_document(document_id))
+    
+    def _on_word_removed(self, term_id: int) -> None:
+        """
+        Hook called when a word loses its last document.
+        
+        Args:
+            term_id: ID of the word that is no longer in the index
+        """
+        pass
+    
+    def _postings_to_dict(self, portable: bool = False) -> Dict:
+        """
+        Serialize postings, forward lists and document versions.
+        
+        Term IDs refer to the shared term dictionary, which is saved on its
+        own; ``portable`` embeds the dictionary so the data can be loaded
+        without it (e.g. by another process).
+        """
+        data = {
+            "postings": {
+                str(term_id): list(docs) for term_id, docs in self.postings.items()
+            },
+            "document_terms": {
+                doc_id: list(term_ids) for doc_id, term_ids in self.forward.items()
+            },
+            "document_versions": self.document_versions,
+            "posting_format": self.posting_format,
+        }
+        if portable:
+            data["terms"] = self.terms.to_list()
+        return data
+    
+    @staticmethod
+    def filter_data(data: Dict, keep: Callable[[str], bool]) -> Dict:
+        """
+        Drop documents from data written by ``to_dict``, before it is loaded.
+        
+        Filtering the serialized data means the postings, forward lists and
+        tree of the dropped documents are never built (e.g. a search shard
+        loading only its partition of a saved index).
+        
+        Args:
+            data: Dictionary with index data
+            keep: Returns True for the documents to keep
+        
+        Returns:
+            Dictionary with the same format and only the kept documents
+        """
+        kept = lambda document_id: document_id == ALL_DOCUMENTS or keep(document_id)
+        filtered = dict(data)
+        # Formato actual (term IDs) y el de versiones anteriores (palabras)
+        for postings_key, forward_key in (("postings", "document_terms"), ("word_to_documents", "document_to_words")):
+            if postings_key in data:
+                postings = {}
+                for term, docs in data[postings_key].items():
+                    docs = [doc_id for doc_id in docs if kept(doc_id)]
+                    if docs:
+                        postings[term] = docs
+                filtered[postings_key] = postings
+            if forward_key in data:
+                filtered[forward_key] = {
+                    doc_id: terms for doc_id, terms in data[forward_key].items() if kept(doc_id)
+                }
+        if "document_versions" in data:
+            filtered["document_versions"] = {
+                doc_id: version for doc_id, version in data["document_versions"].items() if keep(doc_id)
+            }
+        return filtered
+    
+    def _restore_postings(self, data: Dict, terms: Optional[List[str]] = None) -> None:
+        """
+        Restore the data written by ``_postings_to_dict``.
+        
+        Indexes saved by older versions, keyed by word strings, are also accepted.
+        
+        Args:
+            data: Dictionary with index data
+            terms: Saved term dictionary the term IDs refer to; None means
+                the IDs come from this process's dictionary
+        """
+        if "postings" in data:
+            terms = data.get("terms", terms)
+            if terms is None:
+                remap = int
+            else:
+                # Los IDs guardados se traducen a los del diccionario actual
+                term_ids = self.terms.merge(terms)
+                remap = lambda term_id: term_ids[int(term_id)]
+            for term_id, docs in data["postings"].items():
+                self.postings[remap(term_id)] = self._new_postings(docs)
+            if "document_terms" in data:
+                for doc_id, doc_term_ids in data["document_terms"].items():
+                    self.forward[sys.intern(doc_id)] = {remap(i) for i in doc_term_ids}
+            else:
+                # Segmentos escritos sin listas directas: se derivan de las postings
+                # (ALL_DOCUMENTS incluido, que guarda los términos globales)
+                for term_id, docs in self.postings.items():
+                    for doc_id in docs:
+                        self.forward.setdefault(doc_id, set()).add(term_id)
+        else:
+            intern = self.terms.intern
+            for word, docs in data.get("word_to_documents", {}).items():
+                self.postings[intern(word)] = self._new_postings(docs)
+            for doc_id, words in data.get("document_to_words", {}).items():
+                self.forward[sys.intern(doc_id)] = {intern(word) for word in words}
+        
+        # Restore document versions (missing in indexes saved by older versions)
+        self.document_versions = data.get("document_versions", {})
+    
     def get_statistics(self) -> Dict:
         """
         Get statistics about the index.
@@ -115,9 +672,9 @@ class InvertedIndex(ABC):
         Returns:
             Dictionary with index statistics
         """
-        total_words = len(self.word_to_documents)
-        total_documents = len(self.document_to_words)
-        total_occurrences = sum(len(docs) for docs in self.word_to_documents.values())
+        total_words = len(self.postings)
+        total_documents = len(self.document_ids())
+        total_occurrences = sum(len(docs) for docs in self.postings.values())
         
         return {
             "word_count": total_words,
@@ -133,5 +690,5 @@ class InvertedIndex(ABC):
         Returns:
             List of all words
         """
-        return sorted(list(self.word_to_documents.keys()))
-
+        term = self.terms.term
+        return sorted(term(term_id) for term_id in self.postings)
@@ -0,0 +1,175 @@
+"""
+In-memory columnar store of document metadata, for filtering search results.
+"""
+from datetime import datetime, timezone
+from typing import Any, Iterable, List, Optional, Tuple
+
+from app.modules.bitmap import document_dictionary
+from app.modules.term_dictionary import TermDictionary
+
+# (ID de documento, título, número de palabras, tamaño en bytes, fecha de creación)
+DocumentMetadata = Tuple[str, str, int, int, Optional[datetime]]
+
+
+def _numpy():
+    """Import NumPy on first use, so importing this module stays cheap."""
+    import numpy
+    return numpy
+
+
+def _timestamp(value: Optional[datetime]) -> int:
+    """Microseconds since the epoch (naive datetimes are taken as UTC)."""
+    if value is None:
+        return 0
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return int(value.timestamp() * 1_000_000)
+
+
+class MetadataStore:
+    """
+    Document metadata kept as NumPy columns indexed by dense document ID.
+    
+    Row ``i`` holds the document whose ID is ``i`` in the document
+    dictionary, so the IDs matched by a search are turned into row numbers
+    and every numeric filter is evaluated for all of them at once, without
+    querying the database.
+    """
+    
+    def __init__(self, documents: Optional[TermDictionary] = None):
+        """
+        Initialize an empty store.
+        
+        Args:
+            documents: Dictionary of dense document IDs (the shared one by default)
+        """
+        self.documents = documents if documents is not None else document_dictionary
+        # Si ya se cargaron todos los documentos de la base de datos
+        self.loaded = False
+        self._present: Any = None
+        self._created_at: Any = None
+        self._word_count: Any = None
+        self._size: Any = None
+        # Títulos en minúsculas, para filtrar por prefijo
+        self._titles: List[str] = []
+    
+    def __len__(self) -> int:
+        return int(self._present.sum()) if self._present is not None else 0
+    
+    def _ensure_capacity(self, rows: int) -> None:
+        """Grow the columns (doubling) so they hold at least ``rows`` rows."""
+        np = _numpy()
+        capacity = len(self._titles)
+        if rows <= capacity:
+            return
+        new_capacity = max(rows, capacity * 2, 1024)
+        columns = {
+            "_present": np.zeros(new_capacity, dtype=bool),
+            "_created_at": np.zeros(new_capacity, dtype=np.int64),
+            "_word_count": np.zeros(new_capacity, dtype=np.int64),
+            "_size": np.zeros(new_capacity, dtype=np.int64),
+        }
+        for name, column in columns.items():
+            if capacity:
+                column[:capacity] = getattr(self, name)
+            setattr(self, name, column)
+        self._titles.extend([""] * (new_capacity - capacity))
+    
+    def put_many(self, documents: Iterable[DocumentMetadata]) -> None:
+        """
+        Add or replace the metadata of several documents.
+        
+        Args:
+            documents: Tuples of (ID, title, word count, size, creation date)
+        """
+        np = _numpy()
+        intern = self.documents.intern
+        rows, created_at, word_count, size = [], [], [], []
+        titles = []
+        for document_id, title, words, size_bytes, created in documents:
+            rows.append(intern(str(document_id)))
+            titles.append((title or "").lower())
+            word_count.append(words or 0)
+            size.append(size_bytes or 0)
+            created_at.append(_timestamp(created))
+        if not rows:
+            return
+        self._ensure_capacity(max(rows) + 1)
+        index = np.array(rows, dtype=np.int64)
+        self._present[index] = True
+        self._created_at[index] = created_at
+        self._word_count[index] = word_count
+        self._size[index] = size
+        for row, title in zip(rows, titles):
+            self._titles[row] = title
+    
+    def remove(self, document_id: str) -> None:
+        """
+        Remove the metadata of a document.
+        
+        Args:
+            document_id: Document identifier
+        """
+        row = self.documents.get_id(document_id)
+        if row is not None and row < len(self._titles):
+            self._present[row] = False
+            self._titles[row] = ""
+    
+    def filter(
+        self,
+        document_ids: Iterable[str],
+        created_after: Optional[datetime] = None,
+        created_before: Optional[datetime] = None,
+        min_word_count: Optional[int] = None,
+        max_word_count: Optional[int] = None,
+        min_size: Optional[int] = None,
+        max_size: Optional[int] = None,
+        title_prefix: Optional[str] = None
+    ) -> List[str]:
+        """
+        Keep the documents whose metadata matches every given condition.
+        
+        Bounds are inclusive; documents without metadata are left out.
+        
+        Args:
+            document_ids: Candidate document IDs (e.g. the matches of a search)
+            created_after: Earliest creation date
+            created_before: Latest creation date
+            min_word_count: Minimum number of words
+            max_word_count: Maximum number of words
+            min_size: Minimum file size in bytes
+            max_size: Maximum file size in bytes
+            title_prefix: Case-insensitive prefix of the title
+        
+        Returns:
+            Matching document IDs
+        """
+        if self._present is None:
+            return []
+        np = _numpy()
+        get_id = self.documents.get_id
+        capacity = len(self._titles)
+        rows = np.fromiter(
+            (row for row in map(get_id, document_ids) if row is not None and row < capacity),
+            dtype=np.int64
+        )
+        mask = self._present[rows]
+        if created_after is not None:
+            mask &= self._created_at[rows] >= _timestamp(created_after)
+        if created_before is not None:
+            mask &= self._created_at[rows] <= _timestamp(created_before)
+        if min_word_count is not None:
+            mask &= self._word_count[rows] >= min_word_count
+        if max_word_count is not None:
+            mask &= self._word_count[rows] <= max_word_count
+        if min_size is not None:
+            mask &= self._size[rows] >= min_size
+        if max_size is not None:
+            mask &= self._size[rows] <= max_size
+        matches = rows[mask].tolist()
+        if title_prefix:
+            # El título se compara al final, solo para las filas que quedan
+            prefix = title_prefix.lower()
+            titles = self._titles
+            matches = [row for row in matches if titles[row].startswith(prefix)]
+        return self.documents.terms(matches)
@@ -3,17 +3,40 @@ Inverted index implementation using PATRICIA Tree (Radix Tree).
 """
 from typing import List, Set, Dict, Optional
 from datetime import datetime
-try:
-    from patricia import trie
-except ImportError:
-    # Fallback: use a simple dict-based implementation if patricia-trie is not available
-    class trie(dict):
-        """Simple dict-based trie fallback."""
-        def iter(self, prefix: str):
-            """Iterate over keys starting with prefix."""
-            return [k for k in self.keys() if k.startswith(prefix)]
+from app.modules.fuzzy import levenshtein_row
 from app.modules.inverted_index import InvertedIndex
-from app.utils.text_processor import tokenize
+from app.modules.term_dictionary import TermDictionary
+from app.modules.term_pattern import TermPattern
+
+
+class _FallbackTrie(dict):
+    """Simple dict-based trie fallback."""
+    def iter(self, prefix: str):
+        """Iterate over keys starting with prefix."""
+        return [k for k in self.keys() if k.startswith(prefix)]
+
+
+_trie_class = None
+
+
+def _get_trie_class():
+    """
+    Resolve the trie implementation on first use.
+    
+    The patricia-trie library is only imported when a PATRICIA index is
+    instantiated, so importing this module stays cheap.
+    
+    Returns:
+        trie class from patricia-trie, or the fallback if it is not installed
+    """
+    global _trie_class
+    if _trie_class is None:
+        try:
+            from patricia import trie
+            _trie_class = trie
+        except ImportError:
+            _trie_class = _FallbackTrie
+    return _trie_class
 
 
 class PatriciaTreeIndex(InvertedIndex):
@@ -24,39 +47,28 @@ class PatriciaTreeIndex(InvertedIndex):
     with single children. It's efficient for storing and searching words.
     """
     
-    def __init__(self):
-        """Initialize the PATRICIA Tree index."""
-        super().__init__()
-        self.patricia_tree = trie()
-        self.created_at = datetime.now()
-    
-    def add_word(self, word: str, document_id: str) -> None:
+    def __init__(self, terms: Optional[TermDictionary] = None, posting_format: Optional[str] = None):
         """
-        Add a word to the index for a specific document.
-        Override to also update PATRICIA tree structure.
+        Initialize the PATRICIA Tree index.
         
         Args:
-            word: Word to add
-            document_id: Document identifier
+            terms: Term dictionary to use (the shared one by default)
+            posting_format: How postings are combined ('set' or 'bitmap')
         """
-        word_lower = word.lower()
-        
-        # Call parent method to add word to base index
-        super().add_word(word_lower, document_id)
-        
-        # Add word to PATRICIA tree
-        # Store document IDs as the value in the tree
-        if word_lower in self.patricia_tree:
-            # Word exists, add document to existing set
-            existing_docs = self.patricia_tree[word_lower]
-            if isinstance(existing_docs, set):
-                existing_docs.add(document_id)
-            else:
-                # Convert to set if it's not already
-                self.patricia_tree[word_lower] = {document_id}
-        else:
-            # New word
-            self.patricia_tree[word_lower] = {document_id}
+        super().__init__(terms, posting_format)
+        # Cada palabra del árbol guarda su term ID; los documentos están en las postings
+        self.patricia_tree = _get_trie_class()()
+        # Palabras invertidas, para buscar por sufijo; se construye al primer uso
+        self._reversed_tree = None
+        self.created_at = datetime.now()
+    
+    def _add_posting(self, term_id: int, document_id: str) -> bool:
+        """Record a posting, adding new words to the PATRICIA tree."""
+        is_new_term = super()._add_posting(term_id, document_id)
+        if is_new_term:
+            self.patricia_tree[self.terms.term(term_id)] = term_id
+            self._reversed_tree = None
+        return is_new_term
     
     def add_document(self, document_id: str, words: List[str]) -> None:
         """
@@ -66,14 +78,13 @@ class PatriciaTreeIndex(InvertedIndex):
             document_id: Unique identifier for the document
             words: List of words/tokens from the document
         """
-        # Add words to the base inverted index
+        intern = self.terms.intern
         for word in words:
-            word_lower = word.lower()
-            self.add_word(word_lower, document_id)
+            self._add_posting(intern(word.lower()), document_id)
     
-    def search(self, query: str) -> List[str]:
+    def _match_terms(self, query: str) -> Set[int]:
         """
-        Search for documents containing the query.
+        Find the words starting with the query.
         
         PATRICIA Tree supports prefix matching, so we can find all words
         that start with the query.
@@ -82,33 +93,87 @@ class PatriciaTreeIndex(InvertedIndex):
             query: Search query (word or prefix)
             
         Returns:
-            List of document IDs that match the query
+            Set of term IDs that match the query
         """
-        query_lower = query.lower()
-        matching_documents: Set[str] = set()
+        # Prefix matching - find all words that start with the query
+        # (the exact match is one of them)
+        get_id = self.terms.get_id
+        return {get_id(key) for key in self.get_prefix_matches(query.lower())}
+    
+    def fuzzy_terms(self, query: str, max_distance: int) -> Set[int]:
+        """
+        Find the words within an edit distance of the query.
         
-        # Exact match
-        if query_lower in self.patricia_tree:
-            docs = self.patricia_tree[query_lower]
-            if isinstance(docs, set):
-                matching_documents.update(docs)
-            else:
-                matching_documents.add(docs)
+        Walks the PATRICIA tree carrying one row of the Levenshtein table
+        per character read, so words sharing a prefix share the work, and
+        skips every subtree whose row is already above ``max_distance``.
         
-        # Prefix matching - find all words that start with the query
-        try:
-            # Get all keys that start with the query
-            prefix_matches = list(self.patricia_tree.iter(query_lower))
-            for key in prefix_matches:
-                if key in self.word_to_documents:
-                    matching_documents.update(self.word_to_documents[key])
-        except Exception:
-            # If prefix search fails, try manual matching
-            for word in self.word_to_documents.keys():
-                if word.startswith(query_lower):
-                    matching_documents.update(self.word_to_documents[word])
+        Args:
+            query: Normalized query
+            max_distance: Maximum edit distance (insertions, deletions, substitutions)
+        
+        Returns:
+            Set of term IDs
+        """
+        query = query.lower()
+        root = self.patricia_tree
+        if not hasattr(root, "_edges"):
+            # Sin la librería patricia-trie no hay árbol que recorrer
+            return super().fuzzy_terms(query, max_distance)
+        
+        matches: Set[int] = set()
+        stack = [(root, list(range(len(query) + 1)))]
+        while stack:
+            node, row = stack.pop()
+            # Los nodos intermedios y las palabras borradas no guardan un term ID
+            if row[-1] <= max_distance and isinstance(node._value, int):
+                matches.add(node._value)
+            for edge, child in node._edges.values():
+                child_row = row
+                for char in edge:
+                    child_row = levenshtein_row(child_row, char, query)
+                    if min(child_row) > max_distance:
+                        break
+                else:
+                    stack.append((child, child_row))
+        return matches
+    
+    def pattern_terms(self, pattern: TermPattern) -> Set[int]:
+        """
+        Find the words that match a wildcard or regex pattern.
+        
+        The literal prefix of the pattern is looked up in the PATRICIA
+        tree and its literal suffix in a tree of the reversed words; the
+        candidates of both are intersected and then checked against the
+        whole pattern. Patterns without a literal prefix or suffix (e.g.
+        ``*fi*``) check every word.
+        
+        Args:
+            pattern: Parsed pattern
         
-        return list(matching_documents)
+        Returns:
+            Set of term IDs
+        """
+        candidates: Optional[Set[str]] = None
+        if pattern.prefix:
+            candidates = set(self.get_prefix_matches(pattern.prefix))
+        if pattern.suffix and (candidates is None or candidates):
+            ending = {key[::-1] for key in self._get_reversed_tree().iter(pattern.suffix[::-1])}
+            candidates = ending if candidates is None else candidates & ending
+        if candidates is None:
+            return super().pattern_terms(pattern)
+        get_id = self.terms.get_id
+        return {get_id(word) for word in candidates if pattern.matches(word)}
+    
+    def _get_reversed_tree(self):
+        """Get the tree of reversed words, building it on first use."""
+        if self._reversed_tree is None:
+            tree = _get_trie_class()()
+            term = self.terms.term
+            for term_id in self.postings:
+                tree[term(term_id)[::-1]] = term_id
+            self._reversed_tree = tree
+        return self._reversed_tree
     
     def remove_word(self, word: str) -> bool:
         """
@@ -127,65 +192,62 @@ class PatriciaTreeIndex(InvertedIndex):
             # Remove from PATRICIA tree
             if word_lower in self.patricia_tree:
                 del self.patricia_tree[word_lower]
+            self._reversed_tree = None
         
         return result
     
-    def to_dict(self) -> Dict:
+    def _on_word_removed(self, term_id: int) -> None:
+        """Remove a word without documents from the PATRICIA tree."""
+        word = self.terms.term(term_id)
+        if word in self.patricia_tree:
+            del self.patricia_tree[word]
+        self._reversed_tree = None
+    
+    def to_dict(self, portable: bool = False) -> Dict:
         """
         Serialize index to dictionary for persistence.
         
+        The PATRICIA tree is not saved: it holds the same words as the
+        postings and is rebuilt from them on load.
+        
+        Args:
+            portable: Embed the term dictionary (see ``InvertedIndex._postings_to_dict``)
+        
         Returns:
             Dictionary with serializable index data
         """
-        # Convert patricia_tree to dict (convert sets to lists)
-        patricia_tree_dict = {}
-        for key, value in self.patricia_tree.items():
-            if isinstance(value, set):
-                patricia_tree_dict[key] = list(value)
-            else:
-                patricia_tree_dict[key] = value
-        
-        return {
-            "word_to_documents": {
-                word: list(docs) for word, docs in self.word_to_documents.items()
-            },
-            "document_to_words": {
-                doc_id: list(words) for doc_id, words in self.document_to_words.items()
-            },
-            "patricia_tree": patricia_tree_dict,
-            "created_at": self.created_at.isoformat() if self.created_at else None,
-        }
+        data = self._postings_to_dict(portable)
+        data["created_at"] = self.created_at.isoformat() if self.created_at else None
+        return data
     
     @classmethod
-    def from_dict(cls, data: Dict) -> "PatriciaTreeIndex":
+    def from_dict(
+        cls,
+        data: Dict,
+        terms: Optional[List[str]] = None,
+        posting_format: Optional[str] = None
+    ) -> "PatriciaTreeIndex":
         """
         Reconstruct index from dictionary.
         
         Args:
             data: Dictionary with index data
+            terms: Saved term dictionary the term IDs in ``data`` refer to
+            posting_format: Posting format to load into (by default the one
+                saved in ``data``, or ``POSTING_FORMAT``)
             
         Returns:
             Reconstructed PatriciaTreeIndex instance
         """
-        index = cls()
+        index = cls(posting_format=posting_format or data.get("posting_format"))
         
-        # Restore word_to_documents (convert lists back to sets)
-        index.word_to_documents = {
-            word: set(docs) for word, docs in data.get("word_to_documents", {}).items()
-        }
-        
-        # Restore document_to_words (convert lists back to sets)
-        index.document_to_words = {
-            doc_id: set(words) for doc_id, words in data.get("document_to_words", {}).items()
-        }
+        # Restore postings, forward lists and document versions
+        index._restore_postings(data, terms)
         
-        # Restore patricia_tree (convert lists back to sets)
-        patricia_tree_data = data.get("patricia_tree", {})
-        for key, value in patricia_tree_data.items():
-            if isinstance(value, list):
-                index.patricia_tree[key] = set(value)
-            else:
-                index.patricia_tree[key] = value
+        # Rebuild patricia_tree from the restored words
+        term = index.terms.term
+        for term_id in index.postings:
+            index.patricia_tree[term(term_id)] = term_id
         
         # Restore created_at
         if data.get("created_at"):
@@ -0,0 +1,95 @@
+"""
+Choice of the index structure that answers a query at the lowest cost.
+"""
+from dataclasses import dataclass
+from typing import Collection, FrozenSet, Optional, Tuple
+
+from app.core.config import settings
+from app.modules.term_pattern import SYNTAX_REGEX, SYNTAX_WILDCARD, TermPattern, parse_pattern
+
+# Tipos de consulta
+QUERY_EXACT = "exact"  # Palabra completa: búsqueda en el diccionario de términos
+QUERY_PREFIX = "prefix"  # pre*
+QUERY_SUFFIX = "suffix"  # *fix, o pre*fix
+QUERY_INFIX = "infix"  # *fi* (solo literales intermedios)
+QUERY_SCAN = "scan"  # Sin literales (p. ej. '*' o '.+'): se revisan todas las palabras
+QUERY_FUZZY = "fuzzy"
+
+_SUFFIX = settings.INDEX_TYPE_SUFFIX
+_PATRICIA = settings.INDEX_TYPE_PATRICIA
+
+# Índices que resuelven cada tipo de consulta al menor costo
+_CHEAPEST = {
+    QUERY_EXACT: frozenset({_PATRICIA, _SUFFIX}),
+    QUERY_PREFIX: frozenset({_PATRICIA}),
+    QUERY_SUFFIX: frozenset({_PATRICIA}),  # árbol de palabras invertidas
+    QUERY_INFIX: frozenset({_SUFFIX}),
+    QUERY_SCAN: frozenset({_PATRICIA, _SUFFIX}),
+    QUERY_FUZZY: frozenset({_PATRICIA}),  # recorrido del árbol con Levenshtein
+}
+
+
+@dataclass(frozen=True)
+class QueryPlan:
+    """How a query is answered."""
+    kind: str  # Tipo de consulta (QUERY_*)
+    index_type: str  # Índice elegido
+    fallback: bool  # Si el índice más barato no está construido y se usa otro
+    pattern: Optional[TermPattern] = None  # Patrón de palabras (ni exact ni fuzzy)
+
+
+def classify_query(term: str, mode: str) -> Tuple[str, Optional[TermPattern]]:
+    """
+    Classify a normalized query by the structure that can answer it.
+    
+    In default and wildcard modes ``*`` and ``?`` are wildcards, so a plain
+    word is an exact lookup and ``pre*`` a prefix query.
+    
+    Args:
+        term: Normalized query
+        mode: Search mode ('default', 'fuzzy', 'wildcard' or 'regex')
+    
+    Returns:
+        Query kind and the parsed pattern (None for exact and fuzzy queries)
+    
+    Raises:
+        ValueError: If the query is not a valid pattern
+    """
+    if mode == QUERY_FUZZY:
+        return QUERY_FUZZY, None
+    pattern = parse_pattern(term, SYNTAX_REGEX if mode == SYNTAX_REGEX else SYNTAX_WILDCARD)
+    if pattern.prefix == term:
+        return QUERY_EXACT, None
+    if pattern.suffix:
+        return QUERY_SUFFIX, pattern
+    if pattern.prefix:
+        return QUERY_PREFIX, pattern
+    if pattern.infixes:
+        return QUERY_INFIX, pattern
+    return QUERY_SCAN, pattern
+
+
+def plan_query(term: str, mode: str, available: Collection[str]) -> Optional[QueryPlan]:
+    """
+    Choose the index for a query among the ones that are built.
+    
+    Args:
+        term: Normalized query
+        mode: Search mode ('default', 'fuzzy', 'wildcard' or 'regex')
+        available: Types of the indexes that are built
+    
+    Returns:
+        The plan, or None if no index is built
+    
+    Raises:
+        ValueError: If the query is not a valid pattern
+    """
+    kind, pattern = classify_query(term, mode)
+    cheapest: FrozenSet[str] = _CHEAPEST[kind]
+    for index_type in (_PATRICIA, _SUFFIX):
+        if index_type in cheapest and index_type in available:
+            return QueryPlan(kind, index_type, False, pattern)
+    for index_type in (_PATRICIA, _SUFFIX):
+        if index_type in available:
+            return QueryPlan(kind, index_type, True, pattern)
+    return None
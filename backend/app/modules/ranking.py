@@ -0,0 +1,105 @@
+"""
+Scoring of search results.
+"""
+import heapq
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+# (ID de documento, palabras que coinciden, relevancia)
+RankedDocument = Tuple[str, List[str], float]
+
+# Palabras que coinciden devueltas por documento
+MAX_MATCHES = 10
+
+
+class DocumentTermsCache:
+    """
+    Term IDs of each document of an index, read once for several rankings.
+    
+    Used when many queries are ranked on the same snapshot, where the same
+    documents tend to match more than one of them.
+    """
+    
+    def __init__(self, index):
+        """
+        Initialize the cache.
+        
+        Args:
+            index: Index to read (anything with ``terms`` and ``get_term_ids_for_document``)
+        """
+        self._index = index
+        self.terms = index.terms
+        self._term_ids: Dict[str, Set[int]] = {}
+    
+    def get_term_ids_for_document(self, document_id: str) -> Set[int]:
+        term_ids = self._term_ids.get(document_id)
+        if term_ids is None:
+            term_ids = self._term_ids[document_id] = self._index.get_term_ids_for_document(document_id)
+        return term_ids
+
+
+def rank_documents(
+    index,
+    term: str,
+    document_ids: Iterable[str],
+    limit: Optional[int] = None,
+    is_match: Optional[Callable[[str], bool]] = None
+) -> List[RankedDocument]:
+    """
+    Score the documents that matched a query and keep the best ones.
+    
+    The relevance of a document is the fraction of its words that match
+    the query. Every match is scored, so the results are the true top
+    ``limit`` (and the top results of several shards can be merged), but
+    scoring only touches term IDs: each distinct word is checked against
+    the query once, and words are only looked up for the results kept.
+    
+    Args:
+        index: Index the documents were found in (anything with ``terms``
+            and ``get_term_ids_for_document``)
+        term: Normalized query
+        document_ids: Documents that matched
+        limit: Maximum number of results, or None for all of them
+        is_match: Which words of a document match the query; by default,
+            those that contain it
+    
+    Returns:
+        Ranked documents, best first (ties by document ID)
+    """
+    if is_match is None:
+        is_match = lambda word: term in word
+    terms = index.terms
+    # Resultado de is_match por term ID: cada palabra se evalúa una sola vez
+    matched: Dict[int, bool] = {}
+    
+    def matches(term_id: int) -> bool:
+        result = matched.get(term_id)
+        if result is None:
+            result = matched[term_id] = is_match(terms.term(term_id))
+        return result
+    
+    scored = []
+    for doc_id in document_ids:
+        term_ids = index.get_term_ids_for_document(doc_id)
+        matching_ids = [term_id for term_id in term_ids if matches(term_id)]
+        scored.append((doc_id, matching_ids, len(matching_ids) / max(len(term_ids), 1)))
+    return [
+        (doc_id, sorted(terms.terms(matching_ids))[:MAX_MATCHES], relevance)
+        for doc_id, matching_ids, relevance in top_ranked(scored, limit)
+    ]
+
+
+def top_ranked(ranked: Iterable[RankedDocument], limit: Optional[int] = None) -> List[RankedDocument]:
+    """
+    Keep the best ranked documents.
+    
+    Args:
+        ranked: Ranked documents, in any order
+        limit: Maximum number of results, or None for all of them
+    
+    Returns:
+        Ranked documents, best first (ties by document ID)
+    """
+    key = lambda item: (-item[2], item[0])
+    if limit is None:
+        return sorted(ranked, key=key)
+    return heapq.nsmallest(limit, ranked, key=key)
@@ -0,0 +1,983 @@
+"""
+Segmented (LSM-style) index built from immutable index segments.
+"""
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, FrozenSet, Iterable, Iterator, List, Optional, Set, Tuple, Type
+
+from app.core.config import settings
+from app.modules.inverted_index import ALL_DOCUMENTS, InvertedIndex
+from app.modules.term_dictionary import TermDictionary
+from app.modules.term_pattern import TermPattern
+from app.utils.persistence import ensure_directory, load_index_json, save_index_json
+
+MANIFEST_FILE = "manifest.json"
+MEMTABLE_FILE = "memtable.json"
+
+
+@dataclass(frozen=True, eq=False)
+class Segment:
+    """An immutable index segment and the documents deleted from it."""
+    name: str
+    index: InvertedIndex
+    # Tombstones: documentos borrados del segmento sin reescribirlo
+    deleted: FrozenSet[str] = field(default_factory=frozenset)
+    
+    @property
+    def document_count(self) -> int:
+        """Number of documents stored in the segment, deleted ones included."""
+        return len(self.index.forward)
+    
+    @property
+    def live_count(self) -> int:
+        """Number of documents of the segment that are not deleted."""
+        return len(self.index.forward) - len(self.deleted)
+    
+    def with_deleted(self, document_ids: Iterable[str]) -> "Segment":
+        """Copy of the segment with more tombstones (the index itself is shared)."""
+        return Segment(self.name, self.index, self.deleted | frozenset(document_ids))
+
+
+@dataclass(frozen=True, eq=False)
+class IndexSnapshot:
+    """
+    Consistent, immutable view of a segmented index.
+    
+    Writers never modify the segments or the memtable of a published
+    snapshot, so a reader can keep using one for as long as it needs while
+    newer versions are published.
+    """
+    segments: Tuple[Segment, ...]
+    memtable: InvertedIndex
+    version: int = 0
+    
+    @property
+    def terms(self) -> TermDictionary:
+        """Term dictionary of the term IDs of every segment."""
+        return self.memtable.terms
+    
+    def _live_indexes(self) -> List[Tuple[InvertedIndex, FrozenSet[str]]]:
+        """Pairs of (index, deleted documents) for the memtable and every segment."""
+        return [(self.memtable, frozenset())] + [
+            (segment.index, segment.deleted) for segment in self.segments
+        ]
+    
+    def resolve_documents(self, documents: Set[str]) -> Set[str]:
+        """
+        Replace the ``ALL_DOCUMENTS`` marker with the documents of every segment.
+        
+        Args:
+            documents: Document IDs from the postings
+        
+        Returns:
+            Set of document IDs
+        """
+        if ALL_DOCUMENTS in documents:
+            return self.document_ids()
+        return documents
+    
+    def _collect(self, match: Callable[[InvertedIndex], Set[str]]) -> List[str]:
+        """Run a match on every segment and merge the live documents found."""
+        matching_documents: Set[str] = set()
+        for index, deleted in self._live_indexes():
+            # Sin resolver ALL_DOCUMENTS: una palabra global vale para los documentos de todos los segmentos
+            results = match(index)
+            if deleted:
+                matching_documents.update(doc_id for doc_id in results if doc_id not in deleted)
+            else:
+                matching_documents.update(results)
+        return list(self.resolve_documents(matching_documents))
+    
+    def search(self, query: str) -> List[str]:
+        """
+        Search every segment and merge the results.
+        
+        Args:
+            query: Search query
+        
+        Returns:
+            List of document IDs that match the query
+        """
+        return self._collect(lambda index: index._match(query))
+    
+    def search_words(self, words: Iterable[str]) -> List[str]:
+        """
+        Find the documents that contain any of several exact words.
+        
+        Args:
+            words: Normalized words
+        
+        Returns:
+            List of document IDs
+        """
+        words = list(words)
+        return self._collect(lambda index: index._match_words(words))
+    
+    def _estimate(self, match_terms: Callable[[InvertedIndex], Set[Optional[int]]]) -> Tuple[float, bool]:
+        """Add up the estimated live documents matched in every segment."""
+        total = 0.0
+        estimated = False
+        for index, deleted in self._live_indexes():
+            term_ids = match_terms(index)
+            if not term_ids.isdisjoint(index.global_term_ids()):
+                # Una palabra global coincide con todos los documentos
+                return float(len(self.document_ids())), False
+            if deleted:
+                # Con documentos borrados, el conteo exacto necesita las postings
+                documents = index._union_postings(term_ids)
+                total += len(documents) - len(deleted.intersection(documents))
+                continue
+            count, is_estimate = index.estimate_documents(term_ids)
+            total += count
+            estimated = estimated or is_estimate
+        return total, estimated
+    
+    def estimate(self, query: str) -> Tuple[float, bool]:
+        """
+        Estimate the number of documents that match a query, without collecting them.
+        
+        Args:
+            query: Search query
+        
+        Returns:
+            Number of documents, and whether it is an estimate
+        """
+        return self._estimate(lambda index: index._match_terms(query))
+    
+    def estimate_words(self, words: Iterable[str]) -> Tuple[float, bool]:
+        """
+        Estimate the number of documents that contain any of several exact words.
+        
+        Args:
+            words: Normalized words
+        
+        Returns:
+            Number of documents, and whether it is an estimate
+        """
+        words = list(words)
+        return self._estimate(lambda index: set(map(index.terms.get_id, words)))
+    
+    def fuzzy_terms(self, query: str, max_distance: int) -> Set[str]:
+        """
+        Find the words of any segment within an edit distance of the query.
+        
+        Args:
+            query: Normalized query
+            max_distance: Maximum edit distance
+        
+        Returns:
+            Set of words
+        """
+        term_ids: Set[int] = set()
+        for index, _ in self._live_indexes():
+            term_ids |= index.fuzzy_terms(query, max_distance)
+        return set(self.memtable.terms.terms(term_ids))
+    
+    def pattern_terms(self, pattern: TermPattern) -> Set[str]:
+        """
+        Find the words of any segment that match a wildcard or regex pattern.
+        
+        Args:
+            pattern: Parsed pattern
+        
+        Returns:
+            Set of words
+        """
+        term_ids: Set[int] = set()
+        for index, _ in self._live_indexes():
+            term_ids |= index.pattern_terms(pattern)
+        return set(self.memtable.terms.terms(term_ids))
+    
+    def document_ids(self) -> Set[str]:
+        """
+        Get the IDs of the indexed documents.
+        
+        Returns:
+            Set of document IDs
+        """
+        document_ids: Set[str] = set()
+        for index, deleted in self._live_indexes():
+            document_ids.update(doc_id for doc_id in index.forward if doc_id not in deleted)
+        document_ids.discard(ALL_DOCUMENTS)
+        return document_ids
+    
+    def get_words_for_document(self, document_id: str) -> Set[str]:
+        """
+        Get all words in a specific document.
+        
+        Args:
+            document_id: Document identifier
+        
+        Returns:
+            Set of words in the document
+        """
+        return set(self.terms.terms(self.get_term_ids_for_document(document_id)))
+    
+    def get_term_ids_for_document(self, document_id: str) -> Set[int]:
+        """
+        Get the term IDs of the words in a specific document.
+        
+        Args:
+            document_id: Document identifier
+        
+        Returns:
+            Set of term IDs
+        """
+        if document_id == ALL_DOCUMENTS:
+            return set()
+        term_ids: Set[int] = set()
+        indexed = False
+        for index, deleted in self._live_indexes():
+            if document_id in index.forward and document_id not in deleted:
+                term_ids.update(index.forward[document_id])
+                indexed = True
+        if not indexed:
+            return set()
+        for index, _ in self._live_indexes():
+            term_ids.update(index.global_term_ids())
+        return term_ids
+    
+    def get_documents_for_word(self, word: str) -> Set[str]:
+        """
+        Get all documents containing a specific word.
+        
+        Args:
+            word: Word to search for
+        
+        Returns:
+            Set of document IDs containing the word
+        """
+        documents: Set[str] = set()
+        for index, deleted in self._live_indexes():
+            documents.update(index._postings_for_word(word) - deleted)
+        return self.resolve_documents(documents)
+    
+    def live_postings(self) -> Dict[int, Set[str]]:
+        """Merge the postings of all segments, leaving out deleted documents."""
+        postings: Dict[int, Set[str]] = {}
+        for index, deleted in self._live_indexes():
+            for term_id, documents in index.postings.items():
+                live = documents - deleted if deleted else documents
+                if live:
+                    postings.setdefault(term_id, set()).update(live)
+        return postings
+
+
+class _Draft:
+    """Pending changes of a write, published together as the next snapshot."""
+    
+    def __init__(self, index: "SegmentedIndex", snapshot: IndexSnapshot):
+        self.index = index
+        self.segments: List[Segment] = list(snapshot.segments)
+        self.memtable = snapshot.memtable
+        self._memtable_copied = False
+    
+    def writable_memtable(self) -> InvertedIndex:
+        """Get a memtable that can be modified, copying the published one on first use."""
+        if not self._memtable_copied:
+            copy = self.index.new_index()
+            copy.merge(self.memtable)
+            self.memtable = copy
+            self._memtable_copied = True
+        return self.memtable
+    
+    def delete(self, document_ids: Iterable[str]) -> Set[str]:
+        """Tombstone documents in the segments and drop them from the memtable."""
+        document_ids = set(document_ids)
+        removed: Set[str] = set()
+        for i, segment in enumerate(self.segments):
+            hits = {
+                doc_id for doc_id in document_ids
+                if doc_id in segment.index.forward and doc_id not in segment.deleted
+            }
+            if hits:
+                self.segments[i] = segment.with_deleted(hits)
+                removed |= hits
+        in_memtable = [doc_id for doc_id in document_ids if doc_id in self.memtable.forward]
+        if in_memtable:
+            self.writable_memtable().remove_documents(in_memtable)
+            removed.update(in_memtable)
+        return removed
+    
+    def flush(self) -> bool:
+        """Turn the memtable into an immutable segment."""
+        if not self.memtable.forward:
+            return False
+        self.segments.append(Segment(self.index.new_segment_name(), self.memtable))
+        self.memtable = self.index.new_index()
+        self._memtable_copied = True
+        return True
+
+
+class SegmentedIndex:
+    """
+    Index made of immutable segments plus a small mutable one.
+    
+    New documents go to the in-memory segment (the memtable), which becomes
+    an immutable segment once it holds ``flush_threshold`` documents.
+    Searches fan out across all segments and merge their results. Deleting a
+    document only records a tombstone in the segments that contain it, and
+    ``compact`` merges segments of the same size tier, dropping deleted
+    documents. Saving only writes the segments created since the last save,
+    the memtable and the manifest.
+    
+    Reads never take a lock: they run on an immutable ``IndexSnapshot``.
+    Writers are serialized, work copy-on-write on a draft of the current
+    snapshot (the memtable is copied on its first change, segments get new
+    tombstone sets) and publish the draft as the next version. ``batch``
+    groups several writes into a single version.
+    
+    Every segment is an instance of ``segment_class`` (``SuffixTreeIndex``
+    or ``PatriciaTreeIndex``), so both index types share this layout.
+    """
+    
+    def __init__(
+        self,
+        segment_class: Type[InvertedIndex],
+        flush_threshold: Optional[int] = None,
+        merge_factor: Optional[int] = None,
+        first_segment: int = 0,
+        posting_format: Optional[str] = None
+    ):
+        """
+        Initialize an empty segmented index.
+        
+        Args:
+            segment_class: Index class used for every segment
+            flush_threshold: Documents in the memtable before it is flushed
+            merge_factor: Segments of one size tier merged together
+            first_segment: Number of the first segment (to avoid reusing the
+                file names of an index being replaced in the same directory)
+            posting_format: How the segments combine postings ('set' or 'bitmap')
+        """
+        self.segment_class = segment_class
+        self.posting_format = posting_format or settings.POSTING_FORMAT
+        self.flush_threshold = flush_threshold or settings.SEGMENT_FLUSH_DOCUMENTS
+        self.merge_factor = max(merge_factor or settings.SEGMENT_MERGE_FACTOR, 2)
+        self.document_versions: Dict[str, str] = {}
+        self.created_at = datetime.now()
+        self.next_segment = first_segment
+        self._snapshot = IndexSnapshot((), self.new_index())
+        # Nombres de los segmentos ya escritos en disco (un segmento no cambia sin cambiar de nombre)
+        self._persisted: Set[str] = set()
+        # Serializa a los escritores, incluida la compactación en segundo plano
+        self._lock = threading.RLock()
+        self._draft: Optional[_Draft] = None
+    
+    @classmethod
+    def from_index(cls, index: InvertedIndex) -> "SegmentedIndex":
+        """
+        Wrap an existing index as the single segment of a segmented index.
+        
+        Args:
+            index: Index to wrap (it must not be modified afterwards)
+        
+        Returns:
+            Segmented index
+        """
+        segmented = cls(type(index), posting_format=index.posting_format)
+        segmented.document_versions = dict(index.document_versions)
+        index.document_versions = {}
+        if index.created_at:
+            segmented.created_at = index.created_at
+        if index.forward:
+            segmented.add_segment(index)
+        return segmented
+    
+    # Snapshots
+    
+    def snapshot(self) -> IndexSnapshot:
+        """
+        Get the current version of the index.
+        
+        Returns:
+            Immutable view that later writes do not change
+        """
+        return self._snapshot
+    
+    @property
+    def version(self) -> int:
+        """Number of the current version."""
+        return self._snapshot.version
+    
+    @property
+    def segments(self) -> List[Segment]:
+        """Immutable segments of the current version."""
+        return list(self._snapshot.segments)
+    
+    @property
+    def memtable(self) -> InvertedIndex:
+        """Memtable of the current version (it must not be modified)."""
+        return self._snapshot.memtable
+    
+    @contextmanager
+    def _writing(self) -> Iterator[_Draft]:
+        """Give a draft to apply changes to, and publish it afterwards."""
+        with self._lock:
+            if self._draft is not None:
+                # Escritura dentro de un lote: se publica al cerrar el lote
+                yield self._draft
+                return
+            draft = self._draft = _Draft(self, self._snapshot)
+            try:
+                yield draft
+            finally:
+                self._draft = None
+            self._snapshot = IndexSnapshot(
+                tuple(draft.segments), draft.memtable, self._snapshot.version + 1
+            )
+    
+    @contextmanager
+    def batch(self) -> Iterator["SegmentedIndex"]:
+        """
+        Group several writes into a single new version.
+        
+        Readers see the previous version until the block ends; if the block
+        raises, none of its changes are published.
+        """
+        with self._writing():
+            yield self
+    
+    def new_index(self) -> InvertedIndex:
+        """Create an empty index for a segment or the memtable."""
+        return self.segment_class(posting_format=self.posting_format)
+    
+    def new_segment_name(self) -> str:
+        """Reserve the name of a new segment."""
+        with self._lock:
+            name = f"segment_{self.next_segment:06d}"
+            self.next_segment += 1
+            return name
+    
+    def add_segment(self, index: InvertedIndex, name: Optional[str] = None, persisted: bool = False) -> None:
+        """
+        Add an already built index as an immutable segment.
+        
+        Args:
+            index: Segment contents (it must not be modified afterwards)
+            name: Name reserved with ``new_segment_name``, or None for a new one
+            persisted: Whether the segment file is already on disk
+        """
+        with self._writing() as draft:
+            segment = Segment(name or self.new_segment_name(), index)
+            draft.segments.append(segment)
+            if persisted:
+                self._persisted.add(segment.name)
+    
+    # Writes
+    
+    def add_document(self, document_id: str, words: List[str]) -> None:
+        """
+        Add a document to the index.
+        
+        Args:
+            document_id: Unique identifier for the document
+            words: List of words/tokens from the document
+        """
+        self.add_documents({document_id: words})
+    
+    def add_documents(self, documents: Dict[str, List[str]]) -> None:
+        """
+        Add several documents.
+        
+        A batch at least as large as the flush threshold becomes a segment
+        on its own; smaller batches go to the memtable.
+        
+        Args:
+            documents: Mapping of document ID to its list of words/tokens
+        """
+        if not documents:
+            return
+        with self._writing() as draft:
+            # Un documento vive en un solo segmento: las copias anteriores se marcan borradas
+            draft.delete(documents)
+            if len(documents) >= self.flush_threshold:
+                segment = self.new_index()
+                segment.add_documents(documents)
+                draft.segments.append(Segment(self.new_segment_name(), segment))
+                return
+            draft.writable_memtable().add_documents(documents)
+            if len(draft.memtable.forward) >= self.flush_threshold:
+                draft.flush()
+    
+    def add_word(self, word: str, document_id: str) -> None:
+        """
+        Add a word to the index for a specific document.
+        
+        Args:
+            word: Word to add
+            document_id: Document identifier
+        """
+        with self._writing() as draft:
+            draft.writable_memtable().add_word(word, document_id)
+    
+    def add_words(self, words: Dict[str, Iterable[str]]) -> None:
+        """
+        Add several words, each to a set of documents, in a single memtable update.
+        
+        Args:
+            words: Mapping of word to the IDs of the documents that get it
+        """
+        with self._writing() as draft:
+            draft.writable_memtable().add_words(words)
+    
+    def flush(self) -> bool:
+        """
+        Turn the memtable into an immutable segment.
+        
+        Returns:
+            True if the memtable had documents
+        """
+        with self._writing() as draft:
+            return draft.flush()
+    
+    def remove_document(self, document_id: str) -> bool:
+        """
+        Remove a document from the index.
+        
+        Args:
+            document_id: Document identifier
+        
+        Returns:
+            True if the document was indexed, False otherwise
+        """
+        return self.remove_documents([document_id]) > 0
+    
+    def remove_documents(self, document_ids: Iterable[str]) -> int:
+        """
+        Remove several documents, recording tombstones in immutable segments.
+        
+        Args:
+            document_ids: Document identifiers
+        
+        Returns:
+            Number of documents that were indexed and got removed
+        """
+        document_ids = list(document_ids)
+        with self._writing() as draft:
+            removed = draft.delete(document_ids)
+            for document_id in document_ids:
+                self.document_versions.pop(document_id, None)
+            return len(removed)
+    
+    def remove_word(self, word: str) -> bool:
+        """
+        Remove a word from every segment.
+        
+        Args:
+            word: Word to remove
+        
+        Returns:
+            True if word was found and removed, False otherwise
+        """
+        return self.remove_words([word]) > 0
+    
+    def remove_words(self, words: Iterable[str]) -> int:
+        """
+        Remove several words from every segment.
+        
+        This is an administrative edit: each segment that contains any of
+        the words is copied once without them, under a new name, and written
+        on the next save.
+        
+        Args:
+            words: Words to remove
+        
+        Returns:
+            Number of words that were found and removed
+        """
+        words = list(words)
+        with self._writing() as draft:
+            found: Set[str] = set()
+            indexes = [draft.memtable] + [segment.index for segment in draft.segments]
+            hits = [[word for word in words if index._postings_for_word(word)] for index in indexes]
+            if hits[0]:
+                draft.writable_memtable().remove_words(hits[0])
+                found.update(hits[0])
+            for i, segment in enumerate(draft.segments):
+                segment_hits = hits[i + 1]
+                if not segment_hits:
+                    continue
+                copy = self.new_index()
+                copy.merge(segment.index)
+                copy.remove_words(segment_hits)
+                draft.segments[i] = Segment(self.new_segment_name(), copy, segment.deleted)
+                found.update(segment_hits)
+            return len(found)
+    
+    # Reads
+    
+    def search(self, query: str) -> List[str]:
+        """
+        Search every segment and merge the results.
+        
+        Args:
+            query: Search query
+        
+        Returns:
+            List of document IDs that match the query
+        """
+        return self._snapshot.search(query)
+    
+    def search_words(self, words: Iterable[str]) -> List[str]:
+        """
+        Find the documents that contain any of several exact words.
+        
+        Args:
+            words: Normalized words
+        
+        Returns:
+            List of document IDs
+        """
+        return self._snapshot.search_words(words)
+    
+    def fuzzy_terms(self, query: str, max_distance: int) -> Set[str]:
+        """
+        Find the words within an edit distance of the query.
+        
+        Args:
+            query: Normalized query
+            max_distance: Maximum edit distance
+        
+        Returns:
+            Set of words
+        """
+        return self._snapshot.fuzzy_terms(query, max_distance)
+    
+    def pattern_terms(self, pattern: TermPattern) -> Set[str]:
+        """
+        Find the words that match a wildcard or regex pattern.
+        
+        Args:
+            pattern: Parsed pattern
+        
+        Returns:
+            Set of words
+        """
+        return self._snapshot.pattern_terms(pattern)
+    
+    def estimate(self, query: str) -> Tuple[float, bool]:
+        """
+        Estimate the number of documents that match a query.
+        
+        Args:
+            query: Search query
+        
+        Returns:
+            Number of documents, and whether it is an estimate
+        """
+        return self._snapshot.estimate(query)
+    
+    def document_ids(self) -> Set[str]:
+        """
+        Get the IDs of the indexed documents.
+        
+        Returns:
+            Set of document IDs
+        """
+        return self._snapshot.document_ids()
+    
+    def get_words_for_document(self, document_id: str) -> Set[str]:
+        """
+        Get all words in a specific document.
+        
+        Args:
+            document_id: Document identifier
+        
+        Returns:
+            Set of words in the document
+        """
+        return self._snapshot.get_words_for_document(document_id)
+    
+    def get_term_ids_for_document(self, document_id: str) -> Set[int]:
+        """
+        Get the term IDs of the words in a specific document.
+        
+        Args:
+            document_id: Document identifier
+        
+        Returns:
+            Set of term IDs
+        """
+        return self._snapshot.get_term_ids_for_document(document_id)
+    
+    @property
+    def terms(self) -> TermDictionary:
+        """Term dictionary of the term IDs of every segment."""
+        return self._snapshot.terms
+    
+    def get_documents_for_word(self, word: str) -> Set[str]:
+        """
+        Get all documents containing a specific word.
+        
+        Args:
+            word: Word to search for
+        
+        Returns:
+            Set of document IDs containing the word
+        """
+        return self._snapshot.get_documents_for_word(word)
+    
+    def get_all_words(self) -> List[str]:
+        """
+        Get all words in the index.
+        
+        Returns:
+            List of all words
+        """
+        snapshot = self._snapshot
+        term = snapshot.memtable.terms.term
+        return sorted(term(term_id) for term_id in snapshot.live_postings())
+    
+    def get_statistics(self) -> Dict:
+        """
+        Get statistics about the index.
+        
+        Returns:
+            Dictionary with index statistics
+        """
+        snapshot = self._snapshot
+        postings = snapshot.live_postings()
+        return {
+            "word_count": len(postings),
+            "document_count": len(snapshot.document_ids()),
+            "total_occurrences": sum(len(docs) for docs in postings.values()),
+            "segment_count": len(snapshot.segments),
+            "deleted_documents": sum(len(segment.deleted) for segment in snapshot.segments),
+            "version": snapshot.version,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+        }
+    
+    def to_index(self, keep: Optional[Callable[[str], bool]] = None) -> InvertedIndex:
+        """
+        Merge every segment into a single plain index.
+        
+        Args:
+            keep: Optional filter; only documents for which it returns True are kept
+        
+        Returns:
+            Index of ``segment_class`` with the live documents
+        """
+        snapshot = self._snapshot
+        merged = self._merge(list(snapshot.segments) + [Segment("memtable", snapshot.memtable)], keep)
+        merged.document_versions = {
+            doc_id: version for doc_id, version in self.document_versions.items()
+            if doc_id in merged.forward
+        }
+        return merged
+    
+    def get_structure_data(self) -> Dict:
+        """
+        Get structure data for visualization, as if the index had a single segment.
+        
+        Returns:
+            Dictionary with structure information
+        """
+        return self.to_index().get_structure_data()
+    
+    # Compaction
+    
+    def _tier(self, segment: Segment) -> int:
+        """Size tier of a segment: tier ``n`` holds about ``flush_threshold * merge_factor**n`` documents."""
+        tier = 0
+        size = self.flush_threshold * self.merge_factor
+        while segment.live_count >= size:
+            tier += 1
+            size *= self.merge_factor
+        return tier
+    
+    def _compaction_candidates(self, segments: Iterable[Segment]) -> List[Segment]:
+        tiers: Dict[int, List[Segment]] = {}
+        for segment in segments:
+            # Un segmento con más de la mitad de sus documentos borrados se reescribe solo
+            if len(segment.deleted) * 2 > segment.document_count:
+                return [segment]
+            tiers.setdefault(self._tier(segment), []).append(segment)
+        for tier in sorted(tiers):
+            if len(tiers[tier]) >= self.merge_factor:
+                return tiers[tier][:self.merge_factor]
+        return []
+    
+    def needs_compaction(self) -> bool:
+        """Whether ``compact`` has work to do."""
+        return bool(self._compaction_candidates(self._snapshot.segments))
+    
+    def _merge(
+        self,
+        segments: List[Segment],
+        keep: Optional[Callable[[str], bool]] = None
+    ) -> InvertedIndex:
+        """Build a new index with the live documents of several segments."""
+        merged = self.new_index()
+        documents: Dict[str, Set[int]] = {}
+        for segment in segments:
+            for doc_id, term_ids in segment.index.forward.items():
+                if doc_id not in segment.deleted and (keep is None or doc_id == ALL_DOCUMENTS or keep(doc_id)):
+                    documents.setdefault(doc_id, set()).update(term_ids)
+        merged.add_term_ids(documents)
+        return merged
+    
+    def compact(self) -> bool:
+        """
+        Merge one group of segments of the same size tier.
+        
+        The merge reads a snapshot without holding the lock, so it can run
+        in a background thread while the index keeps serving searches and
+        writes; only publishing the result waits for other writers.
+        
+        Returns:
+            True if segments were merged
+        """
+        candidates = self._compaction_candidates(self._snapshot.segments)
+        if not candidates:
+            return False
+        merged = self._merge(candidates)
+        
+        with self._writing() as draft:
+            current = {segment.name: (i, segment) for i, segment in enumerate(draft.segments)}
+            if any(segment.name not in current for segment in candidates):
+                # La lista cambió mientras se fusionaba (p. ej. se reconstruyó el índice)
+                return False
+            # Documentos borrados durante la fusión
+            deleted = frozenset(
+                doc_id
+                for segment in candidates
+                for doc_id in current[segment.name][1].deleted - segment.deleted
+                if doc_id in merged.forward
+            )
+            position = current[candidates[0].name][0]
+            names = {segment.name for segment in candidates}
+            draft.segments = [segment for segment in draft.segments if segment.name not in names]
+            draft.segments.insert(position, Segment(self.new_segment_name(), merged, deleted))
+            return True
+    
+    # Persistence
+    
+    def save(self, directory: str) -> bool:
+        """
+        Save the current version of the index to a directory.
+        
+        Segments already on disk are not written again; only new segments,
+        the memtable and the manifest are. Segment files no longer listed in
+        the manifest are removed afterwards.
+        
+        Args:
+            directory: Directory of this index
+        
+        Returns:
+            True if successful
+        """
+        path = Path(directory)
+        ensure_directory(str(path))
+        with self._lock:
+            snapshot = self._snapshot
+            for segment in snapshot.segments:
+                if segment.name not in self._persisted:
+                    if not save_index_json(segment.index.to_dict(), str(path / f"{segment.name}.json")):
+                        return False
+                    self._persisted.add(segment.name)
+            if not save_index_json(snapshot.memtable.to_dict(), str(path / MEMTABLE_FILE)):
+                return False
+            manifest = {
+                "index_class": self.segment_class.__name__,
+                "segments": [
+                    {"name": segment.name, "deleted": sorted(segment.deleted)}
+                    for segment in snapshot.segments
+                ],
+                "next_segment": self.next_segment,
+                "posting_format": self.posting_format,
+                "document_versions": self.document_versions,
+                "created_at": self.created_at.isoformat() if self.created_at else None,
+            }
+            if not save_index_json(manifest, str(path / MANIFEST_FILE)):
+                return False
+            live_files = {f"{segment.name}.json" for segment in snapshot.segments}
+            self._persisted &= {segment.name for segment in snapshot.segments}
+        
+        for segment_file in path.glob("segment_*.json"):
+            if segment_file.name not in live_files:
+                try:
+                    segment_file.unlink()
+                except OSError as e:
+                    print(f"Error removing segment {segment_file}: {e}")
+        return True
+    
+    @classmethod
+    def load(
+        cls,
+        directory: str,
+        segment_class: Type[InvertedIndex],
+        terms: Optional[List[str]] = None,
+        keep: Optional[Callable[[str], bool]] = None,
+        previous: Optional["SegmentedIndex"] = None
+    ) -> Optional["SegmentedIndex"]:
+        """
+        Load an index saved with ``save``.
+        
+        Given the previously loaded version of the same directory (with the
+        same ``keep``), only the segments it does not hold are read: a
+        segment never changes under the same name, so the others are reused
+        and just take the tombstones of the new manifest.
+        
+        Args:
+            directory: Directory of this index
+            segment_class: Index class used for every segment
+            terms: Saved term dictionary the segments refer to
+            keep: Optional filter; only documents for which it returns True
+                are loaded, and each segment is filtered as it is read, before
+                its postings and tree are built
+            previous: Index loaded before from this directory, to reuse its segments
+        
+        Returns:
+            The loaded index, or None if there is no manifest
+        """
+        path = Path(directory)
+        manifest = load_index_json(str(path / MANIFEST_FILE))
+        if manifest is None:
+            return None
+        
+        # Los índices guardados antes de elegir el formato usaban conjuntos
+        index = cls(segment_class, posting_format=manifest.get("posting_format", settings.POSTING_FORMAT_SET))
+        # Segmentos ya cargados: un segmento no cambia sin cambiar de nombre
+        loaded: Dict[str, InvertedIndex] = {}
+        if (
+            previous is not None
+            and previous.segment_class is segment_class
+            and previous.posting_format == index.posting_format
+        ):
+            loaded = {segment.name: segment.index for segment in previous.snapshot().segments}
+        segments = []
+        for entry in manifest.get("segments", []):
+            deleted = entry.get("deleted", [])
+            if keep is not None:
+                deleted = [doc_id for doc_id in deleted if keep(doc_id)]
+            segment = loaded.get(entry["name"])
+            if segment is None:
+                data = load_index_json(str(path / f"{entry['name']}.json"))
+                if data is None:
+                    print(f"Missing segment {entry['name']} in {directory}")
+                    continue
+                if keep is not None:
+                    data = InvertedIndex.filter_data(data, keep)
+                segment = segment_class.from_dict(data, terms, index.posting_format)
+            segments.append(Segment(entry["name"], segment, frozenset(deleted)))
+            index._persisted.add(entry["name"])
+        memtable_data = load_index_json(str(path / MEMTABLE_FILE))
+        if memtable_data and keep is not None:
+            memtable_data = InvertedIndex.filter_data(memtable_data, keep)
+        if memtable_data:
+            memtable = segment_class.from_dict(memtable_data, terms, index.posting_format)
+        else:
+            memtable = index.new_index()
+        index._snapshot = IndexSnapshot(tuple(segments), memtable)
+        index.next_segment = manifest.get("next_segment", len(segments))
+        index.document_versions = {
+            doc_id: version for doc_id, version in manifest.get("document_versions", {}).items()
+            if keep is None or keep(doc_id)
+        }
+        if manifest.get("created_at"):
+            index.created_at = datetime.fromisoformat(manifest["created_at"])
+        return index
@@ -0,0 +1,104 @@
+"""
+Parallel index builds: the corpus is split into shards built in worker processes.
+"""
+import asyncio
+import multiprocessing
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple, Type
+
+from app.core.config import settings
+from app.modules.inverted_index import InvertedIndex
+
+# (ID de documento, clave en la caché de contenido, texto o None si sus términos están en caché)
+ShardDocument = Tuple[str, Optional[str], Optional[str]]
+
+
+def shard_for(document_id: str, shard_count: int) -> int:
+    """
+    Get the shard of a document, partitioning by a stable hash of its ID.
+    
+    Args:
+        document_id: Document identifier
+        shard_count: Number of shards
+    
+    Returns:
+        Shard number, from 0 to ``shard_count - 1``
+    """
+    return zlib.crc32(document_id.encode("utf-8")) % shard_count
+
+
+def index_class_by_name(name: str) -> Type[InvertedIndex]:
+    """Resolve an index class sent by name to another process."""
+    from app.modules.patricia_tree_index import PatriciaTreeIndex
+    from app.modules.suffix_tree_index import SuffixTreeIndex
+    
+    return {cls.__name__: cls for cls in (SuffixTreeIndex, PatriciaTreeIndex)}[name]
+
+
+def build_shard(documents: List[ShardDocument]) -> Dict[str, List[str]]:
+    """
+    Build the postings of one shard (runs in a worker process).
+    
+    Documents sent without text have their terms in the content cache;
+    the others are tokenized here and their terms are cached. Only the
+    postings are built: the index tree is built once, in the parent,
+    after the shards are merged.
+    
+    Args:
+        documents: Documents of the shard
+    
+    Returns:
+        Mapping of word to the IDs of the documents that contain it
+    """
+    from app.utils.content_cache import content_cache
+    from app.utils.text_processor import get_term_statistics
+    
+    postings: Dict[str, List[str]] = {}
+    for document_id, key, text in documents:
+        frequencies = None
+        if text is None and key:
+            frequencies = content_cache.get_term_frequencies(key)
+        if frequencies is None:
+            frequencies, offsets = get_term_statistics(text or "")
+            if key:
+                content_cache.put_term_frequencies(key, frequencies)
+                content_cache.put_term_offsets(key, offsets)
+        for word in frequencies:
+            postings.setdefault(word, []).append(document_id)
+    return postings
+
+
+_executor: Optional[ProcessPoolExecutor] = None
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    """Create the build worker pool on first use."""
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=settings.INDEX_BUILD_WORKERS,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _executor
+
+
+async def build_shards(shards: List[List[ShardDocument]]) -> List[Dict[str, List[str]]]:
+    """
+    Build the postings of every shard in parallel.
+    
+    Callers send one bounded batch of documents at a time, so the texts
+    pickled to the workers never add up to the whole corpus.
+    
+    Args:
+        shards: Documents of each shard
+    
+    Returns:
+        Postings of each shard, in the same order (empty for empty shards)
+    """
+    loop = asyncio.get_running_loop()
+    results = iter(await asyncio.gather(*(
+        loop.run_in_executor(_get_executor(), build_shard, shard)
+        for shard in shards if shard
+    )))
+    return [next(results) if shard else {} for shard in shards]
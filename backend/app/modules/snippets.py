@@ -0,0 +1,60 @@
+"""
+Snippets of document text around the words matched by a search.
+"""
+import re
+from typing import Iterable, List, Tuple
+
+# (inicio, fin) de un fragmento de texto, en caracteres
+Span = Tuple[int, int]
+
+# (texto del fragmento, coincidencias resaltadas relativas al fragmento)
+Snippet = Tuple[str, List[Span]]
+
+_SPACE_RE = re.compile(r"\s")
+
+
+def _snap_to_words(text: str, start: int, end: int, keep: Span) -> Span:
+    """Move the ends of a window to whitespace, without cutting the ``keep`` span."""
+    if start > 0 and not text[start - 1].isspace():
+        space = _SPACE_RE.search(text, start, keep[0])
+        start = space.end() if space else keep[0]
+    if end < len(text) and not text[end].isspace():
+        last_space = None
+        for last_space in _SPACE_RE.finditer(text, keep[1], end):
+            pass
+        end = last_space.start() if last_space else keep[1]
+    return start, end
+
+
+def build_snippets(text: str, spans: Iterable[Span], length: int, count: int) -> List[Snippet]:
+    """
+    Cut windows of a text around matched words.
+    
+    Each window is centred on the first match not shown yet and takes in
+    the following matches that fit; its ends are moved to whitespace so
+    no word is cut.
+    
+    Args:
+        text: Document text the spans refer to
+        spans: Character offsets ``(start, end)`` of the matched words
+        length: Maximum length of a snippet
+        count: Maximum number of snippets
+    
+    Returns:
+        Snippets in text order, each with the offsets of its highlights
+    """
+    spans = sorted(set(spans))
+    snippets: List[Snippet] = []
+    i = 0
+    while i < len(spans) and len(snippets) < count:
+        first = spans[i]
+        # Centrar la ventana en la primera coincidencia que falta mostrar
+        start = max(0, min(first[0] - (length - (first[1] - first[0])) // 2, len(text) - length))
+        end = max(min(len(text), start + length), first[1])
+        start, end = _snap_to_words(text, start, end, first)
+        highlights = []
+        while i < len(spans) and spans[i][1] <= end:
+            highlights.append((spans[i][0] - start, spans[i][1] - start))
+            i += 1
+        snippets.append((text[start:end], highlights))
+    return snippets
@@ -0,0 +1,203 @@
+"""
+Single-pass in-memory indexing (SPIMI) for corpora larger than RAM.
+"""
+import heapq
+import itertools
+import json
+import shutil
+from operator import itemgetter
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from app.core.config import settings
+from app.modules.inverted_index import InvertedIndex
+from app.modules.term_dictionary import TermDictionary, term_dictionary
+from app.utils.persistence import ensure_directory
+
+
+class SpimiBuilder:
+    """
+    Builds postings in blocks bounded by a memory budget.
+    
+    Postings are accumulated in a dictionary until ``max_postings`` is
+    reached; the block is then written to disk as a run sorted by term and
+    the memory is released. At the end all runs are k-way merged into a
+    single sorted stream of postings, which is written to a segment file
+    without ever holding the whole index in memory. When everything fits in
+    a single block no run is written.
+    
+    Use it as a context manager so the runs are removed afterwards::
+        
+        with SpimiBuilder(work_dir) as builder:
+            for document_id, terms in documents:
+                builder.add_document(document_id, terms)
+            builder.write_segment(path)
+    """
+    
+    def __init__(self, work_dir: Union[str, Path], max_postings: Optional[int] = None):
+        """
+        Initialize the builder.
+        
+        Args:
+            work_dir: Directory for the temporary runs
+            max_postings: Postings kept in memory before a run is written
+        """
+        self.work_dir = Path(work_dir)
+        self.max_postings = max_postings or settings.SPIMI_MAX_POSTINGS
+        self.document_count = 0
+        self._block: Dict[str, List[str]] = {}
+        self._block_postings = 0
+        self._runs: List[Path] = []
+    
+    def __enter__(self) -> "SpimiBuilder":
+        return self
+    
+    def __exit__(self, *exc_info) -> None:
+        self.cleanup()
+    
+    def add_document(self, document_id: str, terms: Iterable[str]) -> None:
+        """
+        Add the distinct terms of a document.
+        
+        Args:
+            document_id: Document identifier
+            terms: Distinct terms of the document
+        """
+        block = self._block
+        for term in terms:
+            postings = block.get(term)
+            if postings is None:
+                block[term] = [document_id]
+            else:
+                postings.append(document_id)
+            self._block_postings += 1
+        self.document_count += 1
+        if self._block_postings >= self.max_postings:
+            self._write_run()
+    
+    def add_postings(self, postings: Dict[str, List[str]], document_count: int) -> None:
+        """
+        Add the postings of a batch of documents tokenized elsewhere.
+        
+        The budget is checked once per batch, so a block can pass
+        ``max_postings`` by at most the postings of one batch.
+        
+        Args:
+            postings: Mapping of term to the IDs of the batch's documents
+                that contain it (the lists are taken over, not copied)
+            document_count: Number of documents in the batch
+        """
+        block = self._block
+        for term, documents in postings.items():
+            current = block.get(term)
+            if current is None:
+                block[term] = documents
+            else:
+                current.extend(documents)
+            self._block_postings += len(documents)
+        self.document_count += document_count
+        if self._block_postings >= self.max_postings:
+            self._write_run()
+    
+    @property
+    def run_count(self) -> int:
+        """Number of runs written to disk so far."""
+        return len(self._runs)
+    
+    def _write_run(self) -> None:
+        """Write the current block as a run sorted by term and release it."""
+        if not self._block:
+            return
+        ensure_directory(str(self.work_dir))
+        path = self.work_dir / f"run_{len(self._runs):05d}.jsonl"
+        with open(path, "w", encoding="utf-8") as f:
+            for term in sorted(self._block):
+                f.write(json.dumps([term, self._block[term]], ensure_ascii=False))
+                f.write("\n")
+        self._runs.append(path)
+        self._block = {}
+        self._block_postings = 0
+    
+    @staticmethod
+    def _read_run(path: Path) -> Iterator[Tuple[str, List[str]]]:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                term, documents = json.loads(line)
+                yield term, documents
+    
+    def iter_postings(self) -> Iterator[Tuple[str, List[str]]]:
+        """
+        Iterate over the postings of all documents added, sorted by term.
+        
+        Yields:
+            Tuples of (term, document IDs)
+        """
+        if not self._runs:
+            # Cada término se suelta al entregarlo: el bloque no se duplica en el índice
+            for term in sorted(self._block):
+                yield term, self._block.pop(term)
+            self._block_postings = 0
+            return
+        
+        self._write_run()
+        merged = heapq.merge(*(self._read_run(path) for path in self._runs), key=itemgetter(0))
+        for term, group in itertools.groupby(merged, key=itemgetter(0)):
+            documents: List[str] = []
+            for _, run_documents in group:
+                documents.extend(run_documents)
+            yield term, documents
+    
+    def write_segment(
+        self,
+        path: Union[str, Path],
+        terms: Optional[TermDictionary] = None,
+        index: Optional[InvertedIndex] = None
+    ) -> int:
+        """
+        Write the merged postings as an index segment file.
+        
+        The file has the format read by ``InvertedIndex.from_dict``; the
+        forward lists are left out and rebuilt when the segment is loaded.
+        If ``index`` is given it receives the postings as they are written,
+        so the new segment is loaded without reading the file back.
+        
+        Args:
+            path: Segment file to write
+            terms: Term dictionary for the term IDs (the shared one by default)
+            index: Empty index to load the postings into (using ``terms``)
+        
+        Returns:
+            Number of distinct terms written
+        """
+        terms = terms if terms is not None else term_dictionary
+        path = Path(path)
+        ensure_directory(str(path.parent))
+        term_count = 0
+        with open(path, "w", encoding="utf-8") as f:
+            f.write('{"postings": {')
+            
+            def written() -> Iterator[Tuple[int, List[str]]]:
+                nonlocal term_count
+                for term, documents in self.iter_postings():
+                    term_id = terms.intern(term)
+                    if term_count:
+                        f.write(", ")
+                    f.write(f'"{term_id}": ')
+                    f.write(json.dumps(documents))
+                    term_count += 1
+                    yield term_id, documents
+            
+            if index is None:
+                for _ in written():
+                    pass
+            else:
+                index.add_postings(written())
+            f.write("}}")
+        return term_count
+    
+    def cleanup(self) -> None:
+        """Remove the runs written to disk and release the current block."""
+        self._block = {}
+        self._block_postings = 0
+        self._runs = []
+        shutil.rmtree(self.work_dir, ignore_errors=True)
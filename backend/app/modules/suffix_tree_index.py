@@ -1,30 +1,53 @@
 """
 Inverted index implementation using Suffix Tree.
 """
-from typing import List, Set, Dict, Optional
+from bisect import bisect_right
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
 from datetime import datetime
-try:
-    from suffix_trees.STree import STree
-except ImportError:
-    # Fallback: create a simple STree-like class if library is not available
-    class STree:
-        """Simple fallback STree implementation."""
-        def __init__(self, text: str):
-            self.text = text
-        
-        def find_all(self, pattern: str):
-            """Find all occurrences of pattern in text."""
-            positions = []
-            start = 0
-            while True:
-                pos = self.text.find(pattern, start)
-                if pos == -1:
-                    break
-                positions.append(pos)
-                start = pos + 1
-            return positions
 from app.modules.inverted_index import InvertedIndex
-from app.utils.text_processor import tokenize
+from app.modules.term_dictionary import TermDictionary
+from app.modules.term_pattern import TermPattern
+
+
+class _FallbackSTree:
+    """Simple fallback STree implementation."""
+    def __init__(self, text: str):
+        self.text = text
+    
+    def find_all(self, pattern: str):
+        """Find all occurrences of pattern in text."""
+        positions = []
+        start = 0
+        while True:
+            pos = self.text.find(pattern, start)
+            if pos == -1:
+                break
+            positions.append(pos)
+            start = pos + 1
+        return positions
+
+
+_stree_class = None
+
+
+def _get_stree_class():
+    """
+    Resolve the STree implementation on first use.
+    
+    The suffix-trees library is only imported when a suffix tree is actually
+    built, so importing this module stays cheap.
+    
+    Returns:
+        STree class from suffix-trees, or the fallback if it is not installed
+    """
+    global _stree_class
+    if _stree_class is None:
+        try:
+            from suffix_trees.STree import STree
+            _stree_class = STree
+        except ImportError:
+            _stree_class = _FallbackSTree
+    return _stree_class
 
 
 class SuffixTreeIndex(InvertedIndex):
@@ -35,11 +58,19 @@ class SuffixTreeIndex(InvertedIndex):
     not just exact word matches.
     """
     
-    def __init__(self):
-        """Initialize the Suffix Tree index."""
-        super().__init__()
-        self.suffix_tree: Optional[STree] = None
-        self.word_to_suffixes: Dict[str, List[str]] = {}
+    def __init__(self, terms: Optional[TermDictionary] = None, posting_format: Optional[str] = None):
+        """
+        Initialize the Suffix Tree index.
+        
+        Args:
+            terms: Term dictionary to use (the shared one by default)
+            posting_format: How postings are combined ('set' or 'bitmap')
+        """
+        super().__init__(terms, posting_format)
+        self.suffix_tree: Optional[Any] = None
+        # Offset de inicio de cada palabra en el texto del árbol, y su term ID
+        self._word_starts: List[int] = []
+        self._word_ids: List[int] = []
         self.created_at = datetime.now()
     
     def add_document(self, document_id: str, words: List[str]) -> None:
@@ -50,18 +81,44 @@ class SuffixTreeIndex(InvertedIndex):
             document_id: Unique identifier for the document
             words: List of words/tokens from the document
         """
-        # Add words to the base inverted index
-        for word in words:
-            word_lower = word.lower()
-            self.add_word(word_lower, document_id)
-            
-            # Generate suffixes for the word and store them
-            if word_lower not in self.word_to_suffixes:
-                self.word_to_suffixes[word_lower] = self._generate_suffixes(word_lower)
+        self.add_documents({document_id: words})
+    
+    def add_documents(self, documents: Dict[str, List[str]]) -> None:
+        """
+        Add several documents, rebuilding the suffix tree only once.
+        
+        Args:
+            documents: Mapping of document ID to its list of words/tokens
+        """
+        intern = self.terms.intern
+        for document_id, words in documents.items():
+            # Add words to the base inverted index
+            for word in words:
+                self._add_posting(intern(word.lower()), document_id)
         
         # Rebuild suffix tree with all words
         self._rebuild_suffix_tree()
     
+    def add_term_ids(self, documents: Dict[str, Iterable[int]]) -> None:
+        """
+        Add documents given as term IDs, rebuilding the suffix tree only once.
+        
+        Args:
+            documents: Mapping of document ID to the term IDs of its words
+        """
+        super().add_term_ids(documents)
+        self._rebuild_suffix_tree()
+    
+    def add_postings(self, postings: Iterable[Tuple[int, Iterable[str]]]) -> None:
+        """
+        Add streamed postings, building the suffix tree once at the end.
+        
+        Args:
+            postings: Pairs of (term ID, IDs of the documents that contain it)
+        """
+        super().add_postings(postings)
+        self._rebuild_suffix_tree()
+    
     def add_word(self, word: str, document_id: str) -> None:
         """
         Add a word to the index for a specific document.
@@ -71,83 +128,64 @@ class SuffixTreeIndex(InvertedIndex):
             word: Word to add
             document_id: Document identifier
         """
-        word_lower = word.lower()
-        
-        # Check if this is a new word
-        is_new_word = word_lower not in self.word_to_documents
+        is_new_word = self._add_posting(self.terms.intern(word.lower()), document_id)
         
-        # Call parent method to add word to base index
-        super().add_word(word_lower, document_id)
-        
-        # If it's a new word, generate suffixes and rebuild tree
+        # Always rebuild suffix tree when a new word is added
         if is_new_word:
-            if word_lower not in self.word_to_suffixes:
-                self.word_to_suffixes[word_lower] = self._generate_suffixes(word_lower)
-            # Always rebuild suffix tree when a new word is added
             self._rebuild_suffix_tree()
     
-    def _generate_suffixes(self, word: str) -> List[str]:
-        """
-        Generate all suffixes of a word.
-        
-        Args:
-            word: Input word
-            
-        Returns:
-            List of all suffixes
-        """
-        suffixes = []
-        for i in range(len(word)):
-            suffixes.append(word[i:])
-        return suffixes
-    
     def _rebuild_suffix_tree(self) -> None:
         """Rebuild the suffix tree with all indexed words."""
-        if not self.word_to_documents:
+        self._word_starts = []
+        self._word_ids = []
+        if not self.postings:
             self.suffix_tree = None
             return
         
-        # Create a text with all words separated by special delimiters
-        # We use $ as delimiter and # to separate words
+        # Create a text with all words separated by '#', remembering where
+        # each word starts to map tree positions back to words
         text_parts = []
-        word_mapping = {}  # Map position in text to (word, position in word)
         position = 0
+        term = self.terms.term
         
-        for word in self.word_to_documents.keys():
-            # Add word with delimiter
+        for term_id in self.postings:
+            word = term(term_id)
             text_parts.append(word)
             text_parts.append('#')
-            word_mapping[position] = (word, 0)
+            self._word_starts.append(position)
+            self._word_ids.append(term_id)
             position += len(word) + 1
         
         text = ''.join(text_parts)
         
         # Build suffix tree
         if text:
-            self.suffix_tree = STree(text)
+            self.suffix_tree = _get_stree_class()(text)
         else:
             self.suffix_tree = None
     
-    def search(self, query: str) -> List[str]:
+    def _match_terms(self, query: str) -> Set[int]:
         """
-        Search for documents containing the query (supports substring search).
+        Find the words containing the query (substring search).
         
         Args:
             query: Search query (can be a substring)
             
         Returns:
-            List of document IDs that match the query
+            Set of term IDs that match the query
         """
         query_lower = query.lower()
-        matching_documents: Set[str] = set()
         
         # If suffix tree is not built, return empty
         if not self.suffix_tree:
-            return []
+            return set()
+        
+        matching_terms: Set[int] = set()
         
         # Search for exact word matches first (faster)
-        if query_lower in self.word_to_documents:
-            matching_documents.update(self.word_to_documents[query_lower])
+        term_id = self.terms.get_id(query_lower)
+        if term_id is not None and term_id in self.postings:
+            matching_terms.add(term_id)
         
         # Search for substring matches using suffix tree
         try:
@@ -156,22 +194,64 @@ class SuffixTreeIndex(InvertedIndex):
             
             # For each occurrence, find which word it belongs to
             for pos in occurrences:
-                # Find the word that contains this position
-                word = self._find_word_at_position(pos)
-                if word:
-                    # Get all documents containing this word
-                    if word in self.word_to_documents:
-                        matching_documents.update(self.word_to_documents[word])
+                term_id = self._find_term_at_position(pos)
+                if term_id is not None:
+                    matching_terms.add(term_id)
         except Exception:
             # If suffix tree search fails, fall back to simple word matching
             pass
         
         # Also check if any word contains the query as substring
-        for word in self.word_to_documents.keys():
-            if query_lower in word:
-                matching_documents.update(self.word_to_documents[word])
+        term = self.terms.term
+        for term_id in self.postings:
+            if query_lower in term(term_id):
+                matching_terms.add(term_id)
+        
+        return matching_terms
+    
+    def pattern_terms(self, pattern: TermPattern) -> Set[int]:
+        """
+        Find the words that match a wildcard or regex pattern.
         
-        return list(matching_documents)
+        The suffix tree finds the words containing the longest literal
+        part of the pattern (prefix, suffix or infix); only those are
+        checked against the whole pattern.
+        
+        Args:
+            pattern: Parsed pattern
+        
+        Returns:
+            Set of term IDs
+        """
+        literal = pattern.longest_literal
+        if not literal or not self.suffix_tree:
+            return super().pattern_terms(pattern)
+        
+        candidates: Set[int] = set()
+        for pos in self.suffix_tree.find_all(literal):
+            term_id = self._find_term_at_position(pos)
+            if term_id is not None:
+                candidates.add(term_id)
+        term = self.terms.term
+        return {term_id for term_id in candidates if pattern.matches(term(term_id))}
+    
+    def _find_term_at_position(self, position: int) -> Optional[int]:
+        """
+        Find which word contains a given position in the suffix tree text.
+        
+        Args:
+            position: Position in the concatenated text
+            
+        Returns:
+            Term ID of the word that contains this position, or None
+        """
+        i = bisect_right(self._word_starts, position) - 1
+        if i < 0:
+            return None
+        term_id = self._word_ids[i]
+        if position < self._word_starts[i] + len(self.terms.term(term_id)):
+            return term_id
+        return None
     
     def _find_word_at_position(self, position: int) -> Optional[str]:
         """
@@ -183,13 +263,8 @@ class SuffixTreeIndex(InvertedIndex):
         Returns:
             Word that contains this position, or None
         """
-        current_pos = 0
-        for word in self.word_to_documents.keys():
-            word_length = len(word)
-            if current_pos <= position < current_pos + word_length:
-                return word
-            current_pos += word_length + 1  # +1 for the '#' delimiter
-        return None
+        term_id = self._find_term_at_position(position)
+        return self.terms.term(term_id) if term_id is not None else None
     
     def remove_word(self, word: str) -> bool:
         """
@@ -203,56 +278,93 @@ class SuffixTreeIndex(InvertedIndex):
         """
         result = super().remove_word(word)
         if result:
-            # Remove from suffix mapping
-            if word.lower() in self.word_to_suffixes:
-                del self.word_to_suffixes[word.lower()]
             # Rebuild suffix tree
             self._rebuild_suffix_tree()
         return result
     
-    def to_dict(self) -> Dict:
+    def remove_words(self, words: Iterable[str]) -> int:
+        """
+        Remove several words, rebuilding the suffix tree only once.
+        
+        Args:
+            words: Words to remove
+            
+        Returns:
+            Number of words that were found and removed
+        """
+        removed = sum(1 for word in words if super().remove_word(word))
+        if removed:
+            self._rebuild_suffix_tree()
+        return removed
+    
+    def remove_document(self, document_id: str) -> bool:
+        """
+        Remove a document from the index and rebuild the suffix tree if needed.
+        
+        Args:
+            document_id: Document identifier
+            
+        Returns:
+            True if the document was indexed, False otherwise
+        """
+        return self.remove_documents([document_id]) > 0
+    
+    def remove_documents(self, document_ids: List[str]) -> int:
+        """
+        Remove several documents, rebuilding the suffix tree only once.
+        
+        Args:
+            document_ids: Document identifiers
+            
+        Returns:
+            Number of documents that were indexed and got removed
+        """
+        word_count = len(self.postings)
+        removed = 0
+        for document_id in document_ids:
+            if super().remove_document(document_id):
+                removed += 1
+        if len(self.postings) != word_count:
+            self._rebuild_suffix_tree()
+        return removed
+    
+    def to_dict(self, portable: bool = False) -> Dict:
         """
         Serialize index to dictionary for persistence.
         
+        Args:
+            portable: Embed the term dictionary (see ``InvertedIndex._postings_to_dict``)
+        
         Returns:
             Dictionary with serializable index data
         """
-        return {
-            "word_to_documents": {
-                word: list(docs) for word, docs in self.word_to_documents.items()
-            },
-            "document_to_words": {
-                doc_id: list(words) for doc_id, words in self.document_to_words.items()
-            },
-            "word_to_suffixes": self.word_to_suffixes,
-            "created_at": self.created_at.isoformat() if self.created_at else None,
-        }
+        data = self._postings_to_dict(portable)
+        data["created_at"] = self.created_at.isoformat() if self.created_at else None
+        return data
     
     @classmethod
-    def from_dict(cls, data: Dict) -> "SuffixTreeIndex":
+    def from_dict(
+        cls,
+        data: Dict,
+        terms: Optional[List[str]] = None,
+        posting_format: Optional[str] = None
+    ) -> "SuffixTreeIndex":
         """
         Reconstruct index from dictionary.
         
         Args:
             data: Dictionary with index data
+            terms: Saved term dictionary the term IDs in ``data`` refer to
+            posting_format: Posting format to load into (by default the one
+                saved in ``data``, or ``POSTING_FORMAT``)
             
         Returns:
             Reconstructed SuffixTreeIndex instance
         """
-        index = cls()
-        
-        # Restore word_to_documents (convert lists back to sets)
-        index.word_to_documents = {
-            word: set(docs) for word, docs in data.get("word_to_documents", {}).items()
-        }
+        index = cls(posting_format=posting_format or data.get("posting_format"))
         
-        # Restore document_to_words (convert lists back to sets)
-        index.document_to_words = {
-            doc_id: set(words) for doc_id, words in data.get("document_to_words", {}).items()
-        }
-        
-        # Restore word_to_suffixes
-        index.word_to_suffixes = data.get("word_to_suffixes", {})
+        # Restore postings, forward lists and document versions
+        index._restore_postings(data, terms)
         
         # Restore created_at
         if data.get("created_at"):
@@ -278,11 +390,6 @@ class SuffixTreeIndex(InvertedIndex):
             "children": []
         }
         
-        # Ensure all words in word_to_documents have suffixes generated
-        for word in self.word_to_documents.keys():
-            if word not in self.word_to_suffixes:
-                self.word_to_suffixes[word] = self._generate_suffixes(word)
-        
         # Group words by first character
         first_char_groups: Dict[str, List[str]] = {}
         # Sort words for consistent ordering
@@ -310,7 +417,7 @@ class SuffixTreeIndex(InvertedIndex):
                     "label": word,
                     "metadata": {
                         "document_count": len(self.word_to_documents.get(word, set())),
-                        "suffixes": len(self.word_to_suffixes.get(word, []))
+                        "suffixes": len(word)
                     },
                     "children": []
                 }
@@ -0,0 +1,119 @@
+"""
+Global dictionary of index terms.
+"""
+import sys
+import threading
+from typing import Dict, Iterable, List, Optional
+
+
+class TermDictionary:
+    """
+    Maps each term to a dense integer ID.
+    
+    Every index shares the same dictionary, so each term string is stored
+    once in the process and postings/forward lists hold ints instead of
+    copies of the string. IDs are never reassigned: a term that leaves an
+    index keeps its ID, which keeps IDs stable for everything already saved.
+    """
+    
+    def __init__(self):
+        """Initialize an empty dictionary."""
+        self._ids: Dict[str, int] = {}
+        self._terms: List[str] = []
+        # Solo las altas toman el lock: las búsquedas de los hilos del pool
+        # pueden asignar IDs a la vez que un build
+        self._lock = threading.Lock()
+    
+    def __len__(self) -> int:
+        return len(self._terms)
+    
+    def __contains__(self, term: str) -> bool:
+        return term in self._ids
+    
+    def intern(self, term: str) -> int:
+        """
+        Get the ID of a term, assigning a new one if needed.
+        
+        Args:
+            term: Normalized term
+        
+        Returns:
+            Term ID
+        """
+        term_id = self._ids.get(term)
+        if term_id is None:
+            with self._lock:
+                # Otro hilo pudo asignarlo mientras se esperaba el lock
+                term_id = self._ids.get(term)
+                if term_id is None:
+                    term = sys.intern(term)
+                    term_id = len(self._terms)
+                    # La lista primero: quien vea el ID ya puede leer su término
+                    self._terms.append(term)
+                    self._ids[term] = term_id
+        return term_id
+    
+    def get_id(self, term: str) -> Optional[int]:
+        """
+        Get the ID of a term without assigning one.
+        
+        Args:
+            term: Normalized term
+        
+        Returns:
+            Term ID, or None if the term is unknown
+        """
+        return self._ids.get(term)
+    
+    def term(self, term_id: int) -> str:
+        """
+        Get the term of an ID.
+        
+        Args:
+            term_id: Term ID
+        
+        Returns:
+            Term string
+        """
+        return self._terms[term_id]
+    
+    def terms(self, term_ids: Iterable[int]) -> List[str]:
+        """
+        Get the terms of several IDs.
+        
+        Args:
+            term_ids: Term IDs
+        
+        Returns:
+            List of term strings
+        """
+        return list(map(self._terms.__getitem__, term_ids))
+    
+    def to_list(self) -> List[str]:
+        """
+        Serialize the dictionary (the position of each term is its ID).
+        
+        Returns:
+            List of terms
+        """
+        return list(self._terms)
+    
+    def merge(self, terms: Iterable[str]) -> List[int]:
+        """
+        Add the terms of a saved dictionary.
+        
+        A saved dictionary may number its terms differently from this one
+        (e.g. it was written by another process), so the result maps each
+        saved ID to the ID in this dictionary.
+        
+        Args:
+            terms: Saved list of terms, as returned by ``to_list``
+        
+        Returns:
+            List where position ``i`` holds the current ID of saved term ``i``
+        """
+        return [self.intern(term) for term in terms]
+
+
+# Diccionario compartido por todos los índices
+term_dictionary = TermDictionary()
@@ -0,0 +1,193 @@
+"""
+Wildcard and restricted regular expression patterns over indexed words.
+"""
+import re
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+SYNTAX_WILDCARD = "wildcard"
+SYNTAX_REGEX = "regex"
+
+# Caracteres que no están permitidos en el regex restringido
+_UNSUPPORTED = frozenset("()|{}^$")
+
+# Un átomo del patrón: (expresión regular, carácter literal o None, cuantificador)
+_Atom = Tuple[str, Optional[str], str]
+
+# Átomos con '*' o '+' permitidos por patrón: cada uno multiplica lo que el
+# regex puede tener que retroceder en las palabras que no coinciden
+MAX_UNBOUNDED_ATOMS = 3
+
+
+@dataclass(frozen=True)
+class TermPattern:
+    """
+    A pattern that a whole word must match.
+    
+    Besides the compiled expression, it keeps the literal parts every
+    matching word must contain, so indexes can find candidate words with
+    their trees and only check the expression on those.
+    """
+    regex: "re.Pattern[str]"
+    prefix: str  # Literal con el que empiezan todas las palabras ('' si no hay)
+    suffix: str  # Literal con el que terminan todas las palabras ('' si no hay)
+    infixes: Tuple[str, ...]  # Los demás literales que contienen todas las palabras
+    
+    @property
+    def longest_literal(self) -> str:
+        """Longest literal every matching word contains ('' if there is none)."""
+        return max((self.prefix, self.suffix) + self.infixes, key=len)
+    
+    def matches(self, word: str) -> bool:
+        """
+        Check whether a word matches the whole pattern.
+        
+        Args:
+            word: Indexed word
+        
+        Returns:
+            True if the word matches
+        """
+        return self.regex.fullmatch(word) is not None
+
+
+def _wildcard_atoms(pattern: str) -> List[_Atom]:
+    """Split a wildcard pattern: ``*`` is any run of characters, ``?`` any one character."""
+    atoms: List[_Atom] = []
+    for char in pattern:
+        if char == "*":
+            # Varios '*' seguidos equivalen a uno
+            if not atoms or atoms[-1] != (".", None, "*"):
+                atoms.append((".", None, "*"))
+        elif char == "?":
+            atoms.append((".", None, ""))
+        else:
+            atoms.append((re.escape(char), char, ""))
+    return atoms
+
+
+def _regex_atoms(pattern: str) -> List[_Atom]:
+    """
+    Split a restricted regular expression.
+    
+    Supported: literal characters, ``\\`` escapes, ``.``, character classes
+    (``[abc]``, ``[a-z]``, ``[^0-9]``) and the ``*``, ``+`` and ``?``
+    quantifiers. Groups, alternation, repetition counts and anchors are
+    rejected; the pattern always has to match the whole word.
+    """
+    atoms: List[_Atom] = []
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        if char in "*+?":
+            if not atoms or atoms[-1][2]:
+                raise ValueError(f"Misplaced quantifier '{char}' at position {i}")
+            expression, literal, _ = atoms[-1]
+            atoms[-1] = (expression, literal, char)
+            i += 1
+            continue
+        if char in _UNSUPPORTED:
+            raise ValueError(f"Unsupported pattern syntax '{char}' at position {i}")
+        if char == "\\":
+            if i + 1 == len(pattern):
+                raise ValueError("Pattern ends with an unfinished escape")
+            literal = pattern[i + 1]
+            atoms.append((re.escape(literal), literal, ""))
+            i += 2
+        elif char == "[":
+            end = pattern.find("]", i + 2 if pattern.startswith("[^", i) else i + 1)
+            if end == -1:
+                raise ValueError(f"Unclosed character class at position {i}")
+            body = pattern[i + 1:end]
+            if "[" in body or "\\" in body:
+                raise ValueError(f"Unsupported character class at position {i}")
+            atoms.append((f"[{body}]", None, ""))
+            i = end + 1
+        elif char == ".":
+            atoms.append((".", None, ""))
+            i += 1
+        else:
+            atoms.append((re.escape(char), char, ""))
+            i += 1
+    return atoms
+
+
+def _collapse_unbounded(atoms: List[_Atom]) -> List[_Atom]:
+    """
+    Merge adjacent ``*``/``+`` atoms that match the same words as one.
+    
+    ``x*x*`` and ``x*x+`` are ``x*`` and ``x+``, and ``.*``/``.+`` absorb
+    any ``*`` atom next to them, so patterns like ``.*.*.*`` do not make the
+    regex backtrack more than a single ``.*``.
+    """
+    collapsed: List[_Atom] = []
+    for atom in atoms:
+        expression, literal, quantifier = atom
+        if collapsed and quantifier in ("*", "+") and collapsed[-1][2] in ("*", "+"):
+            previous = collapsed[-1]
+            if previous[0] == expression and "*" in (previous[2], quantifier):
+                collapsed[-1] = (expression, literal, "+" if "+" in (previous[2], quantifier) else "*")
+                continue
+            if previous[0] == "." and quantifier == "*":
+                continue
+            if expression == "." and previous[2] == "*":
+                collapsed[-1] = atom
+                continue
+        collapsed.append(atom)
+    return collapsed
+
+
+def parse_pattern(pattern: str, syntax: str = SYNTAX_WILDCARD) -> TermPattern:
+    """
+    Parse a word pattern.
+    
+    Args:
+        pattern: Normalized pattern (e.g. ``pre*``, ``*fix``, ``pre*fix``)
+        syntax: 'wildcard' or 'regex' (restricted, see ``_regex_atoms``)
+    
+    Returns:
+        Parsed pattern
+    
+    Raises:
+        ValueError: If the pattern is empty, uses unsupported syntax or has
+            more than ``MAX_UNBOUNDED_ATOMS`` repeated parts
+    """
+    if not pattern:
+        raise ValueError("Empty pattern")
+    atoms = _regex_atoms(pattern) if syntax == SYNTAX_REGEX else _wildcard_atoms(pattern)
+    atoms = _collapse_unbounded(atoms)
+    if sum(1 for _, _, quantifier in atoms if quantifier in ("*", "+")) > MAX_UNBOUNDED_ATOMS:
+        raise ValueError(f"Pattern has more than {MAX_UNBOUNDED_ATOMS} repeated parts ('*' or '+')")
+    try:
+        regex = re.compile("".join(expression + quantifier for expression, _, quantifier in atoms))
+    except re.error as e:
+        raise ValueError(f"Invalid pattern: {e}")
+    
+    # Tramos de literales obligatorios: (inicio, fin) en átomos y texto
+    runs: List[Tuple[int, int, str]] = []
+    start, text = 0, ""
+    for i, (_, literal, quantifier) in enumerate(atoms):
+        if literal is not None and quantifier in ("", "+"):
+            text += literal
+            if quantifier == "":
+                continue
+            # 'a+' exige una 'a', pero lo que sigue ya no es contiguo
+            runs.append((start, i + 1, text))
+        elif text:
+            runs.append((start, i, text))
+        start, text = i + 1, ""
+    if text:
+        runs.append((start, len(atoms), text))
+    
+    prefix = suffix = ""
+    infixes = []
+    for run_start, run_end, run_text in runs:
+        is_prefix = run_start == 0
+        is_suffix = run_end == len(atoms) and not atoms[-1][2]
+        if is_prefix:
+            prefix = run_text
+        if is_suffix:
+            suffix = run_text
+        if not is_prefix and not is_suffix:
+            infixes.append(run_text)
+    return TermPattern(regex=regex, prefix=prefix, suffix=suffix, infixes=tuple(infixes))
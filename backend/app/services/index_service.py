@@ -1,44 +1,123 @@
 """
 Service layer for index management and operations.
 """
-from typing import List, Optional, Dict, Any
+from typing import AsyncIterator, List, Optional, Dict, Any, Set, Tuple
 from datetime import datetime
+import asyncio
 import uuid
 import os
 from pathlib import Path
 from app.api.models.document import DocumentResponse
 from app.api.models.index import (
     IndexStatusResponse,
+    SearchMode,
+    SearchPlan,
     SearchResponse,
     SearchResult,
+    SearchResultMode,
+    SearchSnippet,
     IndexStructureResponse,
     IndexStructureNode
 )
+from app.modules.inverted_index import ALL_DOCUMENTS
 from app.modules.suffix_tree_index import SuffixTreeIndex
 from app.modules.patricia_tree_index import PatriciaTreeIndex
-from app.utils.text_processor import tokenize
+from app.modules.segmented_index import IndexSnapshot, SegmentedIndex
+from app.modules.metadata_store import DocumentMetadata, MetadataStore
+from app.modules.spimi import SpimiBuilder
+from app.modules.sharded_build import ShardDocument, build_shard, build_shards, shard_for
+from app.modules.ranking import DocumentTermsCache, RankedDocument, rank_documents
+from app.modules.term_pattern import parse_pattern
+from app.modules.snippets import Snippet, build_snippets
+from app.modules.query_planner import QUERY_EXACT, QueryPlan, plan_query
+from app.services.shard_pool import ShardPool
+from app.modules.term_dictionary import term_dictionary
+from app.utils.text_processor import get_term_statistics, normalize_query
 from app.utils.persistence import save_index_json, load_index_json
+from app.utils.blob_store import blob_store
+from app.utils.concurrency import BoundedExecutor, SingleFlight
+from app.utils.content_cache import cache_key, content_cache
 from app.core.config import settings
 from app.models import Document
 
+# Documentos cargados por consulta cuando hay que tokenizar su texto
+TEXT_BATCH_SIZE = 200
+
 
 class IndexService:
     """Service for managing documents and indexes."""
     
     def __init__(self):
         """Initialize the service."""
-        self.suffix_index: Optional[SuffixTreeIndex] = None
-        self.patricia_index: Optional[PatriciaTreeIndex] = None
+        self._suffix_index: Optional[SegmentedIndex] = None
+        self._patricia_index: Optional[SegmentedIndex] = None
         self._indices_dir = Path(settings.INDICES_DIR)
         self._indices_dir.mkdir(parents=True, exist_ok=True)
         
-        # Load existing indexes on startup
-        self._load_indexes()
+        # Los índices persistidos se cargan en el primer acceso y no al
+        # importar el módulo, para que el arranque en frío sea rápido
+        self._indexes_loaded = False
+        
+        # Reporte de la última construcción de cada índice
+        self.last_build: Dict[str, Dict[str, Any]] = {}
+        
+        # Índices con una compactación de segmentos en curso
+        self._compacting: Set[str] = set()
+        
+        # Versión guardada de cada índice, para saber cuándo recargar los shards de búsqueda
+        self._index_generations: Dict[str, int] = {}
+        self._shard_pool: Optional[ShardPool] = None
+        
+        # Búsquedas idénticas simultáneas se calculan una vez, en un pool de hilos acotado
+        self._search_flight = SingleFlight()
+        self._search_executor = BoundedExecutor(settings.SEARCH_WORKERS, "search")
+        
+        # Metadatos de los documentos para filtrar búsquedas; se cargan en el primer filtro
+        self._metadata = MetadataStore()
+        self._metadata_load: Optional["asyncio.Future[None]"] = None
+        # Cambios recibidos mientras se cargan: (ID, metadatos o None si se borró)
+        self._metadata_changes: Optional[List[Tuple[str, Optional[DocumentMetadata]]]] = None
+    
+    @property
+    def suffix_index(self) -> Optional[SegmentedIndex]:
+        """Suffix Tree index, loaded from disk on first access."""
+        self._ensure_indexes_loaded()
+        return self._suffix_index
+    
+    @suffix_index.setter
+    def suffix_index(self, index: Optional[SegmentedIndex]) -> None:
+        self._indexes_loaded = True
+        self._suffix_index = index
+    
+    @property
+    def patricia_index(self) -> Optional[SegmentedIndex]:
+        """PATRICIA Tree index, loaded from disk on first access."""
+        self._ensure_indexes_loaded()
+        return self._patricia_index
+    
+    @patricia_index.setter
+    def patricia_index(self, index: Optional[SegmentedIndex]) -> None:
+        self._indexes_loaded = True
+        self._patricia_index = index
+    
+    def _ensure_indexes_loaded(self) -> None:
+        """Load persisted indexes the first time they are needed."""
+        if not self._indexes_loaded:
+            self._indexes_loaded = True
+            self._load_indexes()
     
     def _get_index_path(self, index_type: str) -> Path:
-        """Get the file path for an index."""
+        """Get the file path of an index saved as a single file (older versions)."""
         return self._indices_dir / f"{index_type}_index.json"
     
+    def _get_index_dir(self, index_type: str) -> Path:
+        """Get the directory holding the segments of an index."""
+        return self._indices_dir / index_type
+    
+    def _get_terms_path(self) -> Path:
+        """Get the file path of the term dictionary shared by all indexes."""
+        return self._indices_dir / "terms.json"
+    
     def _save_index(self, index_type: str) -> bool:
         """
         Save an index to disk.
@@ -60,35 +139,99 @@ class IndexService:
             if index is None:
                 return False
             
-            # Serialize index to dict
-            index_data = index.to_dict()
+            # The index refers to terms by ID: save the dictionary first, so
+            # the file on disk always knows every ID an index file uses
+            if not save_index_json({"terms": term_dictionary.to_list()}, str(self._get_terms_path())):
+                return False
+            
+            # Save new segments, the in-memory segment and the manifest
+            if not index.save(str(self._get_index_dir(index_type))):
+                return False
+            self._index_generations[index_type] = self._index_generations.get(index_type, 0) + 1
             
-            # Save to file
-            filepath = str(self._get_index_path(index_type))
-            return save_index_json(index_data, filepath)
+            # The single-file format of older versions is replaced by the segments
+            legacy_path = self._get_index_path(index_type)
+            if legacy_path.exists():
+                legacy_path.unlink()
+            return True
         except Exception as e:
             print(f"Error saving index {index_type}: {e}")
             return False
     
     def _load_indexes(self) -> None:
-        """Load indexes from disk on startup."""
+        """Load indexes from disk."""
         try:
-            # Load suffix index
-            suffix_path = self._get_index_path(settings.INDEX_TYPE_SUFFIX)
-            suffix_data = load_index_json(str(suffix_path))
-            if suffix_data:
-                self.suffix_index = SuffixTreeIndex.from_dict(suffix_data)
-                print(f"Loaded suffix index from {suffix_path}")
+            # Load the term dictionary the index files refer to
+            terms_data = load_index_json(str(self._get_terms_path())) or {}
+            terms = terms_data.get("terms", [])
             
-            # Load patricia index
-            patricia_path = self._get_index_path(settings.INDEX_TYPE_PATRICIA)
-            patricia_data = load_index_json(str(patricia_path))
-            if patricia_data:
-                self.patricia_index = PatriciaTreeIndex.from_dict(patricia_data)
-                print(f"Loaded patricia index from {patricia_path}")
+            self._suffix_index = self._load_index(settings.INDEX_TYPE_SUFFIX, SuffixTreeIndex, terms)
+            self._patricia_index = self._load_index(settings.INDEX_TYPE_PATRICIA, PatriciaTreeIndex, terms)
         except Exception as e:
             print(f"Error loading indexes: {e}")
     
+    def _load_index(
+        self,
+        index_type: str,
+        segment_class: type,
+        terms: List[str]
+    ) -> Optional[SegmentedIndex]:
+        """
+        Load one index, from its segments or from the single-file format of older versions.
+        
+        Args:
+            index_type: Type of index ('suffix' or 'patricia')
+            segment_class: Index class of its segments
+            terms: Saved term dictionary the index refers to
+            
+        Returns:
+            The loaded index, or None if it was never saved
+        """
+        index_dir = self._get_index_dir(index_type)
+        index = SegmentedIndex.load(str(index_dir), segment_class, terms)
+        if index is not None:
+            print(f"Loaded {index_type} index from {index_dir}")
+            return index
+        
+        index_path = self._get_index_path(index_type)
+        index_data = load_index_json(str(index_path))
+        if index_data:
+            print(f"Loaded {index_type} index from {index_path}")
+            return SegmentedIndex.from_index(segment_class.from_dict(index_data, terms))
+        return None
+    
+    def _schedule_compaction(self, index_type: str) -> None:
+        """
+        Merge the segments of an index in a background thread, if needed.
+        
+        Args:
+            index_type: Type of index ('suffix' or 'patricia')
+        """
+        index = self._get_index(index_type)
+        if index is None or index_type in self._compacting or not index.needs_compaction():
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        self._compacting.add(index_type)
+        loop.create_task(self._compact(index_type, index))
+    
+    async def _compact(self, index_type: str, index: SegmentedIndex) -> None:
+        """Run the compaction of an index and save the result."""
+        try:
+            loop = asyncio.get_running_loop()
+            merged = False
+            while await loop.run_in_executor(None, index.compact):
+                merged = True
+            # El índice pudo reconstruirse por completo mientras tanto
+            if merged and self._get_index(index_type) is index:
+                self._save_index(index_type)
+        except Exception as e:
+            print(f"Error compacting index {index_type}: {e}")
+        finally:
+            self._compacting.discard(index_type)
+    
     async def get_all_documents(self) -> List[DocumentResponse]:
         """Get all documents from database."""
         db_docs = await Document.all().order_by("-created_at")
@@ -107,12 +250,75 @@ class IndexService:
     async def delete_document(self, document_id: str) -> bool:
         """Delete a document from database."""
         deleted_count = await Document.filter(id=document_id).delete()
+        self.forget_document(document_id)
         return deleted_count > 0
     
+    def track_documents(self, documents: List[Document]) -> None:
+        """
+        Record the metadata of new or changed documents for search filters.
+        
+        Args:
+            documents: Saved documents
+        """
+        rows = [
+            (str(doc.id), doc.title, doc.word_count, doc.size, doc.created_at)
+            for doc in documents
+        ]
+        if self._metadata.loaded:
+            self._metadata.put_many(rows)
+        elif self._metadata_changes is not None:
+            # La carga en curso puede no ver estas filas: se aplican al terminar
+            self._metadata_changes.extend((row[0], row) for row in rows)
+    
+    def forget_document(self, document_id: str) -> None:
+        """
+        Drop the metadata of a deleted document.
+        
+        Args:
+            document_id: Document identifier
+        """
+        if self._metadata.loaded:
+            self._metadata.remove(document_id)
+        elif self._metadata_changes is not None:
+            self._metadata_changes.append((document_id, None))
+    
+    async def _ensure_metadata_loaded(self) -> MetadataStore:
+        """Load the metadata of every document the first time a search is filtered."""
+        if not self._metadata.loaded:
+            # Las búsquedas que llegan durante la carga esperan a la misma
+            if self._metadata_load is None:
+                self._metadata_load = asyncio.ensure_future(self._load_metadata())
+            await asyncio.shield(self._metadata_load)
+        return self._metadata
+    
+    async def _load_metadata(self) -> None:
+        """
+        Read the metadata of every document into the store.
+        
+        Documents saved or deleted while the query runs may be missing from
+        its rows, so ``track_documents`` and ``forget_document`` buffer their
+        changes until the rows are in and then replay them in order.
+        """
+        self._metadata_changes = []
+        try:
+            rows = await Document.all().values_list("id", "title", "word_count", "size", "created_at")
+            self._metadata.put_many(rows)
+            for document_id, row in self._metadata_changes:
+                if row is None:
+                    self._metadata.remove(document_id)
+                else:
+                    self._metadata.put_many([row])
+            self._metadata.loaded = True
+        finally:
+            self._metadata_changes = None
+            self._metadata_load = None
+    
     async def create_index(
         self,
         index_type: str,
-        document_ids: Optional[List[str]] = None
+        document_ids: Optional[List[str]] = None,
+        mode: str = "full",
+        posting_format: Optional[str] = None
     ) -> bool:
         """
         Create an index from documents in database.
@@ -120,51 +326,65 @@ class IndexService:
         Args:
             index_type: Type of index (suffix or patricia)
             document_ids: Optional list of document IDs to index
+            mode: 'full' rebuilds the index from scratch; 'reconcile' only
+                processes the documents that changed since the last build
+            posting_format: 'set' or 'bitmap' (saved with the index); None
+                keeps the format of the current index. Changing it always
+                rebuilds the index in full
             
         Returns:
             True if successful
         """
         try:
-            # Get documents from database
+            if index_type not in (settings.INDEX_TYPE_SUFFIX, settings.INDEX_TYPE_PATRICIA):
+                return False
+            
+            # Get documents from database (only the columns needed to look up
+            # the term cache and to detect changes)
             if document_ids is None:
-                db_docs = await Document.all()
+                query = Document.all()
             else:
-                db_docs = await Document.filter(id__in=document_ids).all()
+                query = Document.filter(id__in=document_ids)
+            rows = await query.values("id", "title", "content_hash", "updated_at")
+            versions = {
+                str(row["id"]): self._document_version(row["content_hash"], row["updated_at"])
+                for row in rows
+            }
             
-            if not db_docs:
+            index = self._get_index(index_type)
+            if index is not None:
+                posting_format = posting_format or index.posting_format
+            if mode == "reconcile" and index is not None and posting_format == index.posting_format:
+                report = await self._reconcile_index(index, rows, versions, document_ids)
+                if report["added"] or report["updated"] or report["removed"]:
+                    self._save_index(index_type)
+                    self._schedule_compaction(index_type)
+                self.last_build[index_type] = report
+                return True
+            
+            if not rows:
                 return False
             
-            # Select the appropriate index
+            # Build the new index; the current one keeps serving until it is ready
+            segment_class = SuffixTreeIndex if index_type == settings.INDEX_TYPE_SUFFIX else PatriciaTreeIndex
+            index, document_count = await self._build_index(index_type, segment_class, rows, posting_format)
             if index_type == settings.INDEX_TYPE_SUFFIX:
-                self.suffix_index = SuffixTreeIndex()
-                index = self.suffix_index
-            elif index_type == settings.INDEX_TYPE_PATRICIA:
-                self.patricia_index = PatriciaTreeIndex()
-                index = self.patricia_index
+                self.suffix_index = index
             else:
-                return False
-            
-            # Process each document
-            for doc in db_docs:
-                doc_id = str(doc.id)
-                # Use extracted_text if available, otherwise try to decode content
-                content = doc.extracted_text
-                if not content:
-                    try:
-                        import base64
-                        content = base64.b64decode(doc.content).decode('utf-8')
-                    except:
-                        content = ""
-                
-                # Tokenize the document content
-                words = tokenize(content)
-                
-                # Add document to index
-                index.add_document(doc_id, words)
+                self.patricia_index = index
+            index.document_versions.update(versions)
             
             # Save index to disk after creation
             self._save_index(index_type)
             
+            self.last_build[index_type] = {
+                "mode": "full",
+                "added": document_count,
+                "updated": 0,
+                "removed": 0,
+                "unchanged": 0,
+                "finished_at": datetime.now().isoformat(),
+            }
             return True
         except Exception as e:
             print(f"Error creating index: {e}")
@@ -172,6 +392,299 @@ class IndexService:
             traceback.print_exc()
             return False
     
+    async def _reconcile_index(
+        self,
+        index: SegmentedIndex,
+        rows: List[Dict[str, Any]],
+        versions: Dict[str, str],
+        document_ids: Optional[List[str]]
+    ) -> Dict[str, Any]:
+        """
+        Bring an existing index up to date with the database.
+        
+        Args:
+            index: Index to update in place
+            rows: Current documents (``id``, ``title``, ``content_hash``, ``updated_at``)
+            versions: Current version of each document
+            document_ids: Documents in scope, or None for the whole corpus
+            
+        Returns:
+            Report with the number of added, updated, removed and unchanged documents
+        """
+        indexed = index.document_ids() | set(index.document_versions)
+        if document_ids is None:
+            removed = indexed - set(versions)
+        else:
+            # Solo se consideran eliminados los documentos pedidos que ya no existen
+            removed = (set(document_ids) & indexed) - set(versions)
+        added = set(versions) - indexed
+        updated = {
+            doc_id for doc_id in set(versions) & indexed
+            if index.document_versions.get(doc_id) != versions[doc_id]
+        }
+        
+        pending = [row for row in rows if str(row["id"]) in added | updated]
+        documents_terms = await self._get_documents_terms(pending) if pending else {}
+        
+        # Los cambios se publican juntos: una búsqueda nunca ve un documento a medio reemplazar
+        with index.batch():
+            index.remove_documents(list(removed | updated))
+            if pending:
+                index.add_documents(documents_terms)
+                for row in pending:
+                    index.document_versions[str(row["id"])] = versions[str(row["id"])]
+        
+        return {
+            "mode": "reconcile",
+            "added": len(added),
+            "updated": len(updated),
+            "removed": len(removed),
+            "unchanged": len(versions) - len(added) - len(updated),
+            "finished_at": datetime.now().isoformat(),
+        }
+    
+    @staticmethod
+    def _document_version(content_hash: Optional[str], updated_at: Optional[datetime]) -> str:
+        """Fingerprint used to detect documents that changed since they were indexed."""
+        timestamp = updated_at.isoformat() if updated_at else ""
+        return f"{content_hash or ''}:{timestamp}"
+    
+    def _get_index(self, index_type: str) -> Optional[SegmentedIndex]:
+        """Get the loaded index of a type, or None."""
+        if index_type == settings.INDEX_TYPE_SUFFIX:
+            return self.suffix_index
+        if index_type == settings.INDEX_TYPE_PATRICIA:
+            return self.patricia_index
+        return None
+    
+    def _document_text(self, doc: Document) -> str:
+        """Use extracted_text if available, otherwise try to decode the original blob."""
+        content = doc.extracted_text
+        if not content and doc.content_hash:
+            try:
+                content = (blob_store.read_bytes(doc.content_hash) or b"").decode('utf-8')
+            except UnicodeDecodeError:
+                content = ""
+        return content or ""
+    
+    def _cached_terms(self, key: Optional[str], text: str) -> List[str]:
+        """
+        Get the distinct terms of a text, using the term cache keyed by content.
+        
+        Args:
+            key: ``cache_key`` of the original file (None disables the cache)
+            text: Text to tokenize on a cache miss
+            
+        Returns:
+            List of distinct terms
+        """
+        frequencies = None
+        if key:
+            frequencies = content_cache.get_term_frequencies(key)
+        if frequencies is None:
+            # Los offsets se guardan en la misma pasada, para los fragmentos de búsqueda
+            frequencies, offsets = get_term_statistics(text)
+            if key:
+                content_cache.put_term_frequencies(key, frequencies)
+                content_cache.put_term_offsets(key, offsets)
+        return list(frequencies)
+    
+    async def _get_documents_terms(self, rows: List[Dict[str, Any]]) -> Dict[str, List[str]]:
+        """
+        Get the terms of each document, touching the text only on cache misses.
+        
+        Args:
+            rows: Documents as dicts with ``id``, ``title`` and ``content_hash``
+            
+        Returns:
+            Mapping of document ID to its distinct terms
+        """
+        return {
+            document_id: terms
+            async for document_id, terms in self._iter_documents_terms(rows)
+        }
+    
+    async def _iter_documents_terms(
+        self,
+        rows: List[Dict[str, Any]]
+    ) -> AsyncIterator[Tuple[str, List[str]]]:
+        """
+        Stream the terms of each document, touching the text only on cache misses.
+        
+        Documents missing from the term cache are loaded from the database in
+        batches of ``TEXT_BATCH_SIZE``, so only one batch of texts is in memory.
+        
+        Args:
+            rows: Documents as dicts with ``id``, ``title`` and ``content_hash``
+            
+        Yields:
+            Tuples of (document ID, distinct terms)
+        """
+        misses: List[str] = []
+        for row in rows:
+            frequencies = None
+            key = cache_key(row["content_hash"], row["title"])
+            if key:
+                frequencies = content_cache.get_term_frequencies(key)
+            if frequencies is None:
+                misses.append(str(row["id"]))
+            else:
+                yield str(row["id"]), list(frequencies)
+        
+        # Solo los documentos que no están en caché se cargan y se tokenizan
+        for start in range(0, len(misses), TEXT_BATCH_SIZE):
+            batch = await Document.filter(id__in=misses[start:start + TEXT_BATCH_SIZE])
+            for doc in batch:
+                yield str(doc.id), self._cached_terms(
+                    cache_key(doc.content_hash, doc.title),
+                    self._document_text(doc)
+                )
+    
+    async def _iter_document_batches(
+        self,
+        rows: List[Dict[str, Any]]
+    ) -> AsyncIterator[List[ShardDocument]]:
+        """
+        Stream the documents to index in batches of ``TEXT_BATCH_SIZE``.
+        
+        Only the documents missing from the term cache are loaded from the
+        database with their text, so at most one batch of texts is in memory.
+        
+        Args:
+            rows: Documents as dicts with ``id``, ``title`` and ``content_hash``
+            
+        Yields:
+            Batches of (document ID, cache key, text or None if its terms are cached)
+        """
+        for start in range(0, len(rows), TEXT_BATCH_SIZE):
+            batch: List[ShardDocument] = []
+            misses: List[str] = []
+            for row in rows[start:start + TEXT_BATCH_SIZE]:
+                key = cache_key(row["content_hash"], row["title"])
+                if key and content_cache.has_term_frequencies(key):
+                    batch.append((str(row["id"]), key, None))
+                else:
+                    misses.append(str(row["id"]))
+            if misses:
+                for doc in await Document.filter(id__in=misses):
+                    batch.append((str(doc.id), cache_key(doc.content_hash, doc.title), self._document_text(doc)))
+            yield batch
+    
+    @staticmethod
+    def _add_batch(builder: SpimiBuilder, batch: List[ShardDocument]) -> None:
+        """Tokenize a batch of documents and add its postings to the builder."""
+        builder.add_postings(build_shard(batch), len(batch))
+    
+    @staticmethod
+    def _add_shards(
+        builder: SpimiBuilder,
+        shards: List[List[ShardDocument]],
+        postings: List[Dict[str, List[str]]]
+    ) -> None:
+        """Add to the builder the postings the workers built for each shard of a batch."""
+        for shard, shard_postings in zip(shards, postings):
+            builder.add_postings(shard_postings, len(shard))
+    
+    async def _build_index(
+        self,
+        index_type: str,
+        segment_class: type,
+        rows: List[Dict[str, Any]],
+        posting_format: Optional[str] = None
+    ) -> Tuple[SegmentedIndex, int]:
+        """
+        Build a new index with the SPIMI builder, in bounded memory.
+        
+        Postings are written to disk in sorted runs whenever the memory
+        budget (``SPIMI_MAX_POSTINGS``) is reached, and the runs are merged
+        term by term into the segment file and the segment index at once,
+        so the corpus' postings are never held twice. Tokenizing, merging
+        and building the tree run in a worker thread, so the event loop keeps
+        serving requests; the new index is only published back on the loop.
+        
+        With ``INDEX_BUILD_WORKERS`` above 1, each batch of documents is
+        partitioned by ID hash and tokenized in that many processes; only
+        one batch of texts is in memory at a time either way.
+        
+        Args:
+            index_type: Type of index ('suffix' or 'patricia')
+            segment_class: Index class of the segments
+            rows: Documents to index (``id``, ``title`` and ``content_hash``)
+            posting_format: Posting format of the new index (``POSTING_FORMAT`` if None)
+            
+        Returns:
+            Tuple of (new index, number of documents indexed)
+        """
+        previous = self._get_index(index_type)
+        # El índice nuevo no reutiliza nombres de segmento del índice que reemplaza
+        index = SegmentedIndex(
+            segment_class,
+            first_segment=previous.next_segment if previous else 0,
+            posting_format=posting_format
+        )
+        index_dir = self._get_index_dir(index_type)
+        name = index.new_segment_name()
+        segment_path = index_dir / f"{name}.json"
+        
+        loop = asyncio.get_running_loop()
+        workers = settings.INDEX_BUILD_WORKERS
+        segment = segment_class(posting_format=index.posting_format)
+        with SpimiBuilder(self._indices_dir / f".{index_type}_runs") as builder:
+            # Solo la lectura de la base de datos corre en el event loop
+            async for batch in self._iter_document_batches(rows):
+                if workers > 1:
+                    shards: List[List[ShardDocument]] = [[] for _ in range(workers)]
+                    for document in batch:
+                        shards[shard_for(document[0], workers)].append(document)
+                    postings = await build_shards(shards)
+                    await loop.run_in_executor(None, self._add_shards, builder, shards, postings)
+                else:
+                    await loop.run_in_executor(None, self._add_batch, builder, batch)
+            await loop.run_in_executor(None, builder.write_segment, segment_path, segment.terms, segment)
+            document_count = builder.document_count
+        
+        index.add_segment(segment, name, persisted=True)
+        return index, document_count
+    
+    async def index_documents(self, documents: List[Document]) -> List[str]:
+        """
+        Add new documents to the indexes that already exist.
+        
+        Args:
+            documents: Documents to add
+            
+        Returns:
+            Types of the indexes that were updated
+        """
+        documents_words = {
+            str(doc.id): self._cached_terms(cache_key(doc.content_hash, doc.title), self._document_text(doc))
+            for doc in documents
+        }
+        # Las versiones se leen de la base de datos para que coincidan con
+        # las que compara el modo reconcile
+        rows = await Document.filter(id__in=list(documents_words)).values(
+            "id", "content_hash", "updated_at"
+        )
+        versions = {
+            str(row["id"]): self._document_version(row["content_hash"], row["updated_at"])
+            for row in rows
+        }
+        
+        updated = []
+        for index_type, index in (
+            (settings.INDEX_TYPE_SUFFIX, self.suffix_index),
+            (settings.INDEX_TYPE_PATRICIA, self.patricia_index),
+        ):
+            if index is None:
+                continue
+            index.add_documents(documents_words)
+            index.document_versions.update(versions)
+            self._save_index(index_type)
+            self._schedule_compaction(index_type)
+            updated.append(index_type)
+        
+        return updated
+    
     async def get_index_status(self, index_type: str) -> IndexStatusResponse:
         """Get the status of an index."""
         if index_type == settings.INDEX_TYPE_SUFFIX:
@@ -202,70 +715,437 @@ class IndexService:
             exists=True,
             word_count=stats.get("word_count"),
             document_count=stats.get("document_count"),
-            created_at=stats.get("created_at")
+            created_at=stats.get("created_at"),
+            posting_format=index.posting_format,
+            last_build=self.last_build.get(index_type)
         )
     
     async def search(
         self,
         query: str,
         index_type: str,
-        limit: int = 100
+        limit: int = 100,
+        filters: Optional[Dict[str, Any]] = None,
+        mode: str = SearchMode.DEFAULT,
+        max_distance: int = 1,
+        result_mode: str = SearchResultMode.DOCUMENTS,
+        snippets: int = 0
     ) -> SearchResponse:
-        """Search in the index."""
-        # Select the appropriate index
-        if index_type == settings.INDEX_TYPE_SUFFIX:
-            index = self.suffix_index
-        elif index_type == settings.INDEX_TYPE_PATRICIA:
-            index = self.patricia_index
-        else:
-            return SearchResponse(
-                query=query,
-                results=[],
-                total_results=0,
-                index_type=index_type
-            )
+        """
+        Search in the index.
         
-        if index is None:
-            # Return empty results instead of error - better UX
-            return SearchResponse(
-                query=query,
-                results=[],
-                total_results=0,
-                index_type=index_type
+        Metadata filters are applied to the matches in memory, before they
+        are ranked and before any database access.
+        
+        Args:
+            query: Search query
+            index_type: Type of index ('suffix' or 'patricia'), or 'auto' to let
+                the query planner pick the cheapest built index for the query
+            limit: Maximum number of results
+            filters: Conditions on document metadata (see ``MetadataStore.filter``)
+            mode: 'default' (substring or prefix, by index type), 'fuzzy',
+                'wildcard' or 'regex' (the query is a pattern of whole words)
+            max_distance: Maximum edit distance of the words matched in fuzzy mode
+            result_mode: 'documents' (ranked results), 'count' (only the number
+                of matching documents, without ranking or database access) or
+                'estimate' (an approximate count from HyperLogLog sketches;
+                exact when there are filters or no large postings)
+            snippets: Number of top results that include snippets of their
+                text, with the matched words highlighted
+        
+        Returns:
+            Ranked search results
+        
+        Raises:
+            ValueError: If the query is not a valid pattern in wildcard or regex mode
+        """
+        responses = await self.search_batch([{
+            "query": query,
+            "index_type": index_type,
+            "limit": limit,
+            "filters": filters,
+            "mode": mode,
+            "max_distance": max_distance,
+            "result_mode": result_mode,
+            "snippets": snippets
+        }])
+        return responses[0]
+    
+    async def search_batch(self, queries: List[Dict[str, Any]]) -> List[SearchResponse]:
+        """
+        Run many searches sharing their work.
+        
+        All the searches on an index read the same snapshot of it, queries
+        that normalize to the same search are evaluated once, the words of
+        each matched document are read once for all the rankings, and the
+        titles of every result (and the texts of those that get snippets)
+        are fetched in a single query.
+        
+        Args:
+            queries: Arguments of ``search`` for each query (query and
+                index_type required)
+        
+        Returns:
+            One response per query, in the same order
+        
+        Raises:
+            ValueError: If a query is not a valid pattern in wildcard or regex mode
+        """
+        views: Dict[str, Tuple[IndexSnapshot, DocumentTermsCache]] = {}
+        evaluated: Dict[Tuple, Tuple[str, Optional[QueryPlan], Tuple[List[RankedDocument], Optional[int], bool]]] = {}
+        outcomes = []
+        for position, options in enumerate(queries):
+            # The query goes through the same analyzer as the documents
+            term = normalize_query(options["query"])
+            index_type = options["index_type"]
+            limit = options.get("limit", 100)
+            filters = options.get("filters") or None
+            mode = options.get("mode", SearchMode.DEFAULT)
+            max_distance = options.get("max_distance", 1)
+            result_mode = options.get("result_mode", SearchResultMode.DOCUMENTS)
+            key = (
+                term,
+                index_type,
+                # Solo se comparte una búsqueda que lee las mismas versiones de los índices
+                self._snapshot_views(views, index_type),
+                limit,
+                tuple(sorted(filters.items())) if filters else None,
+                mode,
+                max_distance,
+                result_mode
             )
+            if key not in evaluated:
+                try:
+                    # Una búsqueda idéntica en curso (de otra petición) se comparte
+                    evaluated[key] = await self._search_flight.do(key, lambda: self._rank_query(
+                        views, term, index_type, limit, filters, mode, max_distance, result_mode
+                    ))
+                except ValueError as e:
+                    raise ValueError(f"Query {position}: {e}") if len(queries) > 1 else e
+            outcomes.append(evaluated[key])
         
-        # Perform search
-        matching_doc_ids = index.search(query)
+        # Get the titles of the documents of every result in one query
+        document_ids = {doc_id for _, _, (ranked, _, _) in evaluated.values() for doc_id, _, _ in ranked}
+        titles = dict(
+            await Document.filter(id__in=list(document_ids)).values_list("id", "title")
+        ) if document_ids else {}
+        titles = {str(doc_id): title for doc_id, title in titles.items()}
         
         # Build results
-        results: List[SearchResult] = []
-        for doc_id in matching_doc_ids[:limit]:
-            # Get document from database
-            doc = await Document.get_or_none(id=doc_id)
-            if not doc:
+        responses = []
+        for options, (index_type, plan, (ranked, counted, estimated)) in zip(queries, outcomes):
+            results: List[SearchResult] = []
+            for doc_id, matching_words, relevance in ranked:
+                if doc_id not in titles:
+                    continue
+                results.append(SearchResult(
+                    document_id=doc_id,
+                    document_title=titles[doc_id],
+                    matches=matching_words,
+                    relevance_score=relevance
+                ))
+            responses.append(SearchResponse(
+                query=options["query"],
+                results=results,
+                total_results=len(results) if counted is None else counted,
+                estimated=estimated,
+                index_type=index_type,
+                plan=SearchPlan(
+                    kind=plan.kind,
+                    index_type=plan.index_type,
+                    fallback=plan.fallback
+                ) if plan is not None else None
+            ))
+        
+        # Fragmentos del texto solo para los mejores resultados que los pidan
+        wanted = [
+            (result, tuple(result.matches))
+            for options, response in zip(queries, responses)
+            for result in response.results[:min(options.get("snippets", 0), settings.SEARCH_MAX_SNIPPET_RESULTS)]
+        ]
+        if wanted:
+            snippets = await self._get_snippets({(result.document_id, words) for result, words in wanted})
+            for result, words in wanted:
+                result.snippets = [
+                    SearchSnippet(text=text, highlights=highlights)
+                    for text, highlights in snippets.get((result.document_id, words), [])
+                ]
+        return responses
+    
+    async def _get_snippets(
+        self,
+        wanted: Set[Tuple[str, Tuple[str, ...]]]
+    ) -> Dict[Tuple[str, Tuple[str, ...]], List[Snippet]]:
+        """
+        Build the snippets of several documents, loading their texts in one query.
+        
+        Args:
+            wanted: Pairs of (document ID, matched words to highlight)
+        
+        Returns:
+            Snippets of each pair
+        """
+        documents = {
+            str(doc.id): doc
+            for doc in await Document.filter(
+                id__in=list({document_id for document_id, _ in wanted})
+            ).only("id", "title", "content_hash", "extracted_text")
+        }
+        return await self._search_executor.run(self._build_snippets, documents, wanted)
+    
+    def _build_snippets(
+        self,
+        documents: Dict[str, Document],
+        wanted: Set[Tuple[str, Tuple[str, ...]]]
+    ) -> Dict[Tuple[str, Tuple[str, ...]], List[Snippet]]:
+        """
+        Cut snippets around the matched words, from their cached offsets.
+        
+        Offsets are computed when a document is indexed; documents tokenized
+        before offsets were cached are tokenized once more here, and their
+        offsets cached.
+        
+        Args:
+            documents: Loaded documents by ID
+            wanted: Pairs of (document ID, matched words to highlight)
+        
+        Returns:
+            Snippets of each pair
+        """
+        texts: Dict[str, str] = {}
+        offsets: Dict[str, Dict[str, List[List[int]]]] = {}
+        snippets = {}
+        for document_id, words in wanted:
+            doc = documents.get(document_id)
+            if doc is None:
                 continue
-            
-            # Find matching words
-            words_in_doc = index.get_words_for_document(doc_id)
-            matching_words = [
-                word for word in words_in_doc 
-                if query.lower() in word.lower()
+            if document_id not in texts:
+                texts[document_id] = self._document_text(doc)
+                key = cache_key(doc.content_hash, doc.title)
+                term_offsets = content_cache.get_term_offsets(key) if key else None
+                if term_offsets is None:
+                    _, term_offsets = get_term_statistics(texts[document_id])
+                    if key:
+                        content_cache.put_term_offsets(key, term_offsets)
+                offsets[document_id] = term_offsets
+            spans = [
+                (start, end)
+                for word in words
+                for start, end in offsets[document_id].get(word, ())
             ]
-            
-            result = SearchResult(
-                document_id=doc_id,
-                document_title=doc.title,
-                matches=matching_words[:10],  # Limit matches
-                relevance_score=len(matching_words) / max(len(words_in_doc), 1)
+            snippets[(document_id, words)] = build_snippets(
+                texts[document_id], spans, settings.SEARCH_SNIPPET_LENGTH, settings.SEARCH_SNIPPETS_PER_RESULT
             )
-            results.append(result)
+        return snippets
+    
+    def _snapshot_views(
+        self,
+        views: Dict[str, Tuple[IndexSnapshot, DocumentTermsCache]],
+        index_type: str
+    ) -> Tuple[Optional[int], ...]:
+        """
+        Take the snapshots of the indexes a query may read, once per batch.
         
-        return SearchResponse(
-            query=query,
-            results=results,
-            total_results=len(results),
-            index_type=index_type
+        Args:
+            views: Snapshot of each index shared by the queries of a batch
+            index_type: Type of index, or 'auto' (it may read either index)
+        
+        Returns:
+            Identity of each snapshot (None for an index that is not loaded);
+            queries that read other versions of an index get other identities
+        """
+        if index_type == settings.INDEX_TYPE_AUTO:
+            names: Tuple[str, ...] = (settings.INDEX_TYPE_SUFFIX, settings.INDEX_TYPE_PATRICIA)
+        else:
+            names = (index_type,)
+        identity = []
+        for name in names:
+            if name not in views:
+                index = self._get_index(name)
+                if index is None:
+                    identity.append(None)
+                    continue
+                view = index.snapshot()
+                views[name] = (view, DocumentTermsCache(view))
+            # La búsqueda en curso guarda ``views``: el snapshot vive y su id no se reutiliza
+            identity.append(id(views[name][0]))
+        return tuple(identity)
+    
+    async def _rank_query(
+        self,
+        views: Dict[str, Tuple[IndexSnapshot, DocumentTermsCache]],
+        term: str,
+        index_type: str,
+        limit: int,
+        filters: Optional[Dict[str, Any]],
+        mode: str,
+        max_distance: int,
+        result_mode: str
+    ) -> Tuple[str, Optional[QueryPlan], Tuple[List[RankedDocument], Optional[int], bool]]:
+        """
+        Find and rank (or count) the documents of one normalized query.
+        
+        Args:
+            views: Snapshot of each index (with its cache of document terms)
+                shared by the queries of a batch; filled on first use
+            term: Normalized query
+            index_type: Type of index, or 'auto'
+            limit: Maximum number of results
+            filters: Conditions on document metadata
+            mode: Search mode
+            max_distance: Maximum edit distance in fuzzy mode
+            result_mode: 'documents', 'count' or 'estimate'
+        
+        Returns:
+            Index type used, query plan (for 'auto') and the outcome of
+            ``_evaluate_query``
+        """
+        # Select the appropriate index
+        plan = None
+        if index_type == settings.INDEX_TYPE_AUTO and term:
+            available = [
+                name for name in (settings.INDEX_TYPE_SUFFIX, settings.INDEX_TYPE_PATRICIA)
+                if self._get_index(name) is not None
+            ]
+            plan = plan_query(term, mode, available)
+            if plan is not None:
+                index_type = plan.index_type
+        index = self._get_index(index_type)
+        
+        # Return empty results instead of error - better UX
+        if index is None or not term:
+            counted = 0 if result_mode != SearchResultMode.DOCUMENTS else None
+            return index_type, plan, ([], counted, False)
+        
+        if (
+            settings.SEARCH_SHARDS > 0 and not filters and mode == SearchMode.DEFAULT
+            and plan is None and result_mode == SearchResultMode.DOCUMENTS
+        ):
+            return index_type, plan, (await self._search_shards(index_type, term, limit), None, False)
+        
+        # Búsqueda y ranking sobre la misma versión del índice
+        # (los shards solo hacen búsquedas simples, sin metadatos)
+        if index_type not in views:
+            view = index.snapshot()
+            views[index_type] = (view, DocumentTermsCache(view))
+        view, document_terms = views[index_type]
+        metadata = await self._ensure_metadata_loaded() if filters else None
+        # El trabajo de CPU corre en el pool acotado, fuera del event loop
+        outcome = await self._search_executor.run(
+            self._evaluate_query,
+            view, document_terms, term, plan, limit, filters, metadata, mode, max_distance, result_mode
+        )
+        return index_type, plan, outcome
+    
+    @staticmethod
+    def _query_words(
+        view: IndexSnapshot,
+        term: str,
+        plan: Optional[QueryPlan],
+        mode: str,
+        max_distance: int
+    ) -> Optional[Set[str]]:
+        """
+        Find the indexed words a query matches, for the modes that match whole words.
+        
+        Args:
+            view: Snapshot of the index
+            term: Normalized query
+            plan: Query plan, for index type 'auto'
+            mode: Search mode
+            max_distance: Maximum edit distance in fuzzy mode
+        
+        Returns:
+            Set of words, or None when the index structure matches the query
+            directly (default mode: substring or prefix)
+        """
+        if plan is not None and plan.kind == QUERY_EXACT:
+            # Palabra completa: una sola búsqueda en el diccionario de términos
+            return {term}
+        if mode == SearchMode.FUZZY:
+            return view.fuzzy_terms(term, max_distance)
+        if plan is not None or mode in (SearchMode.WILDCARD, SearchMode.REGEX):
+            pattern = plan.pattern if plan is not None else parse_pattern(term, mode)
+            return view.pattern_terms(pattern)
+        return None
+    
+    @classmethod
+    def _evaluate_query(
+        cls,
+        view: IndexSnapshot,
+        document_terms: DocumentTermsCache,
+        term: str,
+        plan: Optional[QueryPlan],
+        limit: int,
+        filters: Optional[Dict[str, Any]],
+        metadata: Optional[MetadataStore],
+        mode: str,
+        max_distance: int,
+        result_mode: str
+    ) -> Tuple[List[RankedDocument], Optional[int], bool]:
+        """
+        Match and rank a query on a snapshot (runs in a search worker thread).
+        
+        Args:
+            view: Snapshot of the index
+            document_terms: Cache of the term IDs of the snapshot's documents
+            term: Normalized query
+            plan: Query plan, for index type 'auto'
+            limit: Maximum number of results
+            filters: Conditions on document metadata
+            metadata: Loaded metadata store (when there are filters)
+            mode: Search mode
+            max_distance: Maximum edit distance in fuzzy mode
+            result_mode: 'documents', 'count' or 'estimate'
+        
+        Returns:
+            Ranked documents (only in 'documents' mode), number of matching
+            documents (None in 'documents' mode) and whether it is an estimate
+        """
+        words = cls._query_words(view, term, plan, mode, max_distance)
+        if result_mode == SearchResultMode.ESTIMATE and metadata is None:
+            # Sin unir las postings: sketches HyperLogLog de los términos grandes
+            estimate, estimated = view.estimate(term) if words is None else view.estimate_words(words)
+            return [], round(estimate), estimated
+        
+        matches = view.search(term) if words is None else view.search_words(words)
+        if metadata is not None and matches:
+            matches = metadata.filter(matches, **filters)
+        if result_mode != SearchResultMode.DOCUMENTS:
+            return [], len(matches), False
+        is_match = words.__contains__ if words is not None else None
+        return rank_documents(document_terms, term, matches, limit, is_match), None, False
+    
+    async def _search_shards(self, index_type: str, term: str, limit: int) -> List[RankedDocument]:
+        """
+        Search the shard processes, making them load the latest saved index first.
+        
+        Args:
+            index_type: Type of index ('suffix' or 'patricia')
+            term: Normalized query
+            limit: Maximum number of results
+            
+        Returns:
+            Ranked documents, best first
+        """
+        if self._shard_pool is None:
+            self._shard_pool = ShardPool(settings.SEARCH_SHARDS)
+        index = self._get_index(index_type)
+        await self._shard_pool.ensure_loaded(
+            index_type,
+            self._index_generations.get(index_type, 0),
+            index.segment_class.__name__,
+            str(self._get_index_dir(index_type).resolve()),
+            str(self._get_terms_path().resolve())
         )
+        return await self._shard_pool.search(index_type, term, limit)
+    
+    def shutdown(self) -> None:
+        """Stop the search shard processes and search threads, if they were started."""
+        if self._shard_pool is not None:
+            self._shard_pool.stop()
+            self._shard_pool = None
+        self._search_executor.shutdown()
     
     async def add_word_to_index(
         self,
@@ -284,46 +1164,65 @@ class IndexService:
         Returns:
             True if successful, False otherwise
         """
-        success = False
+        if not normalize_query(word):
+            return False
+        report = await self.update_words(
+            add=[(word, [document_id] if document_id is not None else None)],
+            index_type=index_type
+        )
+        return bool(report["index_types"])
+    
+    async def update_words(
+        self,
+        add: Optional[List[Tuple[str, Optional[List[str]]]]] = None,
+        delete: Optional[List[str]] = None,
+        index_type: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Add and delete many words in one pass.
         
-        # Get document IDs from database if needed
-        if document_id is None:
-            db_docs = await Document.all()
-            document_ids = [str(doc.id) for doc in db_docs]
-        else:
-            document_ids = [document_id]
+        Each index is updated in a single batch (one tree rebuild, one new
+        version) and saved once. Deletions are applied before additions.
+        
+        Args:
+            add: Pairs of (word, documents that get it); None means all documents
+            delete: Words to remove from the index
+            index_type: Optional index type ('suffix' or 'patricia'). If None, applies to both if they exist
+        
+        Returns:
+            Report with the number of words added and deleted, and the indexes modified
+        """
+        additions: Dict[str, Set[str]] = {}
+        for word, document_ids in add or []:
+            word = normalize_query(word)
+            if not word:
+                continue
+            if document_ids is None:
+                # Una sola posting que vale para todos los documentos, presentes y futuros
+                document_ids = [ALL_DOCUMENTS]
+            if document_ids:
+                additions.setdefault(word, set()).update(document_ids)
+        deletions = [word for word in map(normalize_query, delete or []) if word]
         
-        # If index_type is specified, add only to that index
         if index_type:
-            if index_type == settings.INDEX_TYPE_SUFFIX:
-                if self.suffix_index is not None:
-                    for doc_id in document_ids:
-                        self.suffix_index.add_word(word, doc_id)
-                    success = True
-                    # Save after modification
-                    self._save_index(index_type)
-            elif index_type == settings.INDEX_TYPE_PATRICIA:
-                if self.patricia_index is not None:
-                    for doc_id in document_ids:
-                        self.patricia_index.add_word(word, doc_id)
-                    success = True
-                    # Save after modification
-                    self._save_index(index_type)
+            index_types = [index_type]
         else:
-            # Add to both indexes if they exist (backward compatibility)
-            if self.suffix_index is not None:
-                for doc_id in document_ids:
-                    self.suffix_index.add_word(word, doc_id)
-                success = True
-                self._save_index(settings.INDEX_TYPE_SUFFIX)
-            
-            if self.patricia_index is not None:
-                for doc_id in document_ids:
-                    self.patricia_index.add_word(word, doc_id)
-                success = True
-                self._save_index(settings.INDEX_TYPE_PATRICIA)
+            index_types = [settings.INDEX_TYPE_SUFFIX, settings.INDEX_TYPE_PATRICIA]
         
-        return success
+        report: Dict[str, Any] = {"added": len(additions), "deleted": 0, "index_types": []}
+        for current_type in index_types:
+            index = self._get_index(current_type)
+            if index is None:
+                continue
+            with index.batch():
+                deleted = index.remove_words(deletions) if deletions else 0
+                if additions:
+                    index.add_words(additions)
+            report["deleted"] = max(report["deleted"], deleted)
+            report["index_types"].append(current_type)
+            # Save after modification
+            self._save_index(current_type)
+        return report
     
     async def delete_word_from_index(
         self,
@@ -342,7 +1241,7 @@ class IndexService:
         if index is None:
             return False
         
-        result = index.remove_word(word)
+        result = index.remove_word(normalize_query(word))
         
         # Save after modification
         if result:
@@ -0,0 +1,203 @@
+"""
+Multi-process search: documents are partitioned by ID hash across shard processes.
+"""
+import asyncio
+import multiprocessing
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.modules.ranking import RankedDocument, top_ranked
+from app.modules.sharded_build import shard_for
+
+
+def _load_partition(
+    index_class_name: str,
+    index_dir: str,
+    terms_path: str,
+    shard: int,
+    shard_count: int,
+    previous: Optional[Any] = None
+):
+    """
+    Load a saved index keeping only the documents of one shard.
+    
+    Each segment is filtered as it is read, so a shard only builds the
+    postings and tree of its own partition. Given the partition loaded
+    before, only the segments written since then and the memtable are
+    read; the other segments are kept and take the new tombstones.
+    """
+    from app.modules.segmented_index import SegmentedIndex
+    from app.modules.sharded_build import index_class_by_name
+    from app.utils.persistence import load_index_json
+    
+    terms = (load_index_json(terms_path) or {}).get("terms", [])
+    return SegmentedIndex.load(
+        index_dir,
+        index_class_by_name(index_class_name),
+        terms,
+        keep=lambda document_id: shard_for(document_id, shard_count) == shard,
+        previous=previous
+    )
+
+
+def _shard_main(conn, shard: int, shard_count: int) -> None:
+    """Entry point of a shard process: answers load and search requests."""
+    from app.modules.ranking import rank_documents
+    
+    indexes: Dict[str, Any] = {}
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            break
+        operation = message[0]
+        if operation == "stop":
+            break
+        try:
+            if operation == "load":
+                _, index_type, index_class_name, index_dir, terms_path = message
+                index = _load_partition(
+                    index_class_name, index_dir, terms_path, shard, shard_count, indexes.get(index_type)
+                )
+                if index is None:
+                    indexes.pop(index_type, None)
+                else:
+                    indexes[index_type] = index
+                conn.send(("ok", None))
+            elif operation == "search":
+                _, index_type, term, limit = message
+                index = indexes.get(index_type)
+                results = rank_documents(index, term, index.search(term), limit) if index else []
+                conn.send(("ok", results))
+            else:
+                conn.send(("error", f"Unknown operation {operation}"))
+        except Exception as e:
+            conn.send(("error", str(e)))
+    conn.close()
+
+
+class ShardPool:
+    """
+    Pool of search processes, each owning the documents of one hash partition.
+    
+    Searches are scattered to every shard and their top results gathered
+    and merged, so search throughput is not bound to one interpreter's GIL.
+    Shards load their partition from the saved index, rereading only the
+    segments saved since their last load; the pool tracks which version of
+    each index the shards hold.
+    """
+    
+    def __init__(self, shard_count: int):
+        """
+        Initialize the pool (processes start on first use).
+        
+        Args:
+            shard_count: Number of shard processes
+        """
+        self.shard_count = shard_count
+        self._processes: List[Any] = []
+        self._connections: List[Any] = []
+        # Una petición a la vez por proceso
+        self._locks: List[threading.Lock] = []
+        self._loaded: Dict[str, int] = {}
+        self._load_lock: Optional[asyncio.Lock] = None
+    
+    def start(self) -> None:
+        """Start the shard processes if they are not running."""
+        if self._processes:
+            return
+        ctx = multiprocessing.get_context("spawn")
+        for shard in range(self.shard_count):
+            parent_conn, child_conn = ctx.Pipe()
+            process = ctx.Process(
+                target=_shard_main, args=(child_conn, shard, self.shard_count), daemon=True
+            )
+            process.start()
+            child_conn.close()
+            self._processes.append(process)
+            self._connections.append(parent_conn)
+            self._locks.append(threading.Lock())
+    
+    def stop(self) -> None:
+        """Stop the shard processes."""
+        for conn, lock in zip(self._connections, self._locks):
+            with lock:
+                try:
+                    conn.send(("stop",))
+                except (OSError, EOFError):
+                    pass
+                conn.close()
+        for process in self._processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.kill()
+        self._processes = []
+        self._connections = []
+        self._locks = []
+        self._loaded = {}
+    
+    def _call(self, shard: int, message: Tuple) -> Any:
+        """Send a request to a shard and wait for its answer (blocking)."""
+        with self._locks[shard]:
+            try:
+                self._connections[shard].send(message)
+                status, result = self._connections[shard].recv()
+            except (OSError, EOFError):
+                raise RuntimeError(f"Search shard {shard} stopped")
+        if status != "ok":
+            raise RuntimeError(f"Search shard {shard} failed: {result}")
+        return result
+    
+    async def _broadcast(self, message: Tuple) -> List[Any]:
+        self.start()
+        loop = asyncio.get_running_loop()
+        return await asyncio.gather(*(
+            loop.run_in_executor(None, self._call, shard, message)
+            for shard in range(self.shard_count)
+        ))
+    
+    async def ensure_loaded(
+        self,
+        index_type: str,
+        version: int,
+        index_class_name: str,
+        index_dir: str,
+        terms_path: str
+    ) -> None:
+        """
+        Make every shard load a saved index, unless they already hold this version.
+        
+        Args:
+            index_type: Type of index ('suffix' or 'patricia')
+            version: Version of the saved index
+            index_class_name: Index class of its segments
+            index_dir: Directory of the saved index
+            terms_path: Path of the saved term dictionary
+        """
+        if self._loaded.get(index_type) == version:
+            return
+        if self._load_lock is None:
+            self._load_lock = asyncio.Lock()
+        async with self._load_lock:
+            if self._loaded.get(index_type) == version:
+                return
+            await self._broadcast(("load", index_type, index_class_name, index_dir, terms_path))
+            self._loaded[index_type] = version
+    
+    async def search(self, index_type: str, term: str, limit: int) -> List[RankedDocument]:
+        """
+        Search every shard and merge their best results.
+        
+        Args:
+            index_type: Type of index ('suffix' or 'patricia')
+            term: Normalized query
+            limit: Maximum number of results
+        
+        Returns:
+            Ranked documents, best first
+        """
+        results = await self._broadcast(("search", index_type, term, limit))
+        return top_ranked(
+            [(doc_id, matches, score) for shard_results in results for doc_id, matches, score in shard_results],
+            limit
+        )
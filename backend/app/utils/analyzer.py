@@ -0,0 +1,305 @@
+"""
+Text analysis pipeline used to turn documents and queries into index terms.
+
+The analyzer works as a chain applied to each word as it is found:
+Unicode NFKC normalization, case folding, accent folding, stopword filtering
+and optional stemming. Tokenization is generator based and accepts text in
+chunks, so memory stays flat regardless of the document size.
+"""
+import re
+import unicodedata
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, FrozenSet, Iterable, Iterator, List, Optional, Tuple, Union
+
+from app.core.config import settings
+
+# Incrementar cuando cambie el comportamiento del pipeline
+ANALYZER_VERSION = "4"
+
+WORD_RE = re.compile(r"\w+")
+
+SPANISH_STOPWORDS = frozenset("""
+a al algo algunas algunos ante antes como con contra cual cuando de del desde donde
+durante e el ella ellas ellos en entre era eran es esa esas ese eso esos esta estaba
+estas este esto estos fue fueron ha han hasta hay la las le les lo los mas me mi mis
+mucho muy ni no nos o os otra otras otro otros para pero poco por porque que quien se
+sea ser si sin sobre son su sus tambien te tiene tienen tu tus un una unas uno unos y ya yo
+""".split())
+
+ENGLISH_STOPWORDS = frozenset("""
+a an and are as at be but by for from has have he her his i in is it its of on or our
+she that the their them they this to was we were will with you your
+""".split())
+
+DEFAULT_STOPWORDS = SPANISH_STOPWORDS | ENGLISH_STOPWORDS
+
+_VOWELS = frozenset("aeiou")
+
+# Consonantes con las que termina un singular español que hace el plural en -es
+# (papel, flor, canción, ciudad, reloj, rey)
+_SINGULAR_CONSONANTS = frozenset("lnrdjy")
+
+
+@dataclass(frozen=True)
+class Token:
+    """A term produced by the analyzer."""
+    term: str
+    position: int  # Posición de la palabra en el documento (cuenta también las stopwords)
+    start: int  # Offset del primer carácter en el texto original
+    end: int  # Offset posterior al último carácter en el texto original
+
+
+def fold_accents(text: str) -> str:
+    """
+    Remove diacritics (``canción`` -> ``cancion``), keeping ``ñ``.
+    
+    Args:
+        text: Lowercase text
+    
+    Returns:
+        Text without accents
+    """
+    decomposed = unicodedata.normalize("NFD", text)
+    folded = []
+    for char in decomposed:
+        if unicodedata.combining(char):
+            # La tilde de la ñ distingue palabras en español (año/ano)
+            if char == "̃" and folded and folded[-1] == "n":
+                folded.append(char)
+            continue
+        folded.append(char)
+    return unicodedata.normalize("NFC", "".join(folded))
+
+
+@lru_cache(maxsize=100_000)
+def light_stem(term: str) -> str:
+    """
+    Light plural stemmer for Spanish and English terms.
+    
+    Only plural endings are removed (``canciones`` -> ``cancion``,
+    ``luces`` -> ``luz``, ``gatos`` -> ``gato``), which keeps the stems
+    readable and prefix/substring queries predictable. Results are memoized
+    because the same terms repeat across documents.
+    
+    A plural loses its ``-es`` only where the singular ends in a consonant
+    (``flores`` -> ``flor``) and ``-ces`` becomes ``z`` only after
+    ``e``/``o``/``u`` (``veces``, ``voces``, ``luces``); every other plural
+    just loses its ``s`` (``partes``, ``times``, ``places``). Endings shared
+    by both languages follow Spanish: ``lines`` gives ``lin`` like
+    ``canciones`` gives ``cancion``, while ``line`` stays ``line``.
+    
+    Args:
+        term: Normalized term
+    
+    Returns:
+        Stemmed term
+    """
+    if len(term) <= 3 or not term.isalpha() or not term.endswith("s") or term.endswith("ss"):
+        return term
+    if len(term) > 4 and term.endswith("es"):
+        # -aces/-ices son también plurales ingleses de -ace/-ice (places, prices)
+        if term[-3] == "c" and term[-4] in "eou" and term[-5] not in _VOWELS:
+            return term[:-3] + "z"
+        # Solo si el singular termina en consonante: partes es parte+s, no part+es
+        if term[-3] in _SINGULAR_CONSONANTS and term[-4] in _VOWELS:
+            return term[:-2]
+    if term[-2] in _VOWELS:
+        return term[:-1]
+    return term
+
+
+class Analyzer:
+    """
+    Configurable analyzer chain.
+    
+    Terms are produced in a single pass over the text, with their position
+    and character offsets, so callers can count frequencies or store
+    positions without re-tokenizing.
+    """
+    
+    def __init__(
+        self,
+        normalize: bool = True,
+        fold_accents: bool = True,
+        stopwords: Optional[Iterable[str]] = None,
+        stem: bool = False,
+        min_length: int = 1,
+        max_length: int = 64
+    ):
+        """
+        Initialize the analyzer.
+        
+        Args:
+            normalize: Apply Unicode NFKC normalization
+            fold_accents: Remove diacritics (except ``ñ``)
+            stopwords: Terms to drop, or None to keep every term
+            stem: Apply the light plural stemmer
+            min_length: Minimum term length
+            max_length: Maximum term length (longer words are dropped)
+        """
+        self.normalize = normalize
+        self.fold_accents = fold_accents
+        self.stopwords: FrozenSet[str] = frozenset(stopwords or ())
+        self.stem = stem
+        self.min_length = min_length
+        self.max_length = max_length
+    
+    @property
+    def version(self) -> str:
+        """Identifier of the pipeline and its configuration, for caches."""
+        return (
+            f"{ANALYZER_VERSION}-n{int(self.normalize)}f{int(self.fold_accents)}"
+            f"s{int(bool(self.stopwords))}t{int(self.stem)}"
+            f"l{self.min_length}-{self.max_length}"
+        )
+    
+    def normalize_word(self, word: str) -> List[str]:
+        """
+        Apply the character-level part of the chain to a raw word.
+        
+        Args:
+            word: Word as found in the text
+        
+        Returns:
+            Normalized pieces (NFKC may split a word, e.g. ``½`` -> ``1``, ``2``)
+        """
+        if word.isascii():
+            # Camino rápido: la mayoría de las palabras no necesita Unicode
+            return [word.lower()]
+        if self.normalize:
+            word = unicodedata.normalize("NFKC", word)
+        word = word.casefold()
+        if self.fold_accents:
+            word = fold_accents(word)
+        return WORD_RE.findall(word)
+    
+    def normalize_term(self, text: str) -> str:
+        """
+        Normalize a query or a curated word the same way indexed terms are.
+        
+        Stopword filtering is not applied, so any word can still be searched.
+        
+        Args:
+            text: Query or word
+        
+        Returns:
+            Normalized term
+        """
+        if not text.isascii():
+            if self.normalize:
+                text = unicodedata.normalize("NFKC", text)
+            text = text.casefold()
+            if self.fold_accents:
+                text = fold_accents(text)
+        else:
+            text = text.lower()
+        if self.stem:
+            text = light_stem(text)
+        return text
+    
+    def iter_tokens(self, text: Union[str, Iterable[str]]) -> Iterator[Token]:
+        """
+        Tokenize text lazily.
+        
+        Args:
+            text: Whole text, or an iterable of consecutive text chunks
+                (e.g. PDF pages); words split across chunks are rejoined
+        
+        Yields:
+            Tokens with positions and offsets relative to the whole text
+        """
+        chunks = (text,) if isinstance(text, str) else text
+        position = 0
+        carry = ""
+        carry_start = 0
+        offset = 0
+        for chunk in chunks:
+            if not chunk:
+                continue
+            buffer = carry + chunk
+            buffer_start = carry_start if carry else offset
+            carry = ""
+            for match in WORD_RE.finditer(buffer):
+                if match.end() == len(buffer):
+                    # La palabra puede continuar en el siguiente fragmento
+                    carry = match.group()
+                    carry_start = buffer_start + match.start()
+                    break
+                for token in self._emit(match.group(), position, buffer_start + match.start()):
+                    yield token
+                position += 1
+            offset += len(chunk)
+        if carry:
+            yield from self._emit(carry, position, carry_start)
+    
+    def _emit(self, word: str, position: int, start: int) -> Iterator[Token]:
+        end = start + len(word)
+        for term in self.normalize_word(word):
+            if term in self.stopwords:
+                continue
+            if self.stem:
+                term = light_stem(term)
+            if self.min_length <= len(term) <= self.max_length:
+                yield Token(term, position, start, end)
+    
+    def tokenize(self, text: Union[str, Iterable[str]]) -> List[str]:
+        """
+        Get the list of terms of a text.
+        
+        Args:
+            text: Whole text or iterable of chunks
+        
+        Returns:
+            Terms in document order
+        """
+        return [token.term for token in self.iter_tokens(text)]
+    
+    def term_frequencies(self, text: Union[str, Iterable[str]]) -> Dict[str, int]:
+        """
+        Count term occurrences in a single pass.
+        
+        Args:
+            text: Whole text or iterable of chunks
+        
+        Returns:
+            Mapping of term to number of occurrences
+        """
+        frequencies: Dict[str, int] = {}
+        for token in self.iter_tokens(text):
+            frequencies[token.term] = frequencies.get(token.term, 0) + 1
+        return frequencies
+    
+    def term_statistics(
+        self,
+        text: Union[str, Iterable[str]],
+        max_offsets: int
+    ) -> Tuple[Dict[str, int], Dict[str, List[Tuple[int, int]]]]:
+        """
+        Count term occurrences and record where they are, in a single pass.
+        
+        Args:
+            text: Whole text or iterable of chunks
+            max_offsets: Offsets kept per term (those of the first occurrences)
+        
+        Returns:
+            Tuple of (term -> number of occurrences, term -> character
+            offsets ``(start, end)`` of its occurrences in the text)
+        """
+        frequencies: Dict[str, int] = {}
+        offsets: Dict[str, List[Tuple[int, int]]] = {}
+        for token in self.iter_tokens(text):
+            count = frequencies.get(token.term, 0)
+            frequencies[token.term] = count + 1
+            if count < max_offsets:
+                offsets.setdefault(token.term, []).append((token.start, token.end))
+        return frequencies, offsets
+
+
+# Analizador compartido, configurado desde settings
+default_analyzer = Analyzer(
+    fold_accents=settings.ANALYZER_FOLD_ACCENTS,
+    stopwords=DEFAULT_STOPWORDS if settings.ANALYZER_STOPWORDS else None,
+    stem=settings.ANALYZER_STEMMING,
+    min_length=settings.ANALYZER_MIN_TERM_LENGTH
+)
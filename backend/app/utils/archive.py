@@ -0,0 +1,104 @@
+"""
+Helpers to read the files contained in uploaded zip/tar archives.
+"""
+import os
+import tarfile
+import zipfile
+from typing import BinaryIO, Iterator, List, Optional, Tuple
+
+ARCHIVE_EXTENSIONS = (".zip", ".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tbz2", ".tar.xz", ".txz")
+
+
+def is_archive(filename: str) -> bool:
+    """Check whether a file name looks like a supported archive."""
+    return filename.lower().endswith(ARCHIVE_EXTENSIONS)
+
+
+class ArchiveTooLargeError(ValueError):
+    """An archive member, or the whole archive, is larger than allowed once uncompressed."""
+
+
+class _BoundedReader:
+    """Reader of an archive member that fails once a size limit is passed."""
+    
+    def __init__(
+        self,
+        member: BinaryIO,
+        name: str,
+        max_member_size: Optional[int],
+        total: List[int],
+        max_total_size: Optional[int]
+    ):
+        self._member = member
+        self._name = name
+        self._max_member_size = max_member_size
+        self._read = 0
+        # Lista de un elemento: bytes leídos de todo el archivo, compartidos entre miembros
+        self._total = total
+        self._max_total_size = max_total_size
+    
+    def read(self, size: int = -1) -> bytes:
+        # Se cuenta lo que se descomprime de verdad: los tamaños declarados pueden mentir
+        chunk = self._member.read(size)
+        self._read += len(chunk)
+        self._total[0] += len(chunk)
+        if self._max_member_size is not None and self._read > self._max_member_size:
+            raise ArchiveTooLargeError(
+                f"Archive member '{self._name}' is larger than {self._max_member_size} bytes"
+            )
+        if self._max_total_size is not None and self._total[0] > self._max_total_size:
+            raise ArchiveTooLargeError(f"Archive is larger than {self._max_total_size} bytes uncompressed")
+        return chunk
+
+
+def _is_ignored(name: str) -> bool:
+    """Skip metadata entries added by archivers (e.g. ``__MACOSX``, dotfiles)."""
+    parts = name.replace("\\", "/").split("/")
+    return any(part.startswith(".") or part == "__MACOSX" for part in parts if part)
+
+
+def iter_archive_members(
+    fileobj: BinaryIO,
+    filename: str,
+    max_member_size: Optional[int] = None,
+    max_total_size: Optional[int] = None
+) -> Iterator[Tuple[str, BinaryIO]]:
+    """
+    Iterate over the regular files of an archive.
+
+    Args:
+        fileobj: Seekable binary file object with the archive
+        filename: Archive file name (selects zip or tar)
+        max_member_size: Maximum uncompressed bytes read from one member
+        max_total_size: Maximum uncompressed bytes read from the whole archive
+
+    Yields:
+        Tuples of (member base name, readable file object)
+
+    Raises:
+        ArchiveTooLargeError: While reading a member, if a limit is passed
+    """
+    total = [0]
+    for name, member in _iter_members(fileobj, filename):
+        yield name, _BoundedReader(member, name, max_member_size, total, max_total_size)
+
+
+def _iter_members(fileobj: BinaryIO, filename: str) -> Iterator[Tuple[str, BinaryIO]]:
+    """Iterate over the regular files of a zip or tar archive, without limits."""
+    if filename.lower().endswith(".zip"):
+        with zipfile.ZipFile(fileobj) as archive:
+            for info in archive.infolist():
+                if info.is_dir() or _is_ignored(info.filename):
+                    continue
+                with archive.open(info) as member:
+                    yield os.path.basename(info.filename), member
+    else:
+        with tarfile.open(fileobj=fileobj, mode="r:*") as archive:
+            for info in archive:
+                if not info.isfile() or _is_ignored(info.name):
+                    continue
+                member = archive.extractfile(info)
+                if member is None:
+                    continue
+                with member:
+                    yield os.path.basename(info.name), member
@@ -0,0 +1,264 @@
+"""
+Content-addressed storage for original uploaded files.
+
+Each blob is stored once on disk under its SHA-256 hash, so identical uploads
+are deduplicated and the database only keeps the hash, size and MIME type.
+"""
+import hashlib
+import itertools
+import mimetypes
+import os
+import tempfile
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterable, Optional
+
+from app.core.config import settings
+
+
+@dataclass(frozen=True)
+class StoredBlob:
+    """Result of storing a blob."""
+    content_hash: str
+    size: int
+
+
+class BlobStore:
+    """
+    Content-addressed blob store on the local filesystem.
+    
+    Blobs live in ``<root>/<first two hex chars>/<sha256>``. Writes are
+    streamed to a temporary file while hashing and then atomically moved
+    into place, so memory use does not depend on the file size.
+    
+    Every ``put_*`` pins the blob until the caller ``release``-s it, once
+    the row that references it is saved (or the upload failed). A pinned
+    blob, or one stored again since its references were checked, is never
+    deleted, so a concurrent upload of the same bytes cannot lose its blob.
+    """
+    
+    def __init__(self, root: str, chunk_size: int = 1024 * 1024):
+        """
+        Initialize the blob store.
+        
+        Args:
+            root: Directory where blobs are stored
+            chunk_size: Size of the chunks used when streaming data
+        """
+        self.root = Path(root)
+        self.chunk_size = chunk_size
+        # Hash -> número de subidas en curso que lo usan
+        self._pins: Dict[str, int] = {}
+        # Hash -> generación de la última vez que se guardó (única en el proceso)
+        self._generations: Dict[str, int] = {}
+        self._counter = itertools.count(1)
+        self._lock = threading.Lock()
+    
+    def path_for(self, content_hash: str) -> Path:
+        """Get the file path for a blob hash."""
+        return self.root / content_hash[:2] / content_hash
+    
+    def exists(self, content_hash: str) -> bool:
+        """Check whether a blob is stored."""
+        return self.path_for(content_hash).is_file()
+    
+    def _open_temp(self):
+        """Create a temporary file inside the store (same filesystem as blobs)."""
+        tmp_dir = self.root / "tmp"
+        tmp_dir.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=tmp_dir)
+        return os.fdopen(fd, "wb"), tmp_path
+    
+    def _pin(self, content_hash: str) -> None:
+        """Pin a stored blob (the lock must be held)."""
+        self._pins[content_hash] = self._pins.get(content_hash, 0) + 1
+        self._generations[content_hash] = next(self._counter)
+    
+    def _commit(self, tmp_path: str, content_hash: str) -> None:
+        """Move a fully written temporary file to its final location and pin it."""
+        final_path = self.path_for(content_hash)
+        with self._lock:
+            if final_path.exists():
+                # Deduplicación: el contenido ya estaba almacenado
+                os.remove(tmp_path)
+            else:
+                final_path.parent.mkdir(parents=True, exist_ok=True)
+                os.replace(tmp_path, final_path)
+            self._pin(content_hash)
+    
+    def release(self, content_hashes: Iterable[str]) -> None:
+        """
+        Unpin blobs returned by ``put_*``.
+        
+        Args:
+            content_hashes: Hashes to unpin, once per ``put_*`` call
+        """
+        with self._lock:
+            for content_hash in content_hashes:
+                pins = self._pins.get(content_hash, 0) - 1
+                if pins > 0:
+                    self._pins[content_hash] = pins
+                else:
+                    self._pins.pop(content_hash, None)
+    
+    def generation(self, content_hash: str) -> int:
+        """
+        Get a number that changes every time a blob is stored.
+        
+        Read it before checking that no row references the blob and pass it
+        to ``delete``, so the blob is kept if it was stored again meanwhile.
+        
+        Args:
+            content_hash: SHA-256 of the blob
+        
+        Returns:
+            Generation of the blob (0 if it was not stored by this process)
+        """
+        with self._lock:
+            return self._generations.get(content_hash, 0)
+    
+    def put_fileobj(self, fileobj: BinaryIO) -> StoredBlob:
+        """
+        Store the contents of a binary file object.
+        
+        Args:
+            fileobj: Readable binary file object
+        
+        Returns:
+            Hash and size of the stored blob
+        """
+        digest = hashlib.sha256()
+        size = 0
+        out, tmp_path = self._open_temp()
+        try:
+            with out:
+                while True:
+                    chunk = fileobj.read(self.chunk_size)
+                    if not chunk:
+                        break
+                    digest.update(chunk)
+                    size += len(chunk)
+                    out.write(chunk)
+            content_hash = digest.hexdigest()
+            self._commit(tmp_path, content_hash)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return StoredBlob(content_hash=content_hash, size=size)
+    
+    def put_bytes(self, content: bytes) -> StoredBlob:
+        """
+        Store an in-memory byte string.
+        
+        Args:
+            content: Bytes to store
+        
+        Returns:
+            Hash and size of the stored blob
+        """
+        content_hash = hashlib.sha256(content).hexdigest()
+        with self._lock:
+            stored = self.exists(content_hash)
+            if stored:
+                self._pin(content_hash)
+        if not stored:
+            out, tmp_path = self._open_temp()
+            with out:
+                out.write(content)
+            self._commit(tmp_path, content_hash)
+        return StoredBlob(content_hash=content_hash, size=len(content))
+    
+    async def put_upload(self, upload) -> StoredBlob:
+        """
+        Stream an uploaded file into the store chunk by chunk.
+        
+        Args:
+            upload: Object with an async ``read(size)`` method (e.g. UploadFile)
+        
+        Returns:
+            Hash and size of the stored blob
+        """
+        import aiofiles
+        
+        digest = hashlib.sha256()
+        size = 0
+        out, tmp_path = self._open_temp()
+        out.close()
+        try:
+            async with aiofiles.open(tmp_path, "wb") as f:
+                while True:
+                    chunk = await upload.read(self.chunk_size)
+                    if not chunk:
+                        break
+                    digest.update(chunk)
+                    size += len(chunk)
+                    await f.write(chunk)
+            content_hash = digest.hexdigest()
+            self._commit(tmp_path, content_hash)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return StoredBlob(content_hash=content_hash, size=size)
+    
+    def read_bytes(self, content_hash: str) -> Optional[bytes]:
+        """
+        Read a whole blob into memory.
+        
+        Args:
+            content_hash: SHA-256 of the blob
+        
+        Returns:
+            Blob contents or None if it does not exist
+        """
+        path = self.path_for(content_hash)
+        if not path.is_file():
+            return None
+        return path.read_bytes()
+    
+    def delete(self, content_hash: str, generation: Optional[int] = None) -> bool:
+        """
+        Delete a blob from the store, unless an upload is using it.
+        
+        Args:
+            content_hash: SHA-256 of the blob
+            generation: ``generation`` read before checking the references;
+                the blob is kept if it was stored again since then
+        
+        Returns:
+            True if the blob existed and was removed
+        """
+        path = self.path_for(content_hash)
+        with self._lock:
+            if content_hash in self._pins:
+                return False
+            if generation is not None and self._generations.get(content_hash, 0) != generation:
+                return False
+            if not path.is_file():
+                return False
+            path.unlink()
+            self._generations.pop(content_hash, None)
+            return True
+
+
+def guess_mime_type(filename: str, declared: Optional[str] = None) -> str:
+    """
+    Pick the MIME type of an uploaded file.
+    
+    Args:
+        filename: Original file name
+        declared: MIME type sent by the client, if any
+    
+    Returns:
+        MIME type string
+    """
+    if declared and declared != "application/octet-stream":
+        return declared
+    guessed, _ = mimetypes.guess_type(filename)
+    return guessed or declared or "application/octet-stream"
+
+
+# Instancia compartida del blob store
+blob_store = BlobStore(settings.BLOBS_DIR, chunk_size=settings.UPLOAD_CHUNK_SIZE)
@@ -0,0 +1,96 @@
+"""
+Concurrency helpers for request handling: call coalescing and a bounded worker pool.
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls that compute the same result.
+    
+    The first caller with a key starts the computation; callers that
+    arrive with the same key while it is running wait for its result
+    instead of computing it again. Once it finishes, the next call with
+    that key starts a new computation (results are not cached).
+    """
+    
+    def __init__(self):
+        """Initialize with no calls in flight."""
+        self._calls: Dict[Hashable, "asyncio.Future[Any]"] = {}
+    
+    def __len__(self) -> int:
+        return len(self._calls)
+    
+    async def do(self, key: Hashable, compute: Callable[[], Awaitable[T]]) -> T:
+        """
+        Get the result of a computation, sharing it with concurrent callers.
+        
+        Args:
+            key: Identifies calls that produce the same result
+            compute: Starts the computation (only called if none is in flight)
+        
+        Returns:
+            Result of the computation (its exception is raised to every caller)
+        """
+        call = self._calls.get(key)
+        if call is None:
+            call = self._calls[key] = asyncio.ensure_future(compute())
+            call.add_done_callback(lambda done: self._forget(key, done))
+        # Si un llamador se cancela, la computación sigue para los demás
+        return await asyncio.shield(call)
+    
+    def _forget(self, key: Hashable, call: "asyncio.Future[Any]") -> None:
+        """Remove a finished call, unless another one took its key."""
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+
+class BoundedExecutor:
+    """
+    Thread pool that runs CPU-heavy work off the event loop.
+    
+    At most ``max_workers`` calls run at the same time; the rest wait in
+    the pool's queue, so a burst of requests cannot stall the event loop
+    or start an unbounded number of computations.
+    """
+    
+    def __init__(self, max_workers: int, name: str):
+        """
+        Initialize the pool (threads are started on demand).
+        
+        Args:
+            max_workers: Maximum number of calls running at once
+            name: Prefix of the thread names
+        """
+        self.max_workers = max_workers
+        self._name = name
+        self._executor: Optional[ThreadPoolExecutor] = None
+    
+    async def run(self, function: Callable[..., T], *args: Any) -> T:
+        """
+        Run a function in the pool.
+        
+        Args:
+            function: Function to run
+            args: Positional arguments
+        
+        Returns:
+            Return value of the function
+        """
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers,
+                thread_name_prefix=self._name
+            )
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, function, *args)
+    
+    def shutdown(self) -> None:
+        """Stop the pool threads once the calls already submitted finish."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
@@ -0,0 +1,159 @@
+"""
+Persistent cache of work derived from document contents.
+
+Entries are keyed by the SHA-256 of the original file and the extractor
+that reads it (the same bytes uploaded as ``.txt`` and ``.pdf`` give
+different texts), plus the version of the code that produced them, so
+duplicate uploads and index rebuilds can skip text extraction and
+tokenization of unchanged content.
+"""
+import json
+import os
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.utils.file_parser import EXTRACTOR_VERSION, extractor_kind
+from app.utils.text_processor import TOKENIZER_VERSION
+
+
+def _derived_version() -> str:
+    """Version of the entries derived from the extracted text (terms and offsets)."""
+    # Cambian con el extractor, que da el texto, y con el tokenizador
+    return f"{EXTRACTOR_VERSION}.{TOKENIZER_VERSION}"
+
+
+def cache_key(content_hash: Optional[str], filename: str) -> Optional[str]:
+    """
+    Build the cache key of a stored file.
+    
+    Args:
+        content_hash: SHA-256 of the original file
+        filename: Original file name (its extension selects the extractor)
+    
+    Returns:
+        ``<sha256>.<extractor>``, or None if the file has no hash
+    """
+    if not content_hash:
+        return None
+    return f"{content_hash}.{extractor_kind(filename)}"
+
+
+class ContentCache:
+    """
+    Filesystem cache for extracted text, term-frequency vectors and term offsets.
+    
+    Layout::
+        
+        <root>/text/v<extractor version>/<aa>/<sha256>.<extractor>.json
+        <root>/terms/v<extractor version>.<tokenizer version>/<aa>/<sha256>.<extractor>.json
+        <root>/offsets/v<extractor version>.<tokenizer version>/<aa>/<sha256>.<extractor>.json
+    
+    Terms and offsets are derived from the extracted text, so they are
+    keyed by extractor (see ``cache_key``) and versioned by both the
+    extractor and the tokenizer.
+    
+    Bumping a version makes the old entries unreachable.
+    """
+    
+    def __init__(self, root: str):
+        """
+        Initialize the cache.
+        
+        Args:
+            root: Directory where cache entries are stored
+        """
+        self.root = Path(root)
+    
+    def _path(self, kind: str, version: str, key: str) -> Path:
+        return self.root / kind / f"v{version}" / key[:2] / f"{key}.json"
+    
+    def _read(self, path: Path) -> Optional[Any]:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            print(f"Error reading cache entry {path}: {e}")
+            return None
+    
+    def _write(self, path: Path, data: Any) -> None:
+        # Escritura atómica: un lector nunca ve una entrada a medio escribir
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Error writing cache entry {path}: {e}")
+    
+    def get_text(self, key: str) -> Optional[Tuple[str, int]]:
+        """
+        Get the extracted text of a file.
+        
+        Args:
+            key: ``cache_key`` of the original file
+        
+        Returns:
+            Tuple of (text, word count), or None on a cache miss
+        """
+        data = self._read(self._path("text", EXTRACTOR_VERSION, key))
+        if data is None:
+            return None
+        return data["text"], data["word_count"]
+    
+    def put_text(self, key: str, text: str, word_count: int) -> None:
+        """Store the extracted text of a file."""
+        self._write(
+            self._path("text", EXTRACTOR_VERSION, key),
+            {"text": text, "word_count": word_count}
+        )
+    
+    def get_term_frequencies(self, key: str) -> Optional[Dict[str, int]]:
+        """
+        Get the term-frequency vector of a file's text.
+        
+        The terms come from the extracted text, so they depend on both the
+        extractor and the tokenizer versions.
+        
+        Args:
+            key: ``cache_key`` of the original file
+        
+        Returns:
+            Mapping of term to number of occurrences, or None on a cache miss
+        """
+        return self._read(self._path("terms", _derived_version(), key))
+    
+    def has_term_frequencies(self, key: str) -> bool:
+        """Check whether the term-frequency vector of a file is cached, without reading it."""
+        return self._path("terms", _derived_version(), key).exists()
+    
+    def put_term_frequencies(self, key: str, frequencies: Dict[str, int]) -> None:
+        """Store the term-frequency vector of a file's text."""
+        self._write(self._path("terms", _derived_version(), key), frequencies)
+    
+    def get_term_offsets(self, key: str) -> Optional[Dict[str, List[List[int]]]]:
+        """
+        Get where the terms of a file's text occur.
+        
+        Offsets refer to the extracted text, so they depend on both the
+        extractor and the tokenizer versions.
+        
+        Args:
+            key: ``cache_key`` of the original file
+        
+        Returns:
+            Mapping of term to ``[start, end]`` character offsets, or None on a cache miss
+        """
+        return self._read(self._path("offsets", _derived_version(), key))
+    
+    def put_term_offsets(self, key: str, offsets: Dict[str, List[Tuple[int, int]]]) -> None:
+        """Store where the terms of a file's text occur."""
+        self._write(self._path("offsets", _derived_version(), key), offsets)
+
+
+# Instancia compartida de la caché
+content_cache = ContentCache(settings.CACHE_DIR)
@@ -1,39 +1,178 @@
+import asyncio
+import codecs
 import io
-from typing import Optional
-import docx
-from pypdf import PdfReader
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import BinaryIO, Iterable, Iterator, Optional, Tuple, Union
+from app.core.config import settings
+
+# pypdf y python-docx se importan dentro de cada extractor: son dependencias
+# pesadas y solo se necesitan cuando realmente llega un PDF o un DOCX.
+
+TEXT_CHUNK_SIZE = 1024 * 1024
+
+# Incrementar cuando cambie el texto que producen los extractores
+EXTRACTOR_VERSION = "1"
 
 def extract_text_from_file(file_content: bytes, filename: str) -> str:
     """
     Extract text from a file based on its extension.
     Supported formats: .txt, .md, .docx, .pdf
     """
+    with io.BytesIO(file_content) as f:
+        return _extract(f, filename)[0]
+
+def extract_text_from_path(path: Union[str, Path], filename: str) -> str:
+    """
+    Extract text from a file stored on disk, without loading it into memory first.
+    The extension of ``filename`` (the original upload name) selects the parser.
+    """
+    return _extract_path(str(path), filename)[0]
+
+async def extract_text_async(
+    path: Union[str, Path],
+    filename: str,
+    timeout: Optional[float] = None
+) -> Tuple[str, int]:
+    """
+    Extract text off the event loop, returning the text and its word count.
+
+    Runs on a bounded worker pool (``EXTRACTION_WORKERS``); PDF and DOCX files
+    are parsed in a child process that is killed after ``timeout`` seconds
+    (``EXTRACTION_TIMEOUT`` by default), in which case the text is empty.
+    """
+    if timeout is None:
+        timeout = settings.EXTRACTION_TIMEOUT
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _get_executor(), _extract_with_timeout, str(path), filename, timeout
+    )
+
+def extractor_kind(filename: str) -> str:
+    """
+    Name of the extractor that reads a file, chosen by its extension:
+    'pdf', 'docx' or 'text'.
+    """
     filename_lower = filename.lower()
-    
+    if filename_lower.endswith('.pdf'):
+        return "pdf"
+    if filename_lower.endswith(('.docx', '.doc')):
+        return "docx"
+    return "text"
+
+def iter_text_chunks(source: BinaryIO, filename: str) -> Iterator[str]:
+    """
+    Yield the text of a file piece by piece (pages, paragraphs or text chunks),
+    so callers can process it as it is produced.
+    """
+    kind = extractor_kind(filename)
+
+    if kind == "pdf":
+        yield from _iter_pdf(source)
+    elif kind == "docx":
+        yield from _iter_docx(source)
+    else:
+        # Default to text/markdown
+        decoder = codecs.getincrementaldecoder('utf-8')()
+        while True:
+            chunk = source.read(TEXT_CHUNK_SIZE)
+            if not chunk:
+                break
+            yield decoder.decode(chunk)
+        yield decoder.decode(b'', final=True)
+
+def _extract(source: BinaryIO, filename: str) -> Tuple[str, int]:
     try:
-        if filename_lower.endswith('.pdf'):
-            return _extract_from_pdf(file_content)
-        elif filename_lower.endswith('.docx') or filename_lower.endswith('.doc'):
-            return _extract_from_docx(file_content)
-        else:
-            # Default to text/markdown
-            return file_content.decode('utf-8')
+        return _join_and_count(iter_text_chunks(source, filename))
     except Exception as e:
         print(f"Error extracting text from {filename}: {e}")
-        return ""
-
-def _extract_from_pdf(content: bytes) -> str:
-    text = ""
-    with io.BytesIO(content) as f:
-        reader = PdfReader(f)
-        for page in reader.pages:
-            text += page.extract_text() + "\n"
-    return text
-
-def _extract_from_docx(content: bytes) -> str:
-    text = ""
-    with io.BytesIO(content) as f:
-        doc = docx.Document(f)
-        for para in doc.paragraphs:
-            text += para.text + "\n"
-    return text
+        return "", 0
+
+def _extract_path(path: str, filename: str) -> Tuple[str, int]:
+    with open(path, 'rb') as f:
+        return _extract(f, filename)
+
+def _join_and_count(chunks: Iterable[str]) -> Tuple[str, int]:
+    """Join text pieces with a single ``join`` while counting words incrementally."""
+    parts = []
+    word_count = 0
+    ends_in_word = False
+    for chunk in chunks:
+        if not chunk:
+            continue
+        word_count += len(chunk.split())
+        # Una palabra partida entre dos fragmentos se contó dos veces
+        if ends_in_word and not chunk[0].isspace():
+            word_count -= 1
+        ends_in_word = not chunk[-1].isspace()
+        parts.append(chunk)
+    return "".join(parts), word_count
+
+def _iter_pdf(source: BinaryIO) -> Iterator[str]:
+    from pypdf import PdfReader
+
+    reader = PdfReader(source)
+    for page in reader.pages:
+        yield (page.extract_text() or "") + "\n"
+
+def _iter_docx(source: BinaryIO) -> Iterator[str]:
+    import docx
+
+    doc = docx.Document(source)
+    for para in doc.paragraphs:
+        yield para.text + "\n"
+
+# Worker pool
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+def _get_executor() -> ThreadPoolExecutor:
+    """Create the bounded extraction pool on first use."""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.EXTRACTION_WORKERS,
+            thread_name_prefix="extraction"
+        )
+    return _executor
+
+def _needs_subprocess(filename: str) -> bool:
+    return extractor_kind(filename) != "text"
+
+def _extract_with_timeout(path: str, filename: str, timeout: float) -> Tuple[str, int]:
+    """
+    Run one extraction inside a pool thread.
+
+    Plain text is decoded in the thread itself. PDF/DOCX parsing is CPU-bound
+    pure Python, so it runs in a child process: it does not hold the server's
+    GIL and it can be killed when it exceeds the timeout.
+    """
+    if not _needs_subprocess(filename):
+        return _extract_path(path, filename)
+
+    ctx = multiprocessing.get_context("spawn")
+    receiver, sender = ctx.Pipe(duplex=False)
+    process = ctx.Process(target=_child_extract, args=(sender, path, filename), daemon=True)
+    process.start()
+    sender.close()
+    try:
+        if not receiver.poll(timeout):
+            print(f"Text extraction from {filename} timed out after {timeout}s")
+            return "", 0
+        return receiver.recv()
+    except EOFError:
+        print(f"Text extraction from {filename} failed: worker exited")
+        return "", 0
+    finally:
+        receiver.close()
+        if process.is_alive():
+            process.kill()
+        process.join()
+
+def _child_extract(sender, path: str, filename: str) -> None:
+    """Entry point of the extraction child process."""
+    try:
+        sender.send(_extract_path(path, filename))
+    finally:
+        sender.close()
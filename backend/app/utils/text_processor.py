@@ -2,22 +2,39 @@
 Text processing utilities for document indexing.
 """
 import re
-from typing import List, Set
+from typing import Dict, Iterable, List, Set, Tuple, Union
 
+from app.core.config import settings
+from app.utils.analyzer import default_analyzer
 
-def tokenize(text: str) -> List[str]:
+# Identifica los términos que produce tokenize (versión y configuración del analizador)
+TOKENIZER_VERSION = default_analyzer.version
+
+
+def tokenize(text: Union[str, Iterable[str]]) -> List[str]:
     """
-    Tokenize text into words.
+    Tokenize text into normalized terms.
     
     Args:
-        text: Input text
+        text: Input text, or an iterable of text chunks
         
     Returns:
         List of tokens (words)
     """
-    # Convert to lowercase and split by whitespace and punctuation
-    tokens = re.findall(r'\b\w+\b', text.lower())
-    return tokens
+    return default_analyzer.tokenize(text)
+
+
+def normalize_query(query: str) -> str:
+    """
+    Normalize a query or a single word so it matches indexed terms.
+    
+    Args:
+        query: Input query
+        
+    Returns:
+        Normalized query
+    """
+    return default_analyzer.normalize_term(query.strip())
 
 
 def clean_text(text: str) -> str:
@@ -37,33 +54,43 @@ def clean_text(text: str) -> str:
     return text
 
 
-def extract_unique_words(text: str) -> Set[str]:
+def extract_unique_words(text: Union[str, Iterable[str]]) -> Set[str]:
     """
     Extract unique words from text.
     
     Args:
-        text: Input text
+        text: Input text, or an iterable of text chunks
         
     Returns:
         Set of unique words
     """
-    tokens = tokenize(text)
-    return set(tokens)
+    return set(default_analyzer.term_frequencies(text))
 
 
-def get_word_frequency(text: str) -> dict:
+def get_word_frequency(text: Union[str, Iterable[str]]) -> Dict[str, int]:
     """
     Get word frequency in text.
     
     Args:
-        text: Input text
+        text: Input text, or an iterable of text chunks
         
     Returns:
         Dictionary mapping words to their frequencies
     """
-    tokens = tokenize(text)
-    frequency = {}
-    for token in tokens:
-        frequency[token] = frequency.get(token, 0) + 1
-    return frequency
+    return default_analyzer.term_frequencies(text)
 
+
+def get_term_statistics(
+    text: Union[str, Iterable[str]]
+) -> Tuple[Dict[str, int], Dict[str, List[Tuple[int, int]]]]:
+    """
+    Get word frequency and the character offsets of each word's first occurrences.
+    
+    Args:
+        text: Input text, or an iterable of text chunks
+        
+    Returns:
+        Tuple of (word frequencies, word -> list of (start, end) offsets;
+        at most ``SNIPPET_MAX_OFFSETS_PER_TERM`` per word)
+    """
+    return default_analyzer.term_statistics(text, settings.SNIPPET_MAX_OFFSETS_PER_TERM)
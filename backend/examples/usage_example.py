@@ -9,7 +9,7 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')
 
 from app.modules.suffix_tree_index import SuffixTreeIndex
 from app.modules.patricia_tree_index import PatriciaTreeIndex
-from app.utils.text_processor import tokenize
+from app.utils.text_processor import normalize_query, tokenize
 
 
 def example_suffix_tree():
@@ -38,7 +38,7 @@ def example_suffix_tree():
     queries = ["python", "thon", "programación", "lenguaje"]
     
     for query in queries:
-        results = index.search(query)
+        results = index.search(normalize_query(query))
         print(f"Búsqueda '{query}': {len(results)} documentos encontrados")
         for doc_id in results:
             print(f"  - {doc_id}")
@@ -76,7 +76,7 @@ def example_patricia_tree():
     queries = ["python", "prog", "leng", "java"]
     
     for query in queries:
-        results = index.search(query)
+        results = index.search(normalize_query(query))
         print(f"Búsqueda '{query}': {len(results)} documentos encontrados")
         for doc_id in results:
             print(f"  - {doc_id}")
@@ -0,0 +1,23 @@
+"""
+Shared fixtures for the backend tests.
+"""
+import pytest
+from fastapi.testclient import TestClient
+from app.main import app
+from app.services import index_service
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """Run the test inside an empty directory (database and data paths are relative)."""
+    monkeypatch.chdir(tmp_path)
+    # The shared service keeps indexes in memory: start every test without them
+    index_service.__init__()
+    return tmp_path
+
+
+@pytest.fixture
+def client(workdir):
+    """Test client with the application lifespan (database) started."""
+    with TestClient(app) as test_client:
+        yield test_client
@@ -0,0 +1,43 @@
+"""
+Text analyzer tests.
+"""
+from app.utils.analyzer import Analyzer, DEFAULT_STOPWORDS, light_stem
+
+
+def test_normalizes_accents_case_and_stopwords():
+    """Terms are case and accent folded (keeping ñ) and stopwords are dropped."""
+    analyzer = Analyzer(stopwords=DEFAULT_STOPWORDS)
+    tokens = list(analyzer.iter_tokens("La CANCIÓN del Año ﬁnal"))
+    assert [token.term for token in tokens] == ["cancion", "año", "final"]
+    assert [token.position for token in tokens] == [1, 3, 4]
+    assert (tokens[0].start, tokens[0].end) == (3, 10)
+    assert analyzer.normalize_term("Canción") == "cancion"
+
+
+def test_chunks_match_whole_text():
+    """Words split across chunks are rejoined with offsets into the whole text."""
+    analyzer = Analyzer(stem=True)
+    text = "Las canciones y las luces del programa"
+    chunks = [text[i:i + 4] for i in range(0, len(text), 4)]
+    assert list(analyzer.iter_tokens(chunks)) == list(analyzer.iter_tokens(text))
+    assert analyzer.term_frequencies(chunks)["cancion"] == 1
+    assert "luz" in analyzer.term_frequencies(text)
+
+
+def test_light_stem_removes_only_plural_endings():
+    """Plural endings are removed without eating the 'e' of the stem."""
+    assert light_stem("canciones") == "cancion"
+    assert light_stem("luces") == "luz"
+    assert light_stem("gatos") == "gato"
+    assert light_stem("clases") == "clase"
+    assert light_stem("clase") == "clase"
+
+
+def test_light_stem_plurals_meet_their_singulars():
+    """Plurals of vowel-final singulars only lose the 's', in Spanish and English."""
+    for singular, plural in (("parte", "partes"), ("time", "times"), ("place", "places"),
+                             ("padre", "padres"), ("price", "prices"), ("piece", "pieces")):
+        assert light_stem(plural) == light_stem(singular) == singular
+    for singular, plural in (("flor", "flores"), ("papel", "papeles"), ("ciudad", "ciudades"),
+                             ("vez", "veces"), ("voz", "voces")):
+        assert light_stem(plural) == light_stem(singular) == singular
@@ -0,0 +1,69 @@
+"""
+Compressed bitmap tests.
+"""
+from app.modules.bitmap import RoaringBitmap
+
+
+def test_set_algebra_matches_python_sets():
+    """Sparse and dense containers give the same results as sets."""
+    a_values = set(range(0, 20000, 3)) | {70000, 200000}
+    b_values = set(range(0, 20000, 5)) | {70000, 70001}
+    a, b = RoaringBitmap(a_values), RoaringBitmap(b_values)
+
+    assert sorted(a | b) == sorted(a_values | b_values)
+    assert sorted(a & b) == sorted(a_values & b_values)
+    assert sorted(a - b) == sorted(a_values - b_values)
+    assert len(RoaringBitmap.union(a, b, RoaringBitmap([5]))) == len(a_values | b_values | {5})
+
+    a.add(1)
+    a.discard(0)
+    assert 1 in a and 0 not in a and 200000 in a
+
+
+def test_bitmap_postings_give_the_same_results():
+    """Indexes combining postings as bitmaps find the same documents."""
+    from app.modules.inverted_index import ALL_DOCUMENTS
+    from app.modules.patricia_tree_index import PatriciaTreeIndex
+    from app.modules.suffix_tree_index import SuffixTreeIndex
+
+    documents = {"a": ["gato", "negro"], "b": ["gata"], "c": ["perro"]}
+    for index_class in (SuffixTreeIndex, PatriciaTreeIndex):
+        index = index_class(posting_format="bitmap")
+        index.add_documents(documents)
+        assert sorted(index.search("gat")) == ["a", "b"]
+        index.add_word("gatuno", "c")
+        index.remove_document("a")
+        assert sorted(index.search("gat")) == ["b", "c"]
+        index.add_word("gatos", ALL_DOCUMENTS)
+        assert sorted(index.search("gat")) == ["b", "c"]
+
+
+def test_bitmap_format_stores_postings_as_bitmaps():
+    """In bitmap format the postings are the bitmaps, not a cache next to sets."""
+    import tracemalloc
+    from app.modules.bitmap import DocumentBitmap, document_dictionary
+    from app.modules.patricia_tree_index import PatriciaTreeIndex
+
+    index = PatriciaTreeIndex(posting_format="bitmap")
+    index.add_documents({"a": ["gato", "negro"], "b": ["gato"]})
+    assert all(isinstance(documents, DocumentBitmap) for documents in index.postings.values())
+    assert index.get_documents_for_word("gato") == {"a", "b"}
+    index.remove_document("a")
+    assert index.get_documents_for_word("gato") == {"b"} and index.get_all_words() == ["gato"]
+
+    restored = PatriciaTreeIndex.from_dict(index.to_dict())
+    assert restored.posting_format == "bitmap"
+    assert isinstance(restored.postings[restored.terms.get_id("gato")], DocumentBitmap)
+
+    document_ids = [f"documento-{i:05d}" for i in range(5000)]
+    for document_id in document_ids:
+        document_dictionary.intern(document_id)
+    sizes = {}
+    for posting_format in ("set", "bitmap"):
+        index = PatriciaTreeIndex(posting_format=posting_format)
+        tracemalloc.start()
+        postings = [index._new_postings(document_ids[start::7]) for start in range(7)]
+        sizes[posting_format] = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        assert sum(map(len, postings)) == len(document_ids)
+    assert sizes["bitmap"] * 4 < sizes["set"]
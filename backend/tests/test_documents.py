@@ -0,0 +1,238 @@
+"""
+Document storage tests.
+"""
+import base64
+import io
+import zipfile
+import hashlib
+import importlib
+import sqlite3
+from fastapi.testclient import TestClient
+from app.main import app
+from app.utils.blob_store import BlobStore, blob_store
+
+
+def test_upload_stores_original_in_blob_store(client):
+    """Originals are stored once on disk, keyed by their SHA-256."""
+    content = b"hola mundo desde un archivo de texto"
+    content_hash = hashlib.sha256(content).hexdigest()
+
+    first = client.post("/api/documents/upload", files={"file": ("a.txt", content, "text/plain")})
+    second = client.post("/api/documents/upload", files={"file": ("b.txt", content, "text/plain")})
+    assert first.status_code == 200
+    assert second.status_code == 200
+    assert first.json()["content_hash"] == content_hash
+    assert first.json()["size"] == len(content)
+    assert blob_store.read_bytes(content_hash) == content
+
+    download = client.get(f"/api/documents/{first.json()['id']}/file")
+    assert download.content == content
+
+    # The blob is shared, so it survives until the last document is deleted
+    client.delete(f"/api/documents/{first.json()['id']}")
+    assert blob_store.exists(content_hash)
+    client.delete(f"/api/documents/{second.json()['id']}")
+    assert not blob_store.exists(content_hash)
+
+
+def test_legacy_base64_content_is_migrated(workdir):
+    """Rows created before the blob store have their Base64 content moved to disk."""
+    content = b"documento antiguo"
+    conn = sqlite3.connect(workdir / "db.sqlite3")
+    conn.execute(
+        "CREATE TABLE documents (id CHAR(36) PRIMARY KEY, title VARCHAR(255) NOT NULL, "
+        "content TEXT NOT NULL, extracted_text TEXT, word_count INT NOT NULL, "
+        "created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP)"
+    )
+    conn.execute(
+        "INSERT INTO documents (id, title, content, extracted_text, word_count) VALUES (?, ?, ?, ?, ?)",
+        ("5f1d7c1e-2a39-4c9f-9a55-3c1f7f3c2b10", "old.txt",
+         base64.b64encode(content).decode(), "documento antiguo", 2),
+    )
+    conn.commit()
+    conn.close()
+
+    with TestClient(app) as client:
+        doc = client.get("/api/documents/5f1d7c1e-2a39-4c9f-9a55-3c1f7f3c2b10").json()
+
+    assert doc["content_hash"] == hashlib.sha256(content).hexdigest()
+    assert blob_store.read_bytes(doc["content_hash"]) == content
+    conn = sqlite3.connect(workdir / "db.sqlite3")
+    assert conn.execute("SELECT content FROM documents").fetchone()[0] == ""
+    conn.close()
+
+
+def test_legacy_plain_text_content_is_kept_as_is(workdir):
+    """Legacy content that is not strict Base64 is stored verbatim, not decoded."""
+    conn = sqlite3.connect(workdir / "db.sqlite3")
+    conn.execute(
+        "CREATE TABLE documents (id CHAR(36) PRIMARY KEY, title VARCHAR(255) NOT NULL, "
+        "content TEXT NOT NULL, extracted_text TEXT, word_count INT NOT NULL, "
+        "created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP)"
+    )
+    # Sin los espacios queda "buendiaamigo", que sí decodifica como Base64
+    conn.execute(
+        "INSERT INTO documents (id, title, content, extracted_text, word_count) VALUES (?, ?, ?, ?, ?)",
+        ("0b8e3f3a-61f4-4c43-8f0e-2d9a5b7c1e42", "old.txt", "buen dia amigo", "buen dia amigo", 3),
+    )
+    conn.commit()
+    conn.close()
+
+    with TestClient(app) as client:
+        doc = client.get("/api/documents/0b8e3f3a-61f4-4c43-8f0e-2d9a5b7c1e42").json()
+
+    assert blob_store.read_bytes(doc["content_hash"]) == b"buen dia amigo"
+
+
+def test_blob_is_kept_while_an_upload_uses_it(workdir):
+    """A blob stored again after its references were checked is not deleted."""
+    store = BlobStore(str(workdir / "blobs"))
+    blob = store.put_bytes(b"contenido compartido")
+
+    # Mientras la subida no guarda su fila, el blob está fijado
+    assert not store.delete(blob.content_hash)
+    store.release([blob.content_hash])
+
+    generation = store.generation(blob.content_hash)
+    store.release([store.put_bytes(b"contenido compartido").content_hash])
+    assert not store.delete(blob.content_hash, generation)
+    assert store.exists(blob.content_hash)
+
+    assert store.delete(blob.content_hash, store.generation(blob.content_hash))
+    assert not store.exists(blob.content_hash)
+
+
+def test_list_documents_is_paginated_and_projected(client):
+    """The listing pages with a cursor and returns snippets instead of full text."""
+    long_text = "palabra " * 500
+    uploaded = [
+        client.post("/api/documents/upload", files={"file": (f"doc{i}.txt", f"{i} {long_text}".encode(), "text/plain")}).json()
+        for i in range(5)
+    ]
+
+    first = client.get("/api/documents/", params={"limit": 2}).json()
+    assert first["total"] == 5
+    assert len(first["documents"]) == 2
+    assert "content" not in first["documents"][0]
+    assert len(first["documents"][0]["snippet"]) == 200
+
+    seen = [doc["id"] for doc in first["documents"]]
+    cursor = first["next_cursor"]
+    while cursor:
+        page = client.get("/api/documents/", params={"limit": 2, "cursor": cursor}).json()
+        seen.extend(doc["id"] for doc in page["documents"])
+        cursor = page.get("next_cursor")
+    assert seen == [doc["id"] for doc in reversed(uploaded)]
+
+    projected = client.get("/api/documents/", params={"fields": "title,content", "limit": 1}).json()
+    assert set(projected["documents"][0]) == {"id", "title", "content"}
+    assert client.get("/api/documents/", params={"fields": "password"}).status_code == 400
+
+
+def test_bulk_upload_expands_archives_and_indexes(client):
+    """Bulk upload ingests plain files and archive members in one request."""
+    client.post("/api/documents/upload", files={"file": ("base.txt", b"documento base", "text/plain")})
+    client.post("/api/indexing/create", json={"index_type": "patricia"})
+
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as zf:
+        zf.writestr("carpeta/uno.txt", "manzana roja")
+        zf.writestr("carpeta/dos.md", "pera verde")
+        zf.writestr("__MACOSX/._uno.txt", "metadata")
+
+    response = client.post(
+        "/api/documents/bulk",
+        files=[
+            ("files", ("tres.txt", b"uva morada", "text/plain")),
+            ("files", ("lote.zip", archive.getvalue(), "application/zip")),
+        ],
+        data={"index": "true"},
+    )
+    assert response.status_code == 200
+    body = response.json()
+    assert body["total"] == 3
+    assert sorted(doc["title"] for doc in body["documents"]) == ["dos.md", "tres.txt", "uno.txt"]
+    assert body["indexed"] == ["patricia"]
+
+    results = client.post("/api/search/", json={"query": "manz", "index_type": "patricia"}).json()
+    assert [r["document_title"] for r in results["results"]] == ["uno.txt"]
+    assert client.get("/api/documents/").json()["total"] == 4
+
+
+def test_failed_bulk_upload_leaves_no_blobs(client, monkeypatch):
+    """Blobs staged by a rejected request or an oversized archive are deleted."""
+    settings = importlib.import_module("app.core.config").settings
+    monkeypatch.setattr(settings, "BULK_MAX_FILES", 1)
+    files = [("files", (f"{i}.txt", f"archivo {i}".encode(), "text/plain")) for i in range(3)]
+    assert client.post("/api/documents/bulk", files=files).status_code == 400
+    for i in range(3):
+        assert not blob_store.exists(hashlib.sha256(f"archivo {i}".encode()).hexdigest())
+
+    monkeypatch.setattr(settings, "BULK_MAX_FILES", 10)
+    monkeypatch.setattr(settings, "ARCHIVE_MAX_MEMBER_SIZE", 1024)
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w", zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("chico.txt", "miembro chico")
+        zf.writestr("grande.txt", "0" * 100_000)
+    response = client.post(
+        "/api/documents/bulk",
+        files=[("files", ("bomba.zip", archive.getvalue(), "application/zip"))],
+    )
+    assert response.status_code == 200
+    assert response.json()["total"] == 0
+    assert response.json()["failed"][0]["filename"] == "bomba.zip"
+    assert not blob_store.exists(hashlib.sha256(b"miembro chico").hexdigest())
+    assert not blob_store.exists(hashlib.sha256(b"0" * 1024).hexdigest())
+    assert client.get("/api/documents/").json()["total"] == 0
+
+
+def test_duplicate_content_reuses_cached_work(client, monkeypatch):
+    """Known content skips text extraction on upload and tokenization on rebuild."""
+    documents_routes = importlib.import_module("app.api.routes.documents")
+    index_service_module = importlib.import_module("app.services.index_service")
+
+    content = b"contenido repetido para la cache"
+    client.post("/api/documents/upload", files={"file": ("a.txt", content, "text/plain")})
+    client.post("/api/indexing/create", json={"index_type": "suffix"})
+
+    def fail(*args, **kwargs):
+        raise AssertionError("cached work was recomputed")
+
+    monkeypatch.setattr(documents_routes, "extract_text_async", fail)
+    monkeypatch.setattr(index_service_module, "get_term_statistics", fail)
+
+    duplicate = client.post("/api/documents/upload", files={"file": ("b.txt", content, "text/plain")})
+    assert duplicate.status_code == 200
+    assert duplicate.json()["word_count"] == 5
+
+    client.post("/api/indexing/create", json={"index_type": "suffix"})
+    results = client.post("/api/search/", json={"query": "repetido", "index_type": "suffix"}).json()
+    assert results["total_results"] == 2
+
+
+def test_cached_text_is_keyed_by_extractor(client):
+    """The same bytes uploaded with another extension are extracted again."""
+    content = b"texto plano que no es un pdf"
+    as_text = client.post("/api/documents/upload", files={"file": ("a.txt", content, "text/plain")}).json()
+    as_pdf = client.post("/api/documents/upload", files={"file": ("a.pdf", content, "application/pdf")}).json()
+
+    assert as_text["content_hash"] == as_pdf["content_hash"]
+    assert as_text["content"] == "texto plano que no es un pdf"
+    assert as_pdf["content"] == "[No text extracted]"
+
+
+def test_cached_terms_follow_the_extractor_version(workdir, monkeypatch):
+    """A new extractor version makes the cached terms and offsets of the old texts miss."""
+    import sys
+    from app.utils.content_cache import ContentCache
+
+    content_cache_module = sys.modules["app.utils.content_cache"]
+    cache = ContentCache(str(workdir / "cache"))
+    cache.put_term_frequencies("abc.text", {"gato": 1})
+    cache.put_term_offsets("abc.text", {"gato": [[0, 4]]})
+    assert cache.get_term_frequencies("abc.text") == {"gato": 1}
+
+    monkeypatch.setattr(content_cache_module, "EXTRACTOR_VERSION", content_cache_module.EXTRACTOR_VERSION + "-nuevo")
+    assert cache.get_term_frequencies("abc.text") is None
+    assert not cache.has_term_frequencies("abc.text")
+    assert cache.get_term_offsets("abc.text") is None
@@ -0,0 +1,39 @@
+"""
+Text extraction tests.
+"""
+import asyncio
+from app.utils.file_parser import extract_text_async, _join_and_count
+
+
+def _make_docx(path, paragraphs):
+    import docx
+
+    document = docx.Document()
+    for paragraph in paragraphs:
+        document.add_paragraph(paragraph)
+    document.save(path)
+
+
+def test_word_count_across_chunk_boundaries():
+    """Words split between two chunks are counted once."""
+    text, word_count = _join_and_count(["hola mun", "do y ", "adiós"])
+    assert text == "hola mundo y adiós"
+    assert word_count == 4
+
+
+def test_docx_is_extracted_in_worker_process(tmp_path):
+    """DOCX parsing runs off the event loop and returns text and word count."""
+    path = tmp_path / "original"
+    _make_docx(path, ["Primer párrafo", "Segundo párrafo del documento"])
+
+    text, word_count = asyncio.run(extract_text_async(path, "informe.docx"))
+    assert text == "Primer párrafo\nSegundo párrafo del documento\n"
+    assert word_count == 6
+
+
+def test_extraction_timeout_returns_empty_text(tmp_path):
+    """An extraction that exceeds its timeout is abandoned."""
+    path = tmp_path / "original"
+    _make_docx(path, ["lento"])
+
+    assert asyncio.run(extract_text_async(path, "lento.docx", timeout=0)) == ("", 0)
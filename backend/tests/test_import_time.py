@@ -0,0 +1,60 @@
+"""
+Import-time benchmark for the backend.
+
+Cold start matters for autoscaling, so importing ``app.main`` must stay within
+a time budget and must not pull in optional heavy dependencies.
+"""
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+# Presupuesto en milisegundos; se puede ajustar en CI con IMPORT_TIME_BUDGET_MS
+IMPORT_TIME_BUDGET_MS = int(os.getenv("IMPORT_TIME_BUDGET_MS", "2000"))
+
+# Dependencias que solo deben cargarse cuando se usan
+LAZY_MODULES = ("pypdf", "docx", "suffix_trees", "patricia", "matplotlib", "networkx", "numpy")
+
+
+def _run_python(*args: str) -> subprocess.CompletedProcess:
+    """Run a fresh interpreter inside the backend directory."""
+    return subprocess.run(
+        [sys.executable, *args],
+        cwd=BACKEND_DIR,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+
+def _cumulative_import_time_us(stderr: str, module: str) -> int:
+    """Extract the cumulative import time of a module from -X importtime output."""
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = [part.strip() for part in line[len("import time:"):].split("|")]
+        if len(parts) == 3 and parts[2] == module:
+            return int(parts[1])
+    raise AssertionError(f"Module {module} not found in -X importtime output")
+
+
+def test_heavy_dependencies_are_lazy():
+    """Importing the app must not import extractors or index engines."""
+    code = (
+        "import sys, app.main; "
+        f"print(','.join(m for m in {LAZY_MODULES!r} if m in sys.modules))"
+    )
+    result = _run_python("-c", code)
+    assert result.stdout.strip() == ""
+
+
+def test_import_time_within_budget():
+    """Importing app.main must fit in the import-time budget."""
+    result = _run_python("-X", "importtime", "-c", "import app.main")
+    elapsed_ms = _cumulative_import_time_us(result.stderr, "app.main") / 1000
+    assert elapsed_ms < IMPORT_TIME_BUDGET_MS, (
+        f"app.main took {elapsed_ms:.0f} ms to import "
+        f"(budget: {IMPORT_TIME_BUDGET_MS} ms)"
+    )
@@ -0,0 +1,829 @@
+"""
+Index build and search tests.
+"""
+
+
+def _upload(client, name, text):
+    response = client.post("/api/documents/upload", files={"file": (name, text.encode(), "text/plain")})
+    return response.json()["id"]
+
+
+def _search(client, query, index_type):
+    response = client.post("/api/search/", json={"query": query, "index_type": index_type})
+    return sorted(result["document_title"] for result in response.json()["results"])
+
+
+def test_reconcile_only_processes_changed_documents(client):
+    """Reconcile mode adds new documents and drops deleted ones from the index."""
+    first = _upload(client, "uno.txt", "gato negro")
+    _upload(client, "dos.txt", "perro blanco")
+    client.post("/api/indexing/create", json={"index_type": "suffix"})
+    status = client.get("/api/indexing/status/suffix").json()
+    assert status["last_build"]["added"] == 2
+
+    _upload(client, "tres.txt", "gato pardo")
+    client.delete(f"/api/documents/{first}")
+    client.post("/api/indexing/create", json={"index_type": "suffix", "mode": "reconcile"})
+
+    report = client.get("/api/indexing/status/suffix").json()["last_build"]
+    assert (report["added"], report["updated"], report["removed"], report["unchanged"]) == (1, 0, 1, 1)
+    assert _search(client, "gato", "suffix") == ["tres.txt"]
+    assert _search(client, "negro", "suffix") == []
+
+
+def test_index_terms_survive_a_new_term_dictionary():
+    """Saved term IDs are remapped when loaded into a dictionary that numbers terms differently."""
+    from app.modules.patricia_tree_index import PatriciaTreeIndex
+    from app.modules.suffix_tree_index import SuffixTreeIndex
+    from app.modules.term_dictionary import TermDictionary
+
+    index = SuffixTreeIndex(TermDictionary())
+    index.add_documents({"a": ["gato", "negro"], "b": ["gato"]})
+    data = index.to_dict(portable=True)
+
+    # The shared dictionary already numbers other terms
+    restored = SuffixTreeIndex.from_dict(data)
+    assert restored.terms is not index.terms
+    assert sorted(restored.search("ato")) == ["a", "b"]
+    assert restored.get_words_for_document("a") == {"gato", "negro"}
+
+    legacy = PatriciaTreeIndex.from_dict({
+        "word_to_documents": {"gato": ["a"], "gata": ["b"]},
+        "document_to_words": {"a": ["gato"], "b": ["gata"]},
+    })
+    assert sorted(legacy.search("gat")) == ["a", "b"]
+
+
+def test_term_dictionary_interns_from_several_threads():
+    """Threads interning the same new terms get one ID per term, with no gaps."""
+    import sys
+    from concurrent.futures import ThreadPoolExecutor
+    from app.modules.term_dictionary import TermDictionary
+
+    words = [f"palabra{i}" for i in range(2000)]
+    interval = sys.getswitchinterval()
+    # Cambiar de hilo muy seguido para que las altas se crucen
+    sys.setswitchinterval(1e-6)
+    try:
+        for _ in range(20):
+            terms = TermDictionary()
+            with ThreadPoolExecutor(max_workers=8) as pool:
+                results = list(pool.map(lambda _: [terms.intern(word) for word in words], range(8)))
+            assert all(ids == results[0] for ids in results)
+            assert len(terms) == len(words) and terms.terms(results[0]) == words
+    finally:
+        sys.setswitchinterval(interval)
+
+
+def test_segmented_index_flushes_tombstones_and_compacts(workdir):
+    """Segments are flushed, deletions masked by tombstones, and compaction drops them."""
+    from app.modules.segmented_index import SegmentedIndex
+    from app.modules.suffix_tree_index import SuffixTreeIndex
+
+    index = SegmentedIndex(SuffixTreeIndex, flush_threshold=2, merge_factor=2)
+    index.add_documents({"a": ["gato"], "b": ["perro"]})
+    index.add_documents({"c": ["gata"]})
+    index.add_documents({"d": ["gatito"]})
+    assert len(index.segments) == 2 and not index.memtable.forward
+
+    index.remove_document("a")
+    assert sorted(index.search("gat")) == ["c", "d"]
+    assert index.segments[0].deleted == {"a"}
+
+    assert index.save(str(workdir / "suffix"))
+    assert index.compact()
+    assert len(index.segments) == 1 and not index.segments[0].deleted
+    assert index.save(str(workdir / "suffix"))
+    assert len(list((workdir / "suffix").glob("segment_*.json"))) == 1
+
+    restored = SegmentedIndex.load(str(workdir / "suffix"), SuffixTreeIndex)
+    assert sorted(restored.search("gat")) == ["c", "d"]
+    assert restored.get_statistics()["document_count"] == 3
+
+
+def test_snapshots_are_not_changed_by_later_writes():
+    """A reader keeps its version while writers publish new ones; a batch publishes once."""
+    import pytest
+
+    from app.modules.segmented_index import SegmentedIndex
+    from app.modules.suffix_tree_index import SuffixTreeIndex
+
+    index = SegmentedIndex(SuffixTreeIndex, flush_threshold=10)
+    index.add_documents({"a": ["gato"]})
+    view = index.snapshot()
+
+    with index.batch():
+        index.remove_document("a")
+        index.add_documents({"b": ["gata"]})
+        # Hasta que se cierra el lote se sigue viendo la versión anterior
+        assert index.search("gat") == ["a"]
+    assert index.version == view.version + 1
+    assert sorted(index.search("gat")) == ["b"]
+    assert view.search("gat") == ["a"] and view.get_words_for_document("a") == {"gato"}
+
+    with pytest.raises(RuntimeError):
+        with index.batch():
+            index.add_documents({"c": ["gatito"]})
+            raise RuntimeError("abort")
+    assert sorted(index.search("gat")) == ["b"]
+
+
+def test_spimi_merges_runs_into_a_segment(workdir):
+    """Postings spilled to several runs are merged into one sorted segment."""
+    from app.modules.patricia_tree_index import PatriciaTreeIndex
+    from app.modules.spimi import SpimiBuilder
+
+    with SpimiBuilder(workdir / "runs", max_postings=2) as builder:
+        builder.add_document("a", ["gato", "negro"])
+        builder.add_document("b", ["gato", "blanco"])
+        builder.add_document("c", ["perro"])
+        assert builder.run_count == 2
+        assert [term for term, _ in builder.iter_postings()] == ["blanco", "gato", "negro", "perro"]
+        builder.write_segment(workdir / "segment.json")
+    assert not (workdir / "runs").exists()
+
+    import json
+    index = PatriciaTreeIndex.from_dict(json.loads((workdir / "segment.json").read_text()))
+    assert sorted(index.search("gat")) == ["a", "b"]
+    assert index.get_words_for_document("a") == {"gato", "negro"}
+
+
+def test_spimi_segment_streams_into_the_index(workdir):
+    """The merged runs feed the segment index directly: postings are not held twice."""
+    import tracemalloc
+    from app.modules.patricia_tree_index import PatriciaTreeIndex
+    from app.modules.spimi import SpimiBuilder
+    from app.modules.term_dictionary import TermDictionary
+
+    tracemalloc.start()
+    try:
+        with SpimiBuilder(workdir / "runs", max_postings=1000) as builder:
+            for i in range(3000):
+                builder.add_document(f"documento-{i:05d}", [f"palabra{(i * 7 + j) % 400}" for j in range(30)])
+            assert builder.run_count > 1
+            index = PatriciaTreeIndex(TermDictionary())
+            start = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            builder.write_segment(workdir / "segment.json", index.terms, index=index)
+            current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    # Lo único que se suma al índice final son las líneas en curso de cada run
+    assert peak - start < 1.25 * (current - start)
+    assert len(index.document_ids()) == 3000
+    assert sorted(index.search("palabra399")) == sorted(index.get_documents_for_word("palabra399"))
+    expected = {f"documento-{i:05d}" for i in range(3000) if any((i * 7 + j) % 400 == 0 for j in range(30))}
+    assert index.get_documents_for_word("palabra0") == expected
+
+
+def test_full_build_runs_off_the_event_loop(client, monkeypatch):
+    """Tokenizing, merging and building the tree of a full build run in a worker thread."""
+    import asyncio
+    from app.modules.spimi import SpimiBuilder
+
+    on_loop = []
+
+    def recording(method):
+        def wrapper(*args, **kwargs):
+            try:
+                asyncio.get_running_loop()
+                on_loop.append(method.__name__)
+            except RuntimeError:
+                pass
+            return method(*args, **kwargs)
+        return wrapper
+
+    monkeypatch.setattr(SpimiBuilder, "add_postings", recording(SpimiBuilder.add_postings))
+    monkeypatch.setattr(SpimiBuilder, "write_segment", recording(SpimiBuilder.write_segment))
+    _upload(client, "uno.txt", "gato negro")
+    client.post("/api/indexing/create", json={"index_type": "suffix"})
+    assert on_loop == []
+    assert _search(client, "gat", "suffix") == ["uno.txt"]
+
+
+def test_full_build_replaces_segments(client, workdir):
+    """A full rebuild writes a new segment and removes the files of the old index."""
+    _upload(client, "uno.txt", "gato negro")
+    client.post("/api/indexing/create", json={"index_type": "patricia"})
+    client.post("/api/indexing/create", json={"index_type": "patricia"})
+    segments = sorted(path.name for path in (workdir / "data/indices/patricia").glob("segment_*.json"))
+    assert segments == ["segment_000001.json"]
+    assert _search(client, "neg", "patricia") == ["uno.txt"]
+
+
+def test_posting_format_is_chosen_per_index(client, workdir):
+    """Each index keeps the posting format it was created with, also after a reload."""
+    from app.modules.bitmap import DocumentBitmap
+    from app.modules.patricia_tree_index import PatriciaTreeIndex
+    from app.modules.segmented_index import SegmentedIndex
+
+    _upload(client, "uno.txt", "gato negro")
+    client.post("/api/indexing/create", json={"index_type": "patricia", "posting_format": "bitmap"})
+    client.post("/api/indexing/create", json={"index_type": "suffix"})
+    assert client.get("/api/indexing/status/patricia").json()["posting_format"] == "bitmap"
+    assert client.get("/api/indexing/status/suffix").json()["posting_format"] == "set"
+
+    _upload(client, "dos.txt", "gata parda")
+    client.post("/api/indexing/create", json={"index_type": "patricia", "mode": "reconcile"})
+    assert client.get("/api/indexing/status/patricia").json()["posting_format"] == "bitmap"
+    assert _search(client, "gat", "patricia") == ["dos.txt", "uno.txt"]
+
+    loaded = SegmentedIndex.load(str(workdir / "data/indices/patricia"), PatriciaTreeIndex)
+    assert loaded.posting_format == "bitmap"
+    assert all(
+        isinstance(documents, DocumentBitmap)
+        for segment in loaded.snapshot().segments
+        for documents in segment.index.postings.values()
+    )
+
+    client.post("/api/indexing/create", json={"index_type": "patricia", "posting_format": "set"})
+    assert client.get("/api/indexing/status/patricia").json()["posting_format"] == "set"
+    assert _search(client, "gat", "patricia") == ["dos.txt", "uno.txt"]
+
+
+def test_merge_combines_indexes_with_other_dictionaries():
+    """Merging translates term IDs and rebuilds the tree once."""
+    from app.modules.suffix_tree_index import SuffixTreeIndex
+    from app.modules.term_dictionary import TermDictionary
+
+    first = SuffixTreeIndex(TermDictionary())
+    first.add_documents({"a": ["gato", "negro"]})
+    second = SuffixTreeIndex(TermDictionary())
+    second.add_documents({"b": ["perro", "gato"], "c": ["gatito"]})
+
+    merged = SuffixTreeIndex()
+    merged.merge(first, second, exclude={"c"})
+    assert sorted(merged.search("gat")) == ["a", "b"]
+    assert merged.get_all_words() == ["gato", "negro", "perro"]
+
+
+def test_sharded_build(client, monkeypatch):
+    """Full builds can run in worker processes and produce the same index."""
+    from app.core.config import settings
+
+    monkeypatch.setattr(settings, "INDEX_BUILD_WORKERS", 2)
+    _upload(client, "uno.txt", "gato negro")
+    _upload(client, "dos.txt", "gatito blanco")
+    _upload(client, "tres.txt", "perro")
+    client.post("/api/indexing/create", json={"index_type": "suffix"})
+    assert client.get("/api/indexing/status/suffix").json()["last_build"]["added"] == 3
+    assert _search(client, "gat", "suffix") == ["dos.txt", "uno.txt"]
+
+
+def test_shard_workers_only_build_postings(workdir):
+    """Workers return plain postings; the tree is built once, after the merge."""
+    import asyncio
+    from app.modules import sharded_build
+
+    shards = [[("a", None, "gato negro")], [], [("b", None, "gatito negro")]]
+    assert sharded_build.build_shard(shards[0]) == {"gato": ["a"], "negro": ["a"]}
+
+    class InlineExecutor:
+        def submit(self, function, *args):
+            from concurrent.futures import Future
+            future = Future()
+            future.set_result(function(*args))
+            return future
+
+    sharded_build._executor = InlineExecutor()
+    try:
+        postings = asyncio.run(sharded_build.build_shards(shards))
+    finally:
+        sharded_build._executor = None
+    assert postings == [{"gato": ["a"], "negro": ["a"]}, {}, {"gatito": ["b"], "negro": ["b"]}]
+
+
+def test_sharded_build_sends_documents_in_batches(client, monkeypatch):
+    """A sharded build of several batches gives the postings of a sequential build."""
+    from app.core.config import settings
+    from app.modules import sharded_build
+    import sys
+    from app.services import index_service
+
+    index_service_module = sys.modules["app.services.index_service"]
+    for i in range(7):
+        _upload(client, f"doc{i}.txt", f"gato palabra{i} comun{i % 3}")
+    monkeypatch.setattr(index_service_module, "TEXT_BATCH_SIZE", 3)
+
+    def postings():
+        index = index_service.patricia_index
+        return {word: index.get_documents_for_word(word) for word in index.get_all_words()}
+
+    client.post("/api/indexing/create", json={"index_type": "patricia"})
+    sequential = postings()
+
+    sent = []
+    build_shards = sharded_build.build_shards
+
+    async def counting_build_shards(shards):
+        sent.append(sum(len(shard) for shard in shards))
+        return await build_shards(shards)
+
+    monkeypatch.setattr(settings, "INDEX_BUILD_WORKERS", 2)
+    monkeypatch.setattr(index_service_module, "build_shards", counting_build_shards)
+    client.post("/api/indexing/create", json={"index_type": "patricia"})
+    assert sent == [3, 3, 1]
+    assert postings() == sequential and len(sequential["gato"]) == 7
+
+
+def test_search_shard_loads_only_its_partition(workdir):
+    """A shard filters each saved segment before building its postings and tree."""
+    from app.modules.patricia_tree_index import PatriciaTreeIndex
+    from app.modules.segmented_index import SegmentedIndex
+    from app.modules.sharded_build import shard_for
+    from app.modules.term_dictionary import term_dictionary
+    from app.services.shard_pool import _load_partition
+    from app.utils.persistence import save_index_json
+
+    index = SegmentedIndex(PatriciaTreeIndex, flush_threshold=2)
+    documents = {f"doc{i}": [f"palabra{i}", "comun"] for i in range(6)}
+    index.add_documents(documents)
+    index.add_words({"global": ["*"]})
+    index.save(str(workdir / "index"))
+    save_index_json({"terms": term_dictionary.to_list()}, str(workdir / "terms.json"))
+
+    partition = _load_partition("PatriciaTreeIndex", str(workdir / "index"), str(workdir / "terms.json"), 1, 2)
+    mine = {doc_id for doc_id in documents if shard_for(doc_id, 2) == 1}
+    assert mine and mine != set(documents)
+    assert partition.document_ids() == mine
+    assert set(partition.get_all_words()) == {f"palabra{doc_id[3:]}" for doc_id in mine} | {"comun", "global"}
+    assert set(partition.search("glob")) == mine
+    for segment in partition.segments:
+        assert set(segment.index.patricia_tree) <= set(partition.get_all_words())
+
+
+def test_search_shard_reloads_only_new_segments(workdir, monkeypatch):
+    """A shard reuses the segments it already holds and reads only the new ones and tombstones."""
+    from pathlib import Path
+
+    from app.modules import segmented_index
+    from app.modules.patricia_tree_index import PatriciaTreeIndex
+    from app.modules.segmented_index import SegmentedIndex
+    from app.modules.sharded_build import shard_for
+    from app.modules.term_dictionary import term_dictionary
+    from app.services.shard_pool import _load_partition
+    from app.utils.persistence import save_index_json
+
+    def save():
+        index.save(str(workdir / "index"))
+        save_index_json({"terms": term_dictionary.to_list()}, str(workdir / "terms.json"))
+
+    def load(previous=None):
+        return _load_partition(
+            "PatriciaTreeIndex", str(workdir / "index"), str(workdir / "terms.json"), 1, 2, previous
+        )
+
+    index = SegmentedIndex(PatriciaTreeIndex, flush_threshold=2)
+    index.add_documents({f"doc{i}": [f"palabra{i}", "comun"] for i in range(4)})
+    save()
+    first = load()
+
+    mine = sorted(doc_id for doc_id in (f"doc{i}" for i in range(8)) if shard_for(doc_id, 2) == 1)
+    index.remove_document(mine[0])
+    index.add_documents({f"doc{i}": [f"palabra{i}", "comun"] for i in range(4, 8)})
+    save()
+
+    read = []
+    load_index_json = segmented_index.load_index_json
+    monkeypatch.setattr(
+        segmented_index, "load_index_json", lambda path: read.append(Path(path).name) or load_index_json(path)
+    )
+    second = load(first)
+    old_segments = {segment.name for segment in first.snapshot().segments}
+    assert old_segments and not old_segments & set(read)
+    assert all(
+        new.index is old.index and new.name == old.name
+        for new, old in zip(second.snapshot().segments, first.snapshot().segments)
+    )
+    assert sorted(second.search("comun")) == mine[1:]
+    assert sorted(second.search("comun")) == sorted(load().search("comun"))
+
+
+def test_sharded_search_ranks_across_processes(client, monkeypatch):
+    """Search shards return the same documents, best ranked first."""
+    from app.core.config import settings
+
+    _upload(client, "uno.txt", "gato negro grande")
+    _upload(client, "dos.txt", "gato")
+    _upload(client, "tres.txt", "perro")
+    client.post("/api/indexing/create", json={"index_type": "suffix"})
+    local = client.post("/api/search/", json={"query": "gato", "index_type": "suffix"}).json()
+
+    monkeypatch.setattr(settings, "SEARCH_SHARDS", 2)
+    sharded = client.post("/api/search/", json={"query": "gato", "index_type": "suffix"}).json()
+    assert [r["document_title"] for r in sharded["results"]] == ["dos.txt", "uno.txt"]
+    assert sharded["results"] == local["results"]
+
+    _upload(client, "cuatro.txt", "gatos")
+    client.post("/api/indexing/create", json={"index_type": "suffix", "mode": "reconcile"})
+    assert _search(client, "gato", "suffix") == ["cuatro.txt", "dos.txt", "uno.txt"]
+
+
+def test_ranking_scores_term_ids_and_looks_up_words_of_kept_results():
+    """Every match is scored on term IDs; words are only materialized for the top results."""
+    from app.modules.ranking import rank_documents
+    from app.modules.suffix_tree_index import SuffixTreeIndex
+    from app.modules.term_dictionary import TermDictionary
+
+    index = SuffixTreeIndex(TermDictionary())
+    index.add_documents({
+        "a": ["gato", "perro", "casa", "mesa"],
+        "b": ["gato", "gatito"],
+        "c": ["gatos", "luz", "sol"],
+    })
+
+    def fail(document_id):
+        raise AssertionError("words of every match were built")
+
+    index.get_words_for_document = fail
+    assert rank_documents(index, "gat", index.search("gat"), 2) == [
+        ("b", ["gatito", "gato"], 1.0),
+        ("c", ["gatos"], 1 / 3),
+    ]
+
+
+def test_word_batch_updates_each_index_once(client):
+    """A batch adds words to some or all documents and deletes others in a single save."""
+    _upload(client, "uno.txt", "gato negro")
+    _upload(client, "dos.txt", "perro blanco")
+    client.post("/api/indexing/create", json={"index_type": "patricia"})
+
+    response = client.post("/api/index/words/batch", json={
+        "index_type": "patricia",
+        "add": [{"word": "Felino"}, {"word": "Mascota", "document_ids": []}],
+        "delete": ["negro", "inexistente"],
+    })
+    assert response.status_code == 200
+    assert response.json() == {"added": 1, "deleted": 1, "index_types": ["patricia"]}
+    assert _search(client, "felino", "patricia") == ["dos.txt", "uno.txt"]
+    assert _search(client, "negro", "patricia") == []
+
+    missing = client.post("/api/index/words/batch", json={"index_type": "suffix", "add": [{"word": "x"}]})
+    assert missing.status_code == 404
+
+
+def test_global_words_follow_the_indexed_documents():
+    """A word added to all documents is one posting, resolved against the current documents."""
+    from app.modules.inverted_index import ALL_DOCUMENTS
+    from app.modules.patricia_tree_index import PatriciaTreeIndex
+    from app.modules.segmented_index import SegmentedIndex
+
+    index = SegmentedIndex(PatriciaTreeIndex, flush_threshold=2)
+    index.add_documents({"a": ["gato"], "b": ["perro"]})
+    index.add_words({"felino": [ALL_DOCUMENTS]})
+    index.add_documents({"c": ["loro"]})
+    assert sorted(index.search("fel")) == ["a", "b", "c"]
+    assert index.get_words_for_document("c") == {"loro", "felino"}
+    assert index.get_statistics()["total_occurrences"] == 4
+
+    index.remove_document("b")
+    assert sorted(index.get_documents_for_word("felino")) == ["a", "c"]
+    assert index.to_index(keep=lambda doc_id: doc_id == "a").search("felino") == ["a"]
+
+
+def test_search_filters_on_document_metadata(client):
+    """Matches are filtered by title prefix, word count and creation date."""
+    _upload(client, "informe.txt", "gato")
+    _upload(client, "notas.txt", "gato negro grande")
+    client.post("/api/indexing/create", json={"index_type": "suffix"})
+
+    def search(filters):
+        response = client.post("/api/search/", json={"query": "gato", "index_type": "suffix", "filters": filters})
+        return sorted(result["document_title"] for result in response.json()["results"])
+
+    assert search({"title_prefix": "INF"}) == ["informe.txt"]
+    assert search({"min_word_count": 2}) == ["notas.txt"]
+    assert search({"created_before": "2000-01-01T00:00:00"}) == []
+
+    # Los documentos nuevos se agregan a los metadatos ya cargados
+    _upload(client, "informe2.txt", "gato")
+    client.post("/api/indexing/create", json={"index_type": "suffix", "mode": "reconcile"})
+    assert search({"title_prefix": "inf", "max_word_count": 1}) == ["informe.txt", "informe2.txt"]
+
+
+def test_metadata_changes_during_the_load_are_kept(client, monkeypatch):
+    """Documents saved or deleted while the metadata loads are applied once it ends."""
+    import asyncio
+    from types import SimpleNamespace
+    from app.modules.metadata_store import MetadataStore
+    from app.services import index_service
+
+    kept = _upload(client, "viejo.txt", "gato")
+    deleted = _upload(client, "borrado.txt", "gato")
+    store = MetadataStore()
+    monkeypatch.setattr(index_service, "_metadata", store)
+    put_many = store.put_many
+
+    def put_many_during_upload(rows):
+        # La consulta ya leyó sus filas: un documento nuevo y un borrado llegan ahora
+        if not store.loaded and index_service._metadata_changes == []:
+            index_service.track_documents([SimpleNamespace(
+                id="nuevo", title="nuevo.txt", word_count=1, size=4, created_at=None
+            )])
+            index_service.forget_document(deleted)
+        put_many(rows)
+
+    monkeypatch.setattr(store, "put_many", put_many_during_upload)
+
+    async def load_twice():
+        return await asyncio.gather(
+            index_service._ensure_metadata_loaded(),
+            index_service._ensure_metadata_loaded()
+        )
+
+    asyncio.run(load_twice())
+    assert store.loaded and index_service._metadata_load is None
+    assert sorted(store.filter([kept, deleted, "nuevo"])) == sorted([kept, "nuevo"])
+
+
+def test_fuzzy_search_tolerates_typos(client):
+    """Fuzzy mode finds words within the edit distance, walking the PATRICIA tree."""
+    from app.modules.inverted_index import InvertedIndex
+    from app.modules.patricia_tree_index import PatriciaTreeIndex
+
+    index = PatriciaTreeIndex()
+    index.add_documents({"a": ["gato", "gatos", "pato", "perro", "g"]})
+    for query, distance in (("gatp", 1), ("gat", 1), ("prro", 1), ("gto", 2), ("", 1)):
+        assert index.fuzzy_terms(query, distance) == InvertedIndex.fuzzy_terms(index, query, distance)
+
+    _upload(client, "uno.txt", "gato negro")
+    _upload(client, "dos.txt", "perro blanco")
+    client.post("/api/indexing/create", json={"index_type": "patricia"})
+
+    def search(query, **options):
+        response = client.post("/api/search/", json={"query": query, "index_type": "patricia", **options})
+        return [(result["document_title"], result["matches"]) for result in response.json()["results"]]
+
+    assert search("gatp") == []
+    assert search("gatp", mode="fuzzy") == [("uno.txt", ["gato"])]
+    assert sorted(search("peero", mode="fuzzy", max_distance=2)) == [("dos.txt", ["perro"]), ("uno.txt", ["negro"])]
+    assert client.post("/api/search/", json={"query": "x", "index_type": "patricia", "max_distance": 3}).status_code == 422
+
+
+def test_pattern_search_matches_whole_words(client):
+    """Wildcard and regex modes look up candidates by the literal parts of the pattern."""
+    from app.modules.inverted_index import InvertedIndex
+    from app.modules.patricia_tree_index import PatriciaTreeIndex
+    from app.modules.suffix_tree_index import SuffixTreeIndex
+    from app.modules.term_pattern import parse_pattern
+
+    words = ["gato", "gatos", "pato", "perro", "perrito", "prefijo", "sufijo", "g"]
+    indexes = [PatriciaTreeIndex(), SuffixTreeIndex()]
+    for index in indexes:
+        index.add_documents({"a": words})
+    for pattern, syntax in (("ga*", "wildcard"), ("*o", "wildcard"), ("pe*o", "wildcard"),
+                            ("*fij*", "wildcard"), ("?ato", "wildcard"), ("p[ae].*o", "regex"),
+                            ("per+.*", "regex"), ("gatos?", "regex")):
+        parsed = parse_pattern(pattern, syntax)
+        expected = InvertedIndex.pattern_terms(indexes[0], parsed)
+        assert expected
+        for index in indexes:
+            assert index.pattern_terms(parsed) == expected
+
+    _upload(client, "uno.txt", "prefijo gato")
+    _upload(client, "dos.txt", "sufijo perro")
+    client.post("/api/indexing/create", json={"index_type": "patricia"})
+
+    def search(query, mode, status_code=200):
+        response = client.post("/api/search/", json={"query": query, "index_type": "patricia", "mode": mode})
+        assert response.status_code == status_code
+        return sorted((result["document_title"], result["matches"]) for result in response.json().get("results", []))
+
+    assert search("*fijo", "wildcard") == [("dos.txt", ["sufijo"]), ("uno.txt", ["prefijo"])]
+    assert search("pre*o", "wildcard") == [("uno.txt", ["prefijo"])]
+    assert search("ga", "wildcard") == []
+    assert search("[gp].*o", "regex") == [("dos.txt", ["perro"]), ("uno.txt", ["gato", "prefijo"])]
+    assert search("(ga|pe)to", "regex", status_code=400) == []
+
+
+def test_patterns_with_many_repeats_are_collapsed_or_rejected(client):
+    """Repeated '*' parts that backtrack together are merged, and too many of them rejected."""
+    import pytest
+    from app.modules.term_pattern import parse_pattern
+
+    assert parse_pattern(".*.*.*.*.*.*.*.*.*.*[0-9]", "regex").regex.pattern == ".*[0-9]"
+    assert parse_pattern("a*a+.+.*x*", "regex").regex.pattern == "a+.+"
+    assert parse_pattern("*?*", "wildcard").regex.pattern == ".*..*"
+    with pytest.raises(ValueError):
+        parse_pattern("*a*b*c*", "wildcard")
+
+    _upload(client, "uno.txt", "gato")
+    client.post("/api/indexing/create", json={"index_type": "patricia"})
+    response = client.post("/api/search/", json={"query": ".+a.+b.+c.+", "index_type": "patricia", "mode": "regex"})
+    assert response.status_code == 400
+
+
+def test_auto_search_plans_the_cheapest_index(client):
+    """index_type 'auto' classifies the query, picks a built index and reports the plan."""
+    from app.modules.query_planner import classify_query
+
+    assert classify_query("gato", "default")[0] == "exact"
+    assert classify_query("ga*", "default")[0] == "prefix"
+    assert classify_query("*to", "default")[0] == "suffix"
+    assert classify_query("*at*", "default")[0] == "infix"
+    assert classify_query("gat.s?", "regex")[0] == "prefix"
+    assert classify_query("gato", "fuzzy")[0] == "fuzzy"
+
+    _upload(client, "uno.txt", "gato negro")
+    _upload(client, "dos.txt", "gatos blancos")
+
+    def search(query, **options):
+        response = client.post("/api/search/", json={"query": query, "index_type": "auto", **options})
+        assert response.status_code == 200
+        body = response.json()
+        return sorted(result["document_title"] for result in body["results"]), body["plan"]
+
+    assert search("gato") == ([], None)
+
+    client.post("/api/indexing/create", json={"index_type": "suffix"})
+    assert search("gato") == (["uno.txt"], {"kind": "exact", "index_type": "suffix", "fallback": False})
+    assert search("ga*") == (["dos.txt", "uno.txt"], {"kind": "prefix", "index_type": "suffix", "fallback": True})
+
+    client.post("/api/indexing/create", json={"index_type": "patricia"})
+    assert search("ga*") == (["dos.txt", "uno.txt"], {"kind": "prefix", "index_type": "patricia", "fallback": False})
+    assert search("*ncos") == (["dos.txt"], {"kind": "suffix", "index_type": "patricia", "fallback": False})
+    assert search("*eg*") == (["uno.txt"], {"kind": "infix", "index_type": "suffix", "fallback": False})
+    assert search("gatso", mode="fuzzy")[1]["index_type"] == "patricia"
+
+
+def test_batch_search_answers_every_query_in_order(client):
+    """POST /api/search/batch returns one response per query, evaluating repeated queries once."""
+    from app.services import index_service
+
+    _upload(client, "uno.txt", "gato negro")
+    _upload(client, "dos.txt", "perro negro")
+    client.post("/api/indexing/create", json={"index_type": "suffix"})
+
+    queries = [
+        {"query": "negro", "index_type": "suffix"},
+        {"query": "gat", "index_type": "suffix"},
+        {"query": "NEGRO", "index_type": "suffix"},
+        {"query": "gato", "index_type": "patricia"},
+        {"query": "perro", "index_type": "auto"},
+    ]
+    calls = []
+    rank_query = index_service._rank_query
+
+    async def counting_rank_query(*args):
+        calls.append(args[1])
+        return await rank_query(*args)
+
+    index_service._rank_query = counting_rank_query
+    try:
+        response = client.post("/api/search/batch", json={"queries": queries})
+    finally:
+        del index_service._rank_query
+    assert response.status_code == 200
+    responses = response.json()["responses"]
+    assert [sorted(r["document_title"] for r in item["results"]) for item in responses] == [
+        ["dos.txt", "uno.txt"], ["uno.txt"], ["dos.txt", "uno.txt"], [], ["dos.txt"]
+    ]
+    assert [item["query"] for item in responses] == ["negro", "gat", "NEGRO", "gato", "perro"]
+    assert responses[4]["plan"]["index_type"] == "suffix"
+    assert sorted(calls) == ["gat", "gato", "negro", "perro"]
+
+    bad = client.post("/api/search/batch", json={"queries": [{"query": "(a", "index_type": "suffix", "mode": "regex"}]})
+    assert bad.status_code == 400
+
+
+def test_concurrent_identical_searches_are_computed_once(client):
+    """Simultaneous identical searches share one computation, run in the search pool."""
+    import asyncio
+    import threading
+    from app.services import index_service
+
+    _upload(client, "uno.txt", "gato negro")
+    client.post("/api/indexing/create", json={"index_type": "suffix"})
+
+    threads = []
+    evaluate_query = index_service._evaluate_query
+
+    def counting_evaluate_query(*args):
+        threads.append(threading.current_thread().name)
+        return evaluate_query(*args)
+
+    index_service._evaluate_query = counting_evaluate_query
+
+    async def searches():
+        return await asyncio.gather(
+            *(index_service.search("gato", "suffix") for _ in range(5)),
+            index_service.search("negro", "suffix")
+        )
+
+    try:
+        responses = asyncio.run(searches())
+    finally:
+        del index_service._evaluate_query
+    assert [response.total_results for response in responses] == [1] * 6
+    assert len(threads) == 2 and all(name.startswith("search") for name in threads)
+    assert len(index_service._search_flight) == 0
+
+
+def test_searches_on_different_index_versions_are_not_shared(client):
+    """A search started before the index changed is not shared with one started after."""
+    import asyncio
+    import threading
+    from app.services import index_service
+
+    _upload(client, "uno.txt", "gato negro")
+    client.post("/api/indexing/create", json={"index_type": "suffix"})
+
+    versions = []
+    release = threading.Event()
+    evaluate_query = index_service._evaluate_query
+
+    def blocking_evaluate_query(view, *args):
+        versions.append(view.version)
+        # La primera búsqueda sigue en curso mientras cambia el índice
+        release.wait(timeout=5)
+        return evaluate_query(view, *args)
+
+    index_service._evaluate_query = blocking_evaluate_query
+
+    async def wait_for_calls(count):
+        for _ in range(200):
+            if len(versions) >= count:
+                return
+            await asyncio.sleep(0.01)
+
+    async def searches():
+        first = asyncio.ensure_future(index_service.search("gato", "suffix"))
+        await wait_for_calls(1)
+        index_service.suffix_index.add_documents({"otro": ["gato"]})
+        second = asyncio.ensure_future(index_service.search("gato", "suffix"))
+        await wait_for_calls(2)
+        release.set()
+        return await asyncio.gather(first, second)
+
+    try:
+        asyncio.run(searches())
+    finally:
+        del index_service._evaluate_query
+    assert len(versions) == 2 and versions[0] < versions[1]
+
+
+def test_count_and_estimate_modes_skip_results(client, monkeypatch):
+    """result_mode 'count' returns the exact number of matches; 'estimate' merges HyperLogLog sketches."""
+    from app.modules import inverted_index
+    from app.modules.hyperloglog import HyperLogLog
+
+    values = [f"doc-{i}" for i in range(20000)]
+    merged = HyperLogLog.union(HyperLogLog(values[:12000]), HyperLogLog(values[8000:]))
+    assert abs(merged.estimate() - 20000) < 20000 * 0.05
+    assert round(HyperLogLog(values[:10]).estimate()) == 10
+
+    _upload(client, "uno.txt", "gato negro")
+    _upload(client, "dos.txt", "gatito blanco")
+    _upload(client, "tres.txt", "perro negro")
+    client.post("/api/indexing/create", json={"index_type": "patricia"})
+
+    def search(query, result_mode, **options):
+        response = client.post("/api/search/", json={
+            "query": query, "index_type": "patricia", "result_mode": result_mode, **options
+        }).json()
+        assert response["results"] == [] or result_mode == "documents"
+        return response["total_results"], response["estimated"]
+
+    assert search("gat", "documents") == (2, False)
+    assert search("gat", "count") == (2, False)
+    assert search("negro", "count", filters={"title_prefix": "u"}) == (1, False)
+    assert search("gat", "estimate") == (2, False)  # Postings pequeñas: conteo exacto
+
+    monkeypatch.setattr(inverted_index, "SKETCH_MIN_POSTINGS", 1)
+    assert search("gat", "estimate") == (2, True)
+    assert search("*o", "estimate", mode="wildcard") == (3, True)
+    assert search("gat", "estimate", filters={"max_word_count": 5}) == (2, False)
+
+
+def test_snippets_highlight_matches_of_top_results(client):
+    """Top results get snippets cut from the text with cached term offsets."""
+    from app.modules.snippets import build_snippets
+    from app.utils.content_cache import cache_key, content_cache
+
+    text = "uno dos tres gato cuatro cinco seis siete ocho nueve gato diez"
+    snippets = build_snippets(text, [(13, 17), (53, 57)], 20, 2)
+    assert [snippet for snippet, _ in snippets] == ["tres gato cuatro", "ocho nueve gato diez"]
+    for snippet, highlights in snippets:
+        assert [snippet[start:end] for start, end in highlights] == ["gato"]
+    assert len(build_snippets(text, [(13, 17), (53, 57)], 100, 2)) == 1
+
+    _upload(client, "uno.txt", "El gato negro duerme. Otro Gato juega con el gato gris.")
+    _upload(client, "dos.txt", "Un gatito y un perro")
+    client.post("/api/indexing/create", json={"index_type": "suffix"})
+
+    def search(snippets):
+        response = client.post("/api/search/", json={"query": "gat", "index_type": "suffix", "snippets": snippets})
+        return {result["document_title"]: result["snippets"] for result in response.json()["results"]}
+
+    # dos.txt es el primer resultado (más relevante)
+    assert search(1)["uno.txt"] is None
+    (snippet,) = search(2)["uno.txt"]
+    assert [snippet["text"][start:end] for start, end in snippet["highlights"]] == ["gato", "Gato", "gato"]
+
+    # Los offsets se guardaron al indexar, con el texto extraído
+    documents = client.get("/api/documents/").json()
+    assert all(
+        content_cache.get_term_offsets(cache_key(doc["content_hash"], doc["title"]))
+        for doc in documents["documents"]
+    )
@@ -2,7 +2,7 @@
 'use client';
 
 import { useState } from 'react';
-import { useQuery, useMutation, useQueryClient } from '@tanstack/react-query';
+import { useInfiniteQuery, useMutation, useQueryClient } from '@tanstack/react-query';
 import { DocumentUpload } from '@/components/DocumentUpload';
 import { api, Document } from '@/lib/api';
 import Link from 'next/link';
@@ -15,11 +15,21 @@ export default function DocumentsPage() {
   const [showDeleteConfirm, setShowDeleteConfirm] = useState(false);
   const [documentToDelete, setDocumentToDelete] = useState<Document | null>(null);
 
-  const { data: documents, isLoading } = useQuery({
-    queryKey: ['documents'],
-    queryFn: () => api.getDocuments(),
+  const {
+    data,
+    isLoading,
+    fetchNextPage,
+    hasNextPage,
+    isFetchingNextPage,
+  } = useInfiniteQuery({
+    queryKey: ['documents', 'list'],
+    queryFn: ({ pageParam }) => api.getDocuments({ cursor: pageParam }),
+    initialPageParam: undefined as string | undefined,
+    getNextPageParam: (lastPage) => lastPage.next_cursor ?? undefined,
   });
 
+  const documents = data?.pages.flatMap((page) => page.documents) ?? [];
+
   const deleteMutation = useMutation({
     mutationFn: (id: string) => api.deleteDocument(id),
     onSuccess: () => {
@@ -45,9 +55,11 @@ export default function DocumentsPage() {
     setDocumentToDelete(null);
   };
 
-  const handleViewDocument = (doc: Document) => {
+  const handleViewDocument = async (doc: Document) => {
+    // El listado solo trae un fragmento; el texto completo se pide al abrir la vista previa
     setSelectedDocument(doc);
     setIsPreviewOpen(true);
+    setSelectedDocument(await api.getDocument(doc.id));
   };
 
   const closePreview = () => {
@@ -78,9 +90,9 @@ export default function DocumentsPage() {
               <div className="animate-spin text-4xl mb-4">⏳</div>
               <p className="text-gray-400">Cargando documentos...</p>
             </div>
-          ) : documents && documents.documents.length > 0 ? (
+          ) : documents.length > 0 ? (
             <div className="grid grid-cols-1 gap-4">
-              {documents.documents.map((doc) => (
+              {documents.map((doc) => (
                 <div
                   key={doc.id}
                   className="bg-surface/50 border border-white/5 rounded-xl p-6 hover:border-accent-indigo/30 transition-all duration-300 hover:shadow-lg hover:shadow-accent-indigo/10 group"
@@ -120,6 +132,15 @@ export default function DocumentsPage() {
                   </div>
                 </div>
               ))}
+              {hasNextPage && (
+                <button
+                  onClick={() => fetchNextPage()}
+                  disabled={isFetchingNextPage}
+                  className="px-6 py-2 bg-white/10 hover:bg-white/20 text-white rounded-lg transition-colors disabled:opacity-50"
+                >
+                  {isFetchingNextPage ? 'Cargando...' : 'Cargar más'}
+                </button>
+              )}
             </div>
           ) : (
             <div className="text-center py-12 border-2 border-dashed border-white/10 rounded-xl">
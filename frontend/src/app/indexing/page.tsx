@@ -23,8 +23,8 @@ export default function IndexingPage() {
   const queryClient = useQueryClient();
 
   const { data: documents } = useQuery({
-    queryKey: ['documents'],
-    queryFn: () => api.getDocuments(),
+    queryKey: ['documents', 'count'],
+    queryFn: () => api.getDocuments({ limit: 1, fields: 'title' }),
   });
 
   const { data: suffixStatus } = useQuery({
@@ -65,7 +65,7 @@ export default function IndexingPage() {
   });
 
   const handleCreateIndex = () => {
-    if (!documents || documents.documents.length === 0) {
+    if (!documents || documents.total === 0) {
       setModalState({
         isOpen: true,
         title: 'Atención',
@@ -128,10 +128,10 @@ export default function IndexingPage() {
             Crear Índice {indexType === 'suffix' ? 'Suffix Tree' : 'PATRICIA Tree'}
           </h2>
 
-          {documents && documents.documents.length > 0 ? (
+          {documents && documents.total > 0 ? (
             <div>
               <p className="mb-6 text-gray-300 text-lg">
-                Se indexarán <span className="text-accent-indigo font-bold">{documents.documents.length}</span> documento(s) disponible(s).
+                Se indexarán <span className="text-accent-indigo font-bold">{documents.total}</span> documento(s) disponible(s).
               </p>
               <button
                 onClick={handleCreateIndex}
@@ -17,15 +17,26 @@ const apiClient = axios.create({
 export interface Document {
   id: string;
   title: string;
-  content: string;
+  content?: string;
+  snippet?: string;
   filename?: string;
   created_at: string;
   word_count: number;
+  content_hash?: string;
+  size?: number;
+  mime_type?: string;
 }
 
 export interface DocumentListResponse {
   documents: Document[];
   total: number;
+  next_cursor?: string | null;
+}
+
+export interface DocumentListParams {
+  limit?: number;
+  cursor?: string;
+  fields?: string;
 }
 
 export interface IndexStructureNode {
@@ -56,8 +67,8 @@ export interface SearchResponse {
 }
 
 // Documents
-export async function getDocuments(): Promise<DocumentListResponse> {
-  const response = await apiClient.get<DocumentListResponse>('/api/documents/');
+export async function getDocuments(params: DocumentListParams = {}): Promise<DocumentListResponse> {
+  const response = await apiClient.get<DocumentListResponse>('/api/documents/', { params });
   return response.data;
 }
 
@@ -77,15 +88,39 @@ export async function uploadDocument(file: File): Promise<Document> {
   return response.data;
 }
 
+export interface BulkUploadResponse {
+  documents: Document[];
+  total: number;
+  failed: { filename: string; detail: string }[];
+  indexed: string[];
+}
+
+export async function uploadDocuments(files: File[], index: boolean = false): Promise<BulkUploadResponse> {
+  const formData = new FormData();
+  files.forEach((file) => formData.append('files', file));
+  formData.append('index', String(index));
+  const response = await apiClient.post<BulkUploadResponse>('/api/documents/bulk', formData, {
+    headers: {
+      'Content-Type': 'multipart/form-data',
+    },
+  });
+  return response.data;
+}
+
 export async function deleteDocument(id: string): Promise<void> {
   await apiClient.delete(`/api/documents/${id}`);
 }
 
 // Indexing
-export async function createIndex(indexType: 'suffix' | 'patricia', documentIds?: string[]): Promise<void> {
+export async function createIndex(
+  indexType: 'suffix' | 'patricia',
+  documentIds?: string[],
+  mode: 'full' | 'reconcile' = 'full'
+): Promise<void> {
   await apiClient.post('/api/indexing/create', {
     index_type: indexType,
     document_ids: documentIds,
+    mode,
   });
 }
 
@@ -138,6 +173,7 @@ export const api = {
   getDocuments,
   getDocument,
   uploadDocument,
+  uploadDocuments,
   deleteDocument,
   createIndex,
   getIndexStatus,
@@ -7,10 +7,14 @@ export type IndexType = 'suffix' | 'patricia';
 export interface Document {
   id: string;
   title: string;
-  content: string;
+  content?: string;
+  snippet?: string;
   filename?: string;
   created_at: string;
   word_count: number;
+  content_hash?: string;
+  size?: number;
+  mime_type?: string;
 }
 
 export interface IndexStatus {
@@ -19,5 +23,6 @@ export interface IndexStatus {
   word_count?: number;
   document_count?: number;
   created_at?: string;
+  last_build?: Record<string, any>;
 }
 